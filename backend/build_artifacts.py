@@ -0,0 +1,900 @@
+# backend/build_artifacts.py
+"""
+Offline build steps for the precomputed artifacts the backend serves from.
+Run from the backend directory:
+
+    python build_artifacts.py score-matrix [--force]
+    python build_artifacts.py plot-arena [--force]
+    python build_artifacts.py flatmap-grids [--genes KEAP1 BRCA1] [--force]
+    python build_artifacts.py bundles [--genes KEAP1 BRCA1] [--force]
+    python build_artifacts.py gi-matrices [--genes KEAP1 BRCA1] [--force]
+    python build_artifacts.py string-index --links 9606.protein.links.v12.0.txt.gz \
+                                           --info 9606.protein.info.v12.0.txt.gz [--min-score 150]
+    python build_artifacts.py warm-renders [--genes KEAP1] [--top 20]
+    python build_artifacts.py compress-downloads [--files calibration.csv ...] [--force]
+    python build_artifacts.py descriptions [--pathways NRF2 ...] [--force] [--workers 8]
+
+main.py imports the same builders to fill any artifact that is missing or stale
+on first use, so running these ahead of time only removes the cold-start cost.
+Data paths are resolved against BACKEND_DIR (default: this directory).
+"""
+import argparse
+import csv
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import requests
+from scipy.interpolate import griddata
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# root of the data files below; BACKEND_DIR in the environment points it elsewhere (tests)
+BACKEND_DIR = Path(os.environ.get("BACKEND_DIR", Path(__file__).resolve().parent))
+DATA_DIR = BACKEND_DIR / "data"
+
+# -----------------------
+# Shared helpers
+# -----------------------
+
+def source_signature(*paths: Path) -> dict:
+    """{file name: [mtime_ns, size]} for the inputs an artifact was built from."""
+    sig = {}
+    for p in paths:
+        st = Path(p).stat()
+        sig[Path(p).name] = [st.st_mtime_ns, st.st_size]
+    return sig
+
+def signature_version(sig: dict) -> str:
+    """Short stable id of a source_signature, used as a cache / artifact version."""
+    return hashlib.sha1(json.dumps(sig, sort_keys=True).encode()).hexdigest()[:12]
+
+def read_nmf_csv(fn: Path) -> pd.DataFrame:
+    """Read a <gene>_nmfinfo_final.csv with the column names the flatmap code uses."""
+    nmf = pd.read_csv(fn)
+    nmf = nmf.rename(columns={"x_axis": "x", "y_axis": "y", "clust": "cluster"})
+    nmf["x_r"] = nmf["x"].round(6)
+    nmf["y_r"] = nmf["y"].round(6)
+    return nmf
+
+POINT_RX = r"POINT\s*\(([-0-9\.Ee+]+)\s+([-0-9\.Ee+]+)\)"
+
+def read_gdf_csv(fn: Path) -> pd.DataFrame:
+    """Read a <gene>_<pathway>_GSEA.csv_gdf.csv, parsing the WKT geometry into float x/y columns."""
+    gdf = pd.read_csv(fn)
+    if "geometry" not in gdf.columns or "Gi_sum" not in gdf.columns:
+        raise ValueError(f"Expected 'geometry' and 'Gi_sum' in {Path(fn).name}")
+    xy = gdf["geometry"].astype(str).str.extract(POINT_RX)
+    gdf["x"] = xy[0].astype(float)
+    gdf["y"] = xy[1].astype(float)
+    return gdf
+
+def residue_points(nmf: pd.DataFrame) -> np.ndarray:
+    """For each residue, the first residue row at the same (6-decimal) flatmap point."""
+    rows = pd.Series(np.arange(len(nmf), dtype=np.int32))
+    return rows.groupby([nmf["x"].round(6), nmf["y"].round(6)], sort=False).transform("first").to_numpy()
+
+def gdf_residue_index(nmf: pd.DataFrame, gdf: pd.DataFrame) -> np.ndarray:
+    """nmf row for each gdf point (matched on 6-decimal x/y, as the flatmap always did), -1 if none."""
+    first = pd.DataFrame({"x_r": nmf["x"].round(6), "y_r": nmf["y"].round(6),
+                          "residue": np.arange(len(nmf))}).drop_duplicates(["x_r", "y_r"])
+    keys = pd.DataFrame({"x_r": gdf["x"].round(6), "y_r": gdf["y"].round(6)})
+    return keys.merge(first, on=["x_r", "y_r"], how="left")["residue"].fillna(-1).to_numpy(np.int32)
+
+def genes_with_nmf(data_dir: Path = DATA_DIR) -> list[str]:
+    return sorted(re.sub(r"_nmfinfo_final\.csv$", "", p.name) for p in data_dir.glob("*_nmfinfo_final.csv"))
+
+# =========================================================
+# ========= Protein x pathway score matrix (mmap) =========
+# =========================================================
+# The wide CSV as one float32 (proteins, pathways) .npy plus the per-pathway ranking
+# (proteins by descending score) and a meta.json sidecar with the row ids and column
+# names. Memory-mapped, so every uvicorn worker shares the same page-cache copy.
+
+SCORE_MATRIX_CSV = BACKEND_DIR / "all_proteins_max_score_matrix_cleaned.csv"
+SCORE_STORE_DIR = BACKEND_DIR / "score_matrix"
+SCORE_STORE_ARRAYS = ("scores", "rank_indptr", "rank_rows", "rank_neg_scores")
+
+def rank_columns(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n_cols: int):
+    """
+    Positive (row, col, val) entries grouped by column, each column by descending value
+    (ties by row). Returns (indptr, rows int32, negated values float32, ascending per column).
+    """
+    keep = vals > 0
+    rows, cols, vals = rows[keep], cols[keep], vals[keep]
+    order = np.lexsort((rows, -vals, cols))
+    indptr = np.zeros(n_cols + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cols, minlength=n_cols), out=indptr[1:])
+    return indptr, rows[order].astype(np.int32), (-vals[order]).astype(np.float32)
+
+def save_score_store(ids, columns, X: np.ndarray, signature: dict, out_dir: Path = SCORE_STORE_DIR) -> Path:
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    r, c = np.nonzero(X > 0)
+    arrays = dict(zip(SCORE_STORE_ARRAYS, (X, *rank_columns(r, c, X[r, c], X.shape[1]))))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for name in SCORE_STORE_ARRAYS:
+        tmp = out_dir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arrays[name])
+        tmp.replace(out_dir / f"{name}.npy")
+    meta = {"proteins": [str(i) for i in ids], "pathways": [str(c) for c in columns], "source": signature}
+    # meta.json last: a store without it is incomplete and gets rebuilt
+    tmp = out_dir / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta))
+    tmp.replace(out_dir / "meta.json")
+    return out_dir
+
+def load_score_store(signature: dict | None, out_dir: Path = SCORE_STORE_DIR) -> dict | None:
+    """
+    Memory-map the stored matrix, or None if missing or built from a different CSV.
+    signature=None (CSV not shipped) accepts whatever store is there.
+    """
+    meta_path = out_dir / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    if signature is not None and meta.get("source") != signature:
+        return None
+    store = {name: np.load(out_dir / f"{name}.npy", mmap_mode="r") for name in SCORE_STORE_ARRAYS}
+    store.update(proteins=meta["proteins"], pathways=meta["pathways"], source=meta.get("source"))
+    return store
+
+def build_score_store(csv: Path = SCORE_MATRIX_CSV, force: bool = False, out_dir: Path = SCORE_STORE_DIR) -> bool:
+    sig = source_signature(csv)
+    if not force and load_score_store(sig, out_dir) is not None:
+        return False
+    t0 = time.time()
+    df = pd.read_csv(csv, index_col=0)
+    save_score_store(df.index, df.columns, df.to_numpy(dtype=np.float32), sig, out_dir)
+    print(f"[score-matrix] {df.shape[0]} x {df.shape[1]} in {time.time()-t0:.1f}s -> {out_dir}")
+    return True
+
+# =========================================================
+# ========= /plot arena (shared across uvicorn workers) ====
+# =========================================================
+# The protein_map_outputs parquets as read-only .npy arrays that every worker
+# memory-maps instead of parsing its own copy. Each publish is a numbered generation
+# directory (gen-000001, ...); CURRENT names the live one and is replaced atomically,
+# so all workers move to a new build together. Point ARENA_DIR at /dev/shm to keep
+# the arena in POSIX shared memory rather than the page cache of a disk file.
+
+PLOT_OUT_DIR = BACKEND_DIR / "protein_map_outputs"
+ARENA_DIR = Path(os.environ.get("ARENA_DIR", DATA_DIR / "plot_arena"))
+ARENA_ARRAYS = ("raw", "v_norm", "xy", "annotated")
+ARENA_KEEP = 2  # generations left on disk; workers still mapping an older one keep their pages
+
+def l2_normalize_rows(X: np.ndarray) -> np.ndarray:
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
+
+def plot_manifest(base: Path = PLOT_OUT_DIR) -> tuple[dict, Path, Path]:
+    """(manifest, vectors parquet, coords parquet); RuntimeError if any is missing."""
+    man_path = base / "manifest.json"
+    if not man_path.exists():
+        raise RuntimeError(f"manifest.json not found under {base.resolve()}")
+    m = json.loads(man_path.read_text())
+    vecs_path, coords_path = base / m["vectors_parquet"], base / m["coords_parquet"]
+    if not vecs_path.exists():
+        raise RuntimeError(f"vectors parquet missing: {vecs_path.resolve()}")
+    if not coords_path.exists():
+        raise RuntimeError(f"coords parquet missing: {coords_path.resolve()}")
+    return m, vecs_path, coords_path
+
+def compute_plot_arrays(base: Path = PLOT_OUT_DIR) -> tuple[dict, dict]:
+    """(meta, arrays) for the arena, straight from the parquets."""
+    m, vecs_path, coords_path = plot_manifest(base)
+    vecs = pd.read_parquet(vecs_path).set_index("protein_id")
+    coords = pd.read_parquet(coords_path)
+    if "protein_id" not in coords.columns or "x" not in coords.columns or "y" not in coords.columns:
+        raise RuntimeError("coords parquet must have columns: protein_id, x, y")
+
+    X = np.ascontiguousarray(vecs.to_numpy(dtype=np.float32))
+    xy = (coords.drop_duplicates("protein_id").set_index("protein_id")[["x", "y"]]
+          .reindex(vecs.index).to_numpy(dtype=np.float32))
+    arrays = {
+        "raw": X,
+        "v_norm": l2_normalize_rows(X),
+        "xy": np.ascontiguousarray(xy),
+        "annotated": (X > 0).any(axis=1) if X.size else np.zeros(len(X), dtype=bool),
+    }
+    meta = {
+        "manifest": m,
+        "proteins": [str(i) for i in vecs.index],
+        "pathways": [str(c) for c in vecs.columns],
+        "coords_shape": list(coords.shape),
+        "source": source_signature(base / "manifest.json", vecs_path, coords_path),
+    }
+    return meta, arrays
+
+@contextmanager
+def _arena_lock(arena_dir: Path):
+    """Exclusive lock so concurrent workers publish a generation once."""
+    arena_dir.mkdir(parents=True, exist_ok=True)
+    with open(arena_dir / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def arena_current(arena_dir: Path = ARENA_DIR) -> dict | None:
+    """{"generation": n, "dir": "gen-..."} of the live generation, or None."""
+    try:
+        return json.loads((arena_dir / "CURRENT").read_text())
+    except (OSError, ValueError):
+        return None
+
+def attach_arena(arena_dir: Path = ARENA_DIR) -> tuple[int, dict, dict] | None:
+    """(generation, meta, read-only memory-mapped arrays) of the live generation, or None."""
+    cur = arena_current(arena_dir)
+    if cur is None:
+        return None
+    gdir = arena_dir / cur["dir"]
+    try:
+        meta = json.loads((gdir / "meta.json").read_text())
+        arrays = {name: np.load(gdir / f"{name}.npy", mmap_mode="r") for name in ARENA_ARRAYS}
+    except OSError:
+        return None  # pruned between reading CURRENT and opening it
+    return cur["generation"], meta, arrays
+
+def publish_arena(meta: dict, arrays: dict, arena_dir: Path = ARENA_DIR) -> int:
+    """Write a new generation and make it current. Caller holds _arena_lock."""
+    cur = arena_current(arena_dir)
+    gen = (cur["generation"] if cur else 0) + 1
+    name = f"gen-{gen:06d}"
+    tmp = arena_dir / f"{name}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for key in ARENA_ARRAYS:
+        np.save(tmp / f"{key}.npy", arrays[key])
+    (tmp / "meta.json").write_text(json.dumps(dict(meta, generation=gen, built_at=time.time())))
+    tmp.replace(arena_dir / name)
+
+    ptr = arena_dir / "CURRENT.tmp"
+    ptr.write_text(json.dumps({"generation": gen, "dir": name}))
+    ptr.replace(arena_dir / "CURRENT")
+
+    gens = sorted(d for d in arena_dir.glob("gen-*") if d.suffix != ".tmp")
+    for old in gens[:-ARENA_KEEP]:
+        shutil.rmtree(old, ignore_errors=True)
+    return gen
+
+def ensure_plot_arena(base: Path = PLOT_OUT_DIR, arena_dir: Path = ARENA_DIR,
+                      force: bool = False) -> tuple[int, dict, dict]:
+    """
+    Attach to the live generation if it was built from the current parquets, else build
+    and publish a new one. Concurrent callers wait on the lock, so only one of them builds.
+    """
+    _, vecs_path, coords_path = plot_manifest(base)
+    sig = source_signature(base / "manifest.json", vecs_path, coords_path)
+    with _arena_lock(arena_dir):
+        hit = attach_arena(arena_dir)
+        if force or hit is None or hit[1].get("source") != sig:
+            t0 = time.time()
+            meta, arrays = compute_plot_arrays(base)
+            gen = publish_arena(meta, arrays, arena_dir)
+            print(f"[plot-arena] generation {gen}: {arrays['raw'].shape} in {time.time()-t0:.1f}s -> {arena_dir}")
+            hit = attach_arena(arena_dir)
+    return hit
+
+# =========================================================
+# ================ Flatmap interpolation grids ============
+# =========================================================
+
+FLATMAP_GRID_DIR = DATA_DIR / "flatmap_grids"
+FLATMAP_GRID_SIZE = 400
+FLATMAP_GRID_ARRAYS = ("Zi_cluster", "Zi_alt", "outer_mask")
+
+def compute_flatmap_grid(df: pd.DataFrame, nx: int = FLATMAP_GRID_SIZE, ny: int = FLATMAP_GRID_SIZE) -> dict:
+    """
+    Interpolate one gene's residues onto the flatmap grid. Independent of pathway and collapse mode.
+    Returns Zi_cluster (nearest), Zi_alt (linear), outer_mask, plus the padded extent and grid size.
+    """
+    xmn, xmx = df["x"].min(), df["x"].max()
+    ymn, ymx = df["y"].min(), df["y"].max()
+    pad_x = 0.05 * (xmx - xmn)
+    pad_y = 0.05 * (ymx - ymn)
+    extent = (xmn - pad_x, xmx + pad_x, ymn - pad_y, ymx + pad_y)
+
+    xi = np.linspace(extent[0], extent[1], nx)
+    yi = np.linspace(extent[2], extent[3], ny)
+    Xi, Yi = np.meshgrid(xi, yi)
+
+    # Cluster grid (categorical)
+    Zi_cluster = griddata((df["x"], df["y"]), df["cluster"], (Xi, Yi), method="nearest")
+
+    # Altitude grid
+    Zi_alt = griddata((df["x"], df["y"]), df["altitude"], (Xi, Yi), method="linear")
+    if isinstance(Zi_alt, np.ma.MaskedArray):
+        Zi_alt = Zi_alt.filled(np.nan)
+
+    # Mask definition from altitude
+    outer_mask = np.isnan(Zi_alt) | (Zi_alt <= np.nanmin(Zi_alt) + 1e-6)
+
+    return {
+        "Zi_cluster": Zi_cluster,
+        "Zi_alt": Zi_alt,
+        "outer_mask": outer_mask,
+        "extent": tuple(float(v) for v in extent),
+        "nx": nx,
+        "ny": ny,
+    }
+
+def save_flatmap_grid(gene: str, grid: dict, signature: dict, out_dir: Path = FLATMAP_GRID_DIR) -> Path:
+    """Write one .npy per array (so they can be memory-mapped) plus meta.json."""
+    gdir = out_dir / gene
+    gdir.mkdir(parents=True, exist_ok=True)
+    for name in FLATMAP_GRID_ARRAYS:
+        # write-then-rename: render workers may be memory-mapping the previous file
+        tmp = gdir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(grid[name]))
+        tmp.replace(gdir / f"{name}.npy")
+    meta = {"extent": grid["extent"], "nx": grid["nx"], "ny": grid["ny"], "source": signature}
+    # meta.json last: a grid directory without it is incomplete and gets rebuilt
+    (gdir / "meta.json").write_text(json.dumps(meta))
+    return gdir
+
+def load_flatmap_grid(gene: str, signature: dict, out_dir: Path = FLATMAP_GRID_DIR) -> dict | None:
+    """Memory-map a stored grid, or None if missing or built from different inputs."""
+    gdir = out_dir / gene
+    meta_path = gdir / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    if meta.get("source") != signature:
+        return None
+    grid = {name: np.load(gdir / f"{name}.npy", mmap_mode="r") for name in FLATMAP_GRID_ARRAYS}
+    grid.update(extent=tuple(meta["extent"]), nx=meta["nx"], ny=meta["ny"])
+    return grid
+
+def build_flatmap_grids(genes: list[str] | None = None, force: bool = False,
+                        data_dir: Path = DATA_DIR, out_dir: Path = FLATMAP_GRID_DIR) -> list[str]:
+    built = []
+    for gene in genes or genes_with_nmf(data_dir):
+        fn = data_dir / f"{gene}_nmfinfo_final.csv"
+        if not fn.exists():
+            print(f"[flatmap-grids] skip {gene}: no nmfinfo file")
+            continue
+        sig = source_signature(fn)
+        if not force and load_flatmap_grid(gene, sig, out_dir) is not None:
+            continue
+        t0 = time.time()
+        save_flatmap_grid(gene, compute_flatmap_grid(read_nmf_csv(fn)), sig, out_dir)
+        print(f"[flatmap-grids] {gene} in {time.time()-t0:.2f}s")
+        built.append(gene)
+    return built
+
+# =========================================================
+# ============== Per-gene columnar bundles ================
+# =========================================================
+# One uncompressed Arrow IPC file per nmfinfo / gdf CSV, memory-mapped on read.
+# nmf bundle: res, x, y, altitude, cluster (as read_nmf_csv) + point (see residue_points).
+# gdf bundle: x/y as float32, residue (nmf row, -1 if unmatched) and every numeric CSV column,
+# so requests skip the WKT regex and the float-key merge.
+
+GENE_BUNDLE_DIR = DATA_DIR / "bundles"
+NMF_BUNDLE_COLUMNS = ("res", "x", "y", "altitude", "cluster")
+
+def nmf_bundle_path(gene: str, out_dir: Path = GENE_BUNDLE_DIR) -> Path:
+    return out_dir / gene / "nmfinfo.arrow"
+
+def gdf_bundle_path(gene: str, name: str, out_dir: Path = GENE_BUNDLE_DIR) -> Path:
+    return out_dir / gene / f"{name}_gdf.arrow"
+
+def write_bundle(path: Path, df: pd.DataFrame, signature: dict):
+    """Write df as an Arrow IPC file tagged with the signature of the CSVs it came from."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({"source": json.dumps(signature)})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".arrow.tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    tmp.replace(path)
+
+def read_bundle(path: Path, signature: dict) -> pa.Table | None:
+    """Memory-map a bundle, or None if it is missing or was built from different inputs."""
+    if not path.exists():
+        return None
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    meta = table.schema.metadata or {}
+    if json.loads(meta.get(b"source", b"null")) != signature:
+        return None
+    return table
+
+def nmf_bundle_frame(nmf: pd.DataFrame) -> pd.DataFrame:
+    df = nmf[list(NMF_BUNDLE_COLUMNS)].copy()
+    df["point"] = residue_points(nmf)
+    return df
+
+def gdf_bundle_frame(nmf: pd.DataFrame, gdf: pd.DataFrame) -> pd.DataFrame:
+    df = gdf.drop(columns=["geometry"]).select_dtypes("number").drop(columns=["x", "y"])
+    df.insert(0, "residue", gdf_residue_index(nmf, gdf))
+    df.insert(0, "y", gdf["y"].astype(np.float32))
+    df.insert(0, "x", gdf["x"].astype(np.float32))
+    return df
+
+def build_gene_bundles(genes: list[str] | None = None, force: bool = False,
+                       data_dir: Path = DATA_DIR, out_dir: Path = GENE_BUNDLE_DIR) -> list[Path]:
+    built = []
+    for gene in genes or genes_with_nmf(data_dir):
+        nmf_fn = data_dir / f"{gene}_nmfinfo_final.csv"
+        if not nmf_fn.exists():
+            print(f"[bundles] skip {gene}: no nmfinfo file")
+            continue
+        t0 = time.time()
+        nmf = read_nmf_csv(nmf_fn)
+        nmf_sig = source_signature(nmf_fn)
+        path = nmf_bundle_path(gene, out_dir)
+        if force or read_bundle(path, nmf_sig) is None:
+            write_bundle(path, nmf_bundle_frame(nmf), nmf_sig)
+            built.append(path)
+
+        for gdf_fn in sorted(data_dir.glob(f"{gene}_*_GSEA.csv_gdf.csv")):
+            name = re.match(fr"{gene}_(.+?)_GSEA\.csv_gdf\.csv$", gdf_fn.name).group(1)
+            sig = source_signature(nmf_fn, gdf_fn)  # the residue index depends on both files
+            path = gdf_bundle_path(gene, name, out_dir)
+            if not force and read_bundle(path, sig) is not None:
+                continue
+            try:
+                write_bundle(path, gdf_bundle_frame(nmf, read_gdf_csv(gdf_fn)), sig)
+                built.append(path)
+            except ValueError as e:
+                print(f"[bundles][WARN] skip {gdf_fn.name}:", e)
+        print(f"[bundles] {gene} in {time.time()-t0:.2f}s")
+    return built
+
+# -----------------------
+# Loaders (bundle first, CSV fallback)
+# -----------------------
+
+def load_nmf(gene: str) -> pd.DataFrame:
+    """Load nmfinfo for a gene (res, x, y, altitude, cluster, point)."""
+    fn = DATA_DIR / f"{gene}_nmfinfo_final.csv"
+    if not fn.exists():
+        raise FileNotFoundError(f"No nmfinfo file for {gene}")
+    table = read_bundle(nmf_bundle_path(gene), source_signature(fn))
+    if table is not None:
+        return table.to_pandas()
+    df = read_nmf_csv(fn)
+    df["point"] = residue_points(df)
+    return df
+
+def load_gdf_points(gene: str, name: str, nmf: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """(nmf row per gdf point, -1 if unmatched; Gi_sum per gdf point) for one pathway."""
+    nmf_fn = DATA_DIR / f"{gene}_nmfinfo_final.csv"
+    fn = DATA_DIR / f"{gene}_{name}_GSEA.csv_gdf.csv"
+    if not fn.exists():
+        raise FileNotFoundError(f"No file for pathway {name}")
+    table = read_bundle(gdf_bundle_path(gene, name), source_signature(nmf_fn, fn))
+    if table is not None:  # zero-copy views into the memory map
+        return table.column("residue").to_numpy(), table.column("Gi_sum").to_numpy()
+    gdf = read_gdf_csv(fn)
+    return gdf_residue_index(nmf, gdf), gdf["Gi_sum"].to_numpy(float)
+
+def collapse_gi(residue: np.ndarray, gi: np.ndarray, point: np.ndarray, collapse: str = "max") -> np.ndarray:
+    """
+    GI* per residue: max (or mean) over the gdf points at that residue's flatmap position,
+    NaN where there are none. Residues sharing a position (`point`) share the value.
+    """
+    n = len(point)
+    ok = (residue >= 0) & ~np.isnan(gi)
+    r, v = residue[ok], gi[ok].astype(float)
+    if collapse == "mean":
+        counts = np.bincount(r, minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = np.bincount(r, weights=v, minlength=n) / counts
+    else:
+        out = np.full(n, -np.inf)
+        np.maximum.at(out, r, v)
+        out[np.isneginf(out)] = np.nan
+    return out[point]
+
+# =========================================================
+# ============ Per-gene GI* matrices (all pathways) =======
+# =========================================================
+# For every collapse mode: residue x pathway GI* and cluster x pathway GI*
+# (the per-cluster score the flatmap overlay paints), stored like the flatmap grids.
+
+GI_MATRIX_DIR = DATA_DIR / "gi_matrices"
+COLLAPSE_MODES = ("max", "mean")
+GI_MATRIX_ARRAYS = ("residues", "clusters") + tuple(f"{lvl}_{m}" for lvl in ("residue", "cluster") for m in COLLAPSE_MODES)
+
+def gene_pathways(gene: str, data_dir: Path = DATA_DIR) -> dict[str, Path]:
+    """{pathway: gdf CSV} for a gene, sorted by pathway."""
+    out = {}
+    for p in data_dir.glob(f"{gene}_*_GSEA.csv_gdf.csv"):
+        m = re.match(fr"{gene}_(.+?)_GSEA\.csv_gdf\.csv$", p.name)
+        if m:
+            out[m.group(1)] = p
+    return dict(sorted(out.items()))
+
+def gi_signature(gene: str, data_dir: Path = DATA_DIR) -> dict:
+    """Signature of every input of a gene's GI* matrix (nmfinfo + all gdf files)."""
+    return source_signature(data_dir / f"{gene}_nmfinfo_final.csv", *gene_pathways(gene, data_dir).values())
+
+def compute_gi_matrix(gene: str) -> dict:
+    """
+    residue_<mode>: (residues, pathways) GI* collapsed per residue, NaN where a pathway has no point.
+    cluster_<mode>: (clusters, pathways) the same values aggregated per cluster with the same mode.
+    """
+    nmf = load_nmf(gene)
+    point = nmf["point"].to_numpy()
+    pathways, cols = [], {m: [] for m in COLLAPSE_MODES}
+    for name in gene_pathways(gene):
+        try:
+            residue, gi = load_gdf_points(gene, name, nmf)
+        except ValueError as e:
+            print(f"[gi-matrices][WARN] skip {gene}/{name}:", e)
+            continue
+        pathways.append(name)
+        for m in COLLAPSE_MODES:
+            cols[m].append(collapse_gi(residue, gi, point, m))
+
+    clusters = nmf["cluster"].to_numpy()
+    out = {"pathways": pathways, "residues": nmf["res"].to_numpy(), "clusters": np.unique(clusters)}
+    for m in COLLAPSE_MODES:
+        R = np.column_stack(cols[m]) if pathways else np.empty((len(nmf), 0))
+        out[f"residue_{m}"] = R
+        out[f"cluster_{m}"] = pd.DataFrame(R).groupby(clusters).agg(m).to_numpy()
+    return out
+
+def save_gi_matrix(gene: str, gi: dict, signature: dict, out_dir: Path = GI_MATRIX_DIR) -> Path:
+    gdir = out_dir / gene
+    gdir.mkdir(parents=True, exist_ok=True)
+    for name in GI_MATRIX_ARRAYS:
+        tmp = gdir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(gi[name]))
+        tmp.replace(gdir / f"{name}.npy")
+    # meta.json last: a directory without it is incomplete and gets rebuilt
+    (gdir / "meta.json").write_text(json.dumps({"pathways": gi["pathways"], "source": signature}))
+    return gdir
+
+def load_gi_matrix(gene: str, signature: dict, out_dir: Path = GI_MATRIX_DIR) -> dict | None:
+    """Memory-map a stored GI* matrix, or None if missing or built from different inputs."""
+    gdir = out_dir / gene
+    meta_path = gdir / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text())
+    if meta.get("source") != signature:
+        return None
+    gi = {name: np.load(gdir / f"{name}.npy", mmap_mode="r") for name in GI_MATRIX_ARRAYS}
+    gi["pathways"] = meta["pathways"]
+    return gi
+
+def build_gi_matrices(genes: list[str] | None = None, force: bool = False,
+                      data_dir: Path = DATA_DIR, out_dir: Path = GI_MATRIX_DIR) -> list[str]:
+    built = []
+    for gene in genes or genes_with_nmf(data_dir):
+        if not (data_dir / f"{gene}_nmfinfo_final.csv").exists():
+            print(f"[gi-matrices] skip {gene}: no nmfinfo file")
+            continue
+        sig = gi_signature(gene, data_dir)
+        if not force and load_gi_matrix(gene, sig, out_dir) is not None:
+            continue
+        t0 = time.time()
+        gi = compute_gi_matrix(gene)
+        save_gi_matrix(gene, gi, sig, out_dir)
+        print(f"[gi-matrices] {gene}: {len(gi['pathways'])} pathway(s) in {time.time()-t0:.2f}s")
+        built.append(gene)
+    return built
+
+# =========================================================
+# ============== Local STRING snapshot (CSR) ==============
+# =========================================================
+# STRING's protein.links (protein1 protein2 combined_score) + protein.info (preferred names)
+# as a symmetric CSR adjacency over integer protein ids, scores as float16 in [0, 1].
+# string_client.StringIndex memory-maps it so pathway queries never call the API.
+
+STRING_INDEX_DIR = DATA_DIR / "string_index"
+STRING_INDEX_ARRAYS = ("names", "indptr", "indices", "scores")
+
+def build_string_index(links: Path, info: Path, min_score: int = 0,
+                       out_dir: Path = STRING_INDEX_DIR) -> Path:
+    t0 = time.time()
+    info_df = pd.read_csv(info, sep="\t", usecols=[0, 1], dtype=str)
+    info_df.columns = ["string_id", "name"]
+    links_df = pd.read_csv(links, sep=" ", usecols=["protein1", "protein2", "combined_score"],
+                           dtype={"protein1": str, "protein2": str, "combined_score": np.int16})
+    species = int(str(links_df["protein1"].iat[0]).split(".")[0])
+    links_df = links_df[links_df["combined_score"] >= min_score]
+
+    ids = pd.Index(info_df["string_id"])
+    a = ids.get_indexer(links_df["protein1"])
+    b = ids.get_indexer(links_df["protein2"])
+    ok = (a >= 0) & (b >= 0)
+    a, b, s = a[ok], b[ok], links_df["combined_score"].to_numpy()[ok]
+
+    # both directions, one entry per (src, dst); np.unique also sorts into CSR order
+    n = len(ids)
+    key, first = np.unique(np.concatenate([a, b]).astype(np.int64) * n + np.concatenate([b, a]),
+                           return_index=True)
+    src, dst = key // n, key % n
+    scores = (np.concatenate([s, s])[first] / 1000.0).astype(np.float16)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+    gdir = out_dir / str(species)
+    gdir.mkdir(parents=True, exist_ok=True)
+    arrays = {"names": info_df["name"].to_numpy(dtype=str), "indptr": indptr,
+              "indices": dst.astype(np.int32), "scores": scores}
+    for name in STRING_INDEX_ARRAYS:
+        tmp = gdir / f"{name}.npy.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arrays[name])
+        tmp.replace(gdir / f"{name}.npy")
+    meta = {"species": species, "proteins": n, "edges": int(len(dst)), "min_score": min_score,
+            "source": source_signature(links, info)}
+    (gdir / "meta.json").write_text(json.dumps(meta))
+    print(f"[string-index] species {species}: {n} proteins, {len(dst)} directed edges in {time.time()-t0:.1f}s")
+    return gdir
+
+# =========================================================
+# ============ Precompressed download variants ============
+# =========================================================
+# data/precompressed/<file>.gz (and .zst when zstandard is installed) for the files on
+# /downloads, served as-is to clients that accept the encoding. A variant carries its
+# source's mtime, so one that does not match the current file is never served.
+
+PRECOMPRESSED_DIR = DATA_DIR / "precompressed"
+DOWNLOAD_ENCODINGS = {"zstd": "zst", "gzip": "gz"}  # preferred first
+
+def precompressed_path(src: Path, encoding: str, out_dir: Path = PRECOMPRESSED_DIR) -> Path:
+    return out_dir / f"{Path(src).name}.{DOWNLOAD_ENCODINGS[encoding]}"
+
+def precompressed_variant(src: Path, encoding: str, out_dir: Path = PRECOMPRESSED_DIR) -> Path | None:
+    """The up-to-date variant of src for this encoding, or None."""
+    p = precompressed_path(src, encoding, out_dir)
+    try:
+        return p if p.stat().st_mtime_ns == Path(src).stat().st_mtime_ns else None
+    except OSError:
+        return None
+
+def build_precompressed(paths: list[Path], force: bool = False, out_dir: Path = PRECOMPRESSED_DIR) -> list[Path]:
+    encodings = [e for e in DOWNLOAD_ENCODINGS if e != "zstd" or zstandard is not None]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    built = []
+    for src in map(Path, paths):
+        if not src.exists() or src.suffix in (".zip", ".gz", ".zst"):
+            continue
+        st = src.stat()
+        for enc in encodings:
+            if not force and precompressed_variant(src, enc, out_dir) is not None:
+                continue
+            t0 = time.time()
+            dst = precompressed_path(src, enc, out_dir)
+            tmp = dst.with_name(dst.name + ".tmp")
+            with open(src, "rb") as fin:
+                with open(tmp, "wb") as raw:
+                    if enc == "gzip":
+                        with gzip.GzipFile(filename=src.name, mode="wb", fileobj=raw, mtime=0) as fout:
+                            shutil.copyfileobj(fin, fout, 1 << 20)
+                    else:
+                        zstandard.ZstdCompressor(level=10, threads=-1).copy_stream(fin, raw)
+            os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+            tmp.replace(dst)
+            built.append(dst)
+            print(f"[compress-downloads] {dst.name}: {st.st_size / 1e6:.1f} -> "
+                  f"{dst.stat().st_size / 1e6:.1f} MB in {time.time()-t0:.1f}s")
+    return built
+
+# =========================================================
+# ============ MSigDB pathway descriptions ================
+# =========================================================
+# DESCRIPTION_BRIEF / PMID / AUTHORS of every pathway's MSigDB gene set, prefetched into
+# one JSON file keyed by upper-case pathway name. main.py serves it from memory and
+# refreshes stale entries in the background. Failed fetches are kept as {"error"} (or
+# {"refresh_error"} on top of a good entry) with a failure count, and retried after
+# DESCRIPTION_RETRY_S doubling per consecutive failure, up to DESCRIPTION_ERROR_TTL_S.
+# Only permanent failures (the gene set isn't in MSigDB) are written to the file;
+# transient ones (timeouts, connection errors, 429 / 5xx) stay in memory.
+
+MSIGDB_URL = os.environ.get("MSIGDB_URL", "https://www.gsea-msigdb.org/gsea/msigdb/human/download_geneset.jsp")
+MSIGDB_TIMEOUT_S = float(os.environ.get("MSIGDB_TIMEOUT_S", 10))
+DESCRIPTIONS_PATH = DATA_DIR / "msigdb_descriptions.json"
+DESCRIPTION_TTL_S = float(os.environ.get("DESCRIPTION_TTL_S", 30 * 24 * 3600))
+DESCRIPTION_ERROR_TTL_S = float(os.environ.get("DESCRIPTION_ERROR_TTL_S", 24 * 3600))
+DESCRIPTION_RETRY_S = float(os.environ.get("DESCRIPTION_RETRY_S", 120))
+GENESET_DIR = BACKEND_DIR / "geneset_files"
+
+def msigdb_geneset_name(pathway: str) -> str:
+    p = pathway.upper()
+    return "SINGH_NFE2L2_TARGETS" if p == "NRF2" else f"{p}_TARGET_GENES"
+
+def fetch_msigdb_description(pathway: str, timeout: float = MSIGDB_TIMEOUT_S) -> dict:
+    """One pathway's entry from the MSigDB TSV export; raises on HTTP or format errors."""
+    r = requests.get(MSIGDB_URL, params={"geneSetName": msigdb_geneset_name(pathway), "fileType": "TSV"},
+                     timeout=timeout)
+    r.raise_for_status()
+    rows = list(csv.reader(io.StringIO(r.text), delimiter="\t"))
+    # first row is the header (STANDARD_NAME <name>), then one key/value per row
+    if not rows or len(rows[0]) < 2:
+        raise ValueError(f"Unexpected TSV format for {pathway}")
+    meta = {row[0]: (row[1] or None) for row in rows[1:] if len(row) >= 2}
+    return {
+        "pathway": pathway.upper(),
+        "description": meta.get("DESCRIPTION_BRIEF"),
+        "pubmed": meta.get("PMID"),
+        "authors": meta.get("AUTHORS"),
+        "fetched_at": time.time(),
+    }
+
+def description_checked_at(entry: dict) -> float:
+    return entry.get("checked_at", entry.get("fetched_at", 0))
+
+def description_retry_s(failures: int) -> float:
+    """Wait before retrying after `failures` consecutive failed fetches."""
+    return min(DESCRIPTION_ERROR_TTL_S, DESCRIPTION_RETRY_S * 2 ** max(0, failures - 1))
+
+def description_is_stale(entry: dict, now: float | None = None) -> bool:
+    now = time.time() if now is None else now
+    if "error" in entry or "refresh_error" in entry:
+        ttl = description_retry_s(entry.get("failures", 1))
+    else:
+        ttl = DESCRIPTION_TTL_S
+    return now - description_checked_at(entry) > ttl
+
+def _is_transient(e: Exception) -> bool:
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+def load_descriptions(path: Path = DESCRIPTIONS_PATH) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+def save_descriptions(entries: dict, path: Path = DESCRIPTIONS_PATH) -> dict:
+    """Merge entries into the file (other workers may have written it too); returns the result."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merged = load_descriptions(path)
+        merged.update(entries)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(merged, sort_keys=True))
+        tmp.replace(path)
+    return merged
+
+def refresh_description(pathway: str, old: dict | None = None) -> dict:
+    """
+    Fetch one entry; on failure keep a previously good entry and mark when it was checked.
+    Failed entries count consecutive failures and carry "transient" when worth retrying soon.
+    """
+    try:
+        return fetch_msigdb_description(pathway)
+    except Exception as e:
+        now = time.time()
+        failed_before = old is not None and ("error" in old or "refresh_error" in old)
+        failure = {"failures": old.get("failures", 1) + 1 if failed_before else 1,
+                   "transient": _is_transient(e)}
+        if old is not None and "error" not in old:
+            return dict(old, checked_at=now, refresh_error=str(e), **failure)
+        return {"pathway": pathway.upper(), "error": str(e), "fetched_at": now, **failure}
+
+def persistable_descriptions(entries: dict) -> dict:
+    """The entries worth writing to the store: everything but transient failures."""
+    return {k: e for k, e in entries.items() if not e.get("transient")}
+
+def known_pathways() -> list[str]:
+    """Pathway columns of the score matrix plus every geneset_files/<pathway>_geneset.csv."""
+    store = load_score_store(None)
+    names = set(store["pathways"]) if store is not None else set()
+    if not names and SCORE_MATRIX_CSV.exists():
+        names = set(pd.read_csv(SCORE_MATRIX_CSV, index_col=0, nrows=0).columns)
+    names |= {p.name[:-len("_geneset.csv")] for p in GENESET_DIR.glob("*_geneset.csv")}
+    return sorted(names)
+
+def build_descriptions(pathways: list[str] | None = None, force: bool = False, workers: int = 8,
+                       path: Path = DESCRIPTIONS_PATH) -> int:
+    t0 = time.time()
+    current = load_descriptions(path)
+    keys = sorted({p.upper() for p in (pathways or known_pathways())})
+    todo = [k for k in keys if force or k not in current or description_is_stale(current[k])]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        fetched = dict(zip(todo, pool.map(lambda k: refresh_description(k, current.get(k)), todo)))
+    save_descriptions(persistable_descriptions(fetched), path)
+    failed = sum("error" in e for e in fetched.values())
+    print(f"[descriptions] fetched {len(fetched)} of {len(keys)} ({failed} failed) in {time.time()-t0:.1f}s -> {path}")
+    return len(fetched)
+
+# -----------------------
+# CLI
+# -----------------------
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build precomputed backend artifacts.")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("score-matrix", help="protein x pathway CSV as a memory-mapped float32 .npy + ranking")
+    p.add_argument("--force", action="store_true", help="rebuild even if up to date")
+
+    p = sub.add_parser("plot-arena", help="/plot vectors as a shared memory-mapped generation (ARENA_DIR)")
+    p.add_argument("--force", action="store_true", help="publish a new generation even if up to date")
+
+    p = sub.add_parser("flatmap-grids", help="per-gene flatmap interpolation grids (.npy)")
+    p.add_argument("--genes", nargs="*", help="default: every data/*_nmfinfo_final.csv")
+    p.add_argument("--force", action="store_true", help="rebuild even if up to date")
+
+    p = sub.add_parser("bundles", help="per-gene nmfinfo/gdf CSVs as memory-mappable Arrow files")
+    p.add_argument("--genes", nargs="*", help="default: every data/*_nmfinfo_final.csv")
+    p.add_argument("--force", action="store_true", help="rebuild even if up to date")
+
+    p = sub.add_parser("gi-matrices", help="per-gene residue/cluster x pathway GI* matrices (.npy); run after bundles")
+    p.add_argument("--genes", nargs="*", help="default: every data/*_nmfinfo_final.csv")
+    p.add_argument("--force", action="store_true", help="rebuild even if up to date")
+
+    p = sub.add_parser("string-index", help="local STRING snapshot as a CSR edge index (.npy)")
+    p.add_argument("--links", type=Path, required=True, help="<species>.protein.links.*.txt[.gz]")
+    p.add_argument("--info", type=Path, required=True, help="<species>.protein.info.*.txt[.gz] (preferred names)")
+    p.add_argument("--min-score", type=int, default=0, help="drop links below this combined_score (0-1000)")
+
+    p = sub.add_parser("warm-renders", help="pre-render PNGs into the render cache (loads main.py)")
+    p.add_argument("--genes", nargs="*", help="default: most requested genes, else all with nmfinfo")
+    p.add_argument("--top", type=int, default=20, help="how many popular genes to warm")
+
+    p = sub.add_parser("compress-downloads", help="gzip/zstd variants of the /downloads files (data/precompressed)")
+    p.add_argument("--files", nargs="*", type=Path, help="default: every file in main.DOWNLOADABLES (loads main.py)")
+    p.add_argument("--force", action="store_true", help="rebuild even if up to date")
+
+    p = sub.add_parser("descriptions", help="MSigDB descriptions of every pathway (data/msigdb_descriptions.json)")
+    p.add_argument("--pathways", nargs="*", help="default: score matrix columns + geneset_files")
+    p.add_argument("--force", action="store_true", help="refetch even if fresh")
+    p.add_argument("--workers", type=int, default=8, help="parallel requests to MSigDB")
+
+    args = ap.parse_args(argv)
+    if args.command == "score-matrix":
+        built = build_score_store(force=args.force)
+        print(f"[score-matrix] {'built' if built else 'up to date'}")
+    elif args.command == "plot-arena":
+        gen, _, arrays = ensure_plot_arena(force=args.force)
+        print(f"[plot-arena] current generation {gen} {arrays['raw'].shape}")
+    elif args.command == "flatmap-grids":
+        built = build_flatmap_grids(args.genes, force=args.force)
+        print(f"[flatmap-grids] built {len(built)} grid(s)")
+    elif args.command == "bundles":
+        built = build_gene_bundles(args.genes, force=args.force)
+        print(f"[bundles] wrote {len(built)} file(s)")
+    elif args.command == "gi-matrices":
+        built = build_gi_matrices(args.genes, force=args.force)
+        print(f"[gi-matrices] built {len(built)} matrix set(s)")
+    elif args.command == "string-index":
+        build_string_index(args.links, args.info, min_score=args.min_score)
+    elif args.command == "warm-renders":
+        import main as backend  # run from the backend directory; importing loads no data
+        backend.RENDER_CACHE.load_popular()
+        backend.RENDER_CACHE.prune()
+        try:
+            backend.warm_render_cache(args.genes, top=args.top)
+        finally:
+            backend.RENDER_POOL.shutdown()
+    elif args.command == "descriptions":
+        build_descriptions(args.pathways, force=args.force, workers=args.workers)
+    elif args.command == "compress-downloads":
+        files = args.files
+        if not files:
+            import main as backend
+            files = [p for p in map(backend.download_path, backend.DOWNLOADABLES) if p is not None]
+        built = build_precompressed(files, force=args.force)
+        print(f"[compress-downloads] wrote {len(built)} file(s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,61 @@
 # backend/main.py
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, Response
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
 from pathlib import Path
 import json
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 import plotly.graph_objects as go
+from scipy import sparse
+from scipy.stats import hypergeom
 import re
 import math
 import io
+import os
 import time
+import hashlib
+import shutil
+import threading
 import traceback
+import zipfile
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager
+from functools import cached_property
+from urllib.parse import quote
+
+import render_service
+from render_service import RenderPool, RenderOverloaded, RenderTimeout
+from build_artifacts import (ARENA_DIR, BACKEND_DIR, DATA_DIR, DESCRIPTIONS_PATH, DOWNLOAD_ENCODINGS, GENESET_DIR,
+                             PLOT_OUT_DIR, SCORE_MATRIX_CSV,
+                             arena_current, attach_arena, build_score_store, compute_plot_arrays,
+                             description_checked_at, description_is_stale, ensure_plot_arena, gene_pathways,
+                             genes_with_nmf, l2_normalize_rows, load_descriptions, load_score_store,
+                             persistable_descriptions, precompressed_variant, rank_columns, refresh_description,
+                             save_descriptions, signature_version, source_signature)
+from string_client import StringClient, STRING_SOURCE, get_string_index
+from response_layer import FastJSONResponse, CompressionMiddleware, PrecompressedBody, accepted_encodings, dumps
 
-# --- matplotlib headless backend (for Panel 2) ---
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap, TwoSlopeNorm
-from scipy.interpolate import griddata
-from matplotlib import cm
-import matplotlib.patheffects as patheffects
 
 # -----------------------
 # FastAPI app
 # -----------------------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # data is loaded here, not at import (see STARTUP at the end of this file), so that
+    # `import main` (tests, build_artifacts.py commands) has no side effects
+    startup()
+    yield
+    shutdown()
+
+# Endpoints with large bodies return FastJSONResponse themselves (numpy arrays as they are);
+# the default class only speeds up encoding of everything else.
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,74 +63,328 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)  # gzip / br above COMPRESS_MIN_BYTES (see response_layer.py)
 
 @app.get("/")
 def root():
     return {"message": "Backend is running!"}
 
+# =========================================================
+# ========== REFERENCE DATA (CSV lookup tables) ===========
+# =========================================================
+
+REFERENCE_RELOAD_CHECK_S = 2.0  # how often a table stats its file for changes
+
+class ReferenceTable:
+    """
+    A small CSV parsed on first use and indexed by an upper-cased, stripped key column.
+    Lookups are dict hits; the file is re-read when its mtime/size changes
+    (checked at most every REFERENCE_RELOAD_CHECK_S), so the data can be replaced
+    without a restart. A missing file or key column gives an empty table.
+    """
+    def __init__(self, path: str | Path, key: str, prepare=None):
+        self.path = Path(path)
+        self.key = key
+        self.prepare = prepare           # optional df -> df applied after read_csv
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._state = None
+
+    def _signature(self):
+        try:
+            st = self.path.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _load(self, sig):
+        df = pd.DataFrame()
+        if sig is not None:
+            try:
+                df = pd.read_csv(self.path)
+                if self.prepare is not None:
+                    df = self.prepare(df)
+            except Exception as e:
+                print(f"[reference][WARN] Could not read {self.path}:", e)
+                if self._state is not None:
+                    return  # keep serving the previous table; retried on the next check
+        df = df.reset_index(drop=True)
+        if self.key in df.columns:
+            keys = df[self.key].astype(str).str.strip().str.upper()
+            index = dict(keys.groupby(keys, sort=False).indices)
+        else:
+            if sig is not None and not df.empty:
+                print(f"[reference][WARN] {self.path} has no '{self.key}' column")
+            index = {}
+        values = df.to_numpy(dtype=object)  # row -> dict without building a Series per lookup
+        # swap in one assignment so readers never see a half-built table
+        self._state = (sig, df, index, values)
+
+    def _current(self):
+        now = time.monotonic()
+        if self._state is None or now - self._checked >= REFERENCE_RELOAD_CHECK_S:
+            with self._lock:
+                if self._state is None:
+                    self._checked = now
+                    self._load(self._signature())
+                elif now - self._checked >= REFERENCE_RELOAD_CHECK_S:
+                    self._checked = now
+                    sig = self._signature()
+                    if sig != self._state[0]:
+                        self._load(sig)
+                        if self._state[0] == sig:
+                            print(f"[reference] reloaded {self.path} ({len(self._state[1])} rows)")
+        return self._state
+
+    @property
+    def df(self) -> pd.DataFrame:
+        return self._current()[1]
+
+    def rows(self, key: str) -> pd.DataFrame:
+        """All rows for a key (case-insensitive), in file order; empty frame if none."""
+        _, df, index, _ = self._current()
+        pos = index.get(str(key).strip().upper())
+        return df.iloc[pos] if pos is not None else df.iloc[:0]
+
+    def first(self, key: str) -> dict | None:
+        """The first row for a key as a dict, or None."""
+        _, df, index, values = self._current()
+        pos = index.get(str(key).strip().upper())
+        return dict(zip(df.columns, values[pos[0]])) if pos is not None else None
+
+def _lowercase_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.rename(columns=lambda c: str(c).lower().strip())
+
+GROUP_LABELS = ReferenceTable(BACKEND_DIR / "llm_group_labels.csv", key="gene")
+TF_GROUPS = ReferenceTable(BACKEND_DIR / "tf_function_labels_10groups.csv", key="TF")
+GENE_INFO = ReferenceTable(BACKEND_DIR / "cleaned_mappings_2.csv", key="Gene Names")
+GENE_TO_PDB = ReferenceTable(BACKEND_DIR / "gene_to_pdb.csv", key="gene", prepare=_lowercase_columns)
+CALIBRATION = ReferenceTable(BACKEND_DIR / "calibration.csv", key="gene")
+DRUG_AUC = ReferenceTable(BACKEND_DIR / "drug_AUC.csv", key="gene")
+
 # =========================================================
 # =============== PANEL 5: /plot endpoints ================
 # =========================================================
 
-OUT_DIR = Path("protein_map_outputs")  # must contain manifest.json
+# "dense" (default) | "sparse" | "auto" (sparse when at most SPARSE_MAX_DENSITY of entries are nonzero)
+SCORE_BACKEND = os.environ.get("SCORE_BACKEND", "dense").lower()
+SPARSE_MAX_DENSITY = 0.25
 
-def _load_artifacts(base: Path = OUT_DIR):
-    t0 = time.time()
-    man_path = base / "manifest.json"
-    if not man_path.exists():
-        raise RuntimeError(f"manifest.json not found under {base.resolve()}")
-    with open(man_path) as f:
-        m = json.load(f)
+class DenseScoreMatrix:
+    """(N, P) float32 protein x pathway scores as one contiguous array."""
+    kind = "dense"
 
-    vecs_path   = base / m["vectors_parquet"]
-    coords_path = base / m["coords_parquet"]
+    def __init__(self, X):
+        self.X = np.ascontiguousarray(X, dtype=np.float32)
 
-    if not vecs_path.exists():
-        raise RuntimeError(f"vectors parquet missing: {vecs_path.resolve()}")
-    if not coords_path.exists():
-        raise RuntimeError(f"coords parquet missing: {coords_path.resolve()}")
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.X.shape
 
-    vecs   = pd.read_parquet(vecs_path).set_index("protein_id")
-    coords = pd.read_parquet(coords_path)
+    @property
+    def size(self) -> int:
+        return self.X.size
 
-    if "protein_id" not in coords.columns or "x" not in coords.columns or "y" not in coords.columns:
-        raise RuntimeError("coords parquet must have columns: protein_id, x, y")
+    @property
+    def nbytes(self) -> int:
+        return self.X.nbytes
 
-    # Normalize vectors once for cosine
-    V = vecs.values.astype(np.float32)
-    V = V / (np.linalg.norm(V, axis=1, keepdims=True) + 1e-12)
-    ids = vecs.index.to_numpy()
+    def row(self, i: int) -> np.ndarray:
+        return self.X[i]
 
-    print(f"[LOAD] vectors={V.shape} coords={coords.shape} in {time.time()-t0:.3f}s")
-    return m, vecs, coords, V, ids
+    def rows(self, idx) -> np.ndarray:
+        return self.X[idx]
 
-try:
-    _MAN, _VECS_DF, _COORDS, _V_NORM, _IDS = _load_artifacts()
-except Exception as e:
-    # Don’t crash app; expose clear message on /plot_ping
-    _MAN = {}
-    _VECS_DF = pd.DataFrame()
-    _COORDS = pd.DataFrame(columns=["protein_id","x","y"])
-    _V_NORM = np.zeros((0,0), dtype=np.float32)
-    _IDS = np.array([], dtype=object)
-    print("[LOAD][ERROR]", e)
-    traceback.print_exc()
-
-def _topk_cosine(query_protein: str, k: int = 10) -> pd.DataFrame:
-    if _V_NORM.size == 0 or _VECS_DF.empty:
+    def row_nonzero(self, i: int, thresh: float = 0.0):
+        """(column indices, values) of row i where value > thresh."""
+        r = self.X[i]
+        cols = np.flatnonzero(r > thresh)
+        return cols, r[cols]
+
+    def column(self, j: int, thresh: float = 0.0):
+        """(row indices, values) of column j where value > thresh."""
+        c = self.X[:, j]
+        rows = np.flatnonzero(c > thresh)
+        return rows, c[rows]
+
+    def matmul(self, Q: np.ndarray) -> np.ndarray:
+        """X @ Q as a dense array."""
+        return self.X @ Q
+
+    def lmul(self, A) -> np.ndarray:
+        """A @ X as a dense array (A may be scipy sparse)."""
+        return np.asarray(A @ self.X)
+
+    def any_positive(self) -> np.ndarray:
+        return (self.X > 0).any(axis=1)
+
+    def positive_entries(self):
+        """(rows, cols, values) of every entry > 0, row-major."""
+        r, c = np.nonzero(self.X > 0)
+        return r, c, self.X[r, c]
+
+    def normalized(self) -> "DenseScoreMatrix":
+        return DenseScoreMatrix(l2_normalize_rows(self.X))
+
+class SparseScoreMatrix:
+    """
+    Same interface as DenseScoreMatrix, stored as CSR (row = protein) plus CSC (column = pathway).
+    Only nonzeros are kept, so thresholds below 0 fall back to densifying the requested slice.
+    """
+    kind = "sparse"
+
+    def __init__(self, X):
+        self.csr = sparse.csr_matrix(X, dtype=np.float32)
+        self.csr.sort_indices()
+        self.csc = self.csr.tocsc()
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.csr.shape
+
+    @property
+    def size(self) -> int:
+        return self.csr.shape[0] * self.csr.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for m in (self.csr, self.csc) for a in (m.data, m.indices, m.indptr))
+
+    def row(self, i: int) -> np.ndarray:
+        return self.csr[i].toarray()[0]
+
+    def rows(self, idx) -> np.ndarray:
+        return self.csr[idx].toarray()
+
+    def row_nonzero(self, i: int, thresh: float = 0.0):
+        if thresh < 0:
+            return DenseScoreMatrix(self.csr[i].toarray()).row_nonzero(0, thresh)
+        s, e = self.csr.indptr[i], self.csr.indptr[i + 1]
+        cols, vals = self.csr.indices[s:e], self.csr.data[s:e]
+        keep = vals > thresh
+        return cols[keep], vals[keep]
+
+    def column(self, j: int, thresh: float = 0.0):
+        if thresh < 0:
+            return DenseScoreMatrix(self.csc[:, j].toarray()).column(0, thresh)
+        s, e = self.csc.indptr[j], self.csc.indptr[j + 1]
+        rows, vals = self.csc.indices[s:e], self.csc.data[s:e]
+        keep = vals > thresh
+        return rows[keep], vals[keep]
+
+    def matmul(self, Q: np.ndarray) -> np.ndarray:
+        return np.asarray(self.csr @ Q)
+
+    def lmul(self, A) -> np.ndarray:
+        out = A @ self.csr
+        return out.toarray() if sparse.issparse(out) else np.asarray(out)
+
+    def any_positive(self) -> np.ndarray:
+        return (self.csr > 0).getnnz(axis=1) > 0
+
+    def positive_entries(self):
+        coo = self.csr.tocoo()
+        keep = coo.data > 0
+        return coo.row[keep], coo.col[keep], coo.data[keep]
+
+    def normalized(self) -> "SparseScoreMatrix":
+        norms = np.sqrt(np.asarray(self.csr.multiply(self.csr).sum(axis=1)).ravel())
+        return SparseScoreMatrix(sparse.diags(1.0 / (norms + 1e-12)).astype(np.float32) @ self.csr)
+
+def make_score_matrix(X, backend: str = SCORE_BACKEND):
+    X = np.asarray(X, dtype=np.float32)
+    if backend == "auto":
+        density = np.count_nonzero(X) / max(1, X.size)
+        backend = "sparse" if density <= SPARSE_MAX_DENSITY else "dense"
+    if backend == "sparse":
+        return SparseScoreMatrix(X)
+    if backend != "dense":
+        raise ValueError(f"Unknown score backend '{backend}'. Use dense, sparse or auto.")
+    return DenseScoreMatrix(X)
+
+class ProteinRegistry:
+    """
+    Loaded-once protein index for the request path.
+    - row_of / aliases: protein id (exact, then case-insensitive) -> row, O(1)
+    - pathway_col: pathway name -> column, O(1)
+    - raw / v_norm: (N, P) float32 pathway scores and their L2-normalized rows, as a
+      DenseScoreMatrix or SparseScoreMatrix (see SCORE_BACKEND)
+    - annotated: per-row "has any nonzero pathway score" bitmap
+    - xy: 2D map coordinates aligned to rows (NaN where the coords parquet has none)
+    annotated / v_norm may be passed in precomputed (e.g. memory-mapped from the arena).
+    """
+    def __init__(self, ids, pathways, raw, xy: np.ndarray | None = None, backend: str = SCORE_BACKEND,
+                 annotated: np.ndarray | None = None, v_norm: np.ndarray | None = None):
+        self.ids = np.asarray(ids, dtype=object)
+        self.pathways = np.asarray(pathways, dtype=object)
+        self.raw = raw if hasattr(raw, "matmul") else make_score_matrix(raw, backend)
+        if annotated is None:
+            annotated = self.raw.any_positive() if self.raw.size else np.zeros(len(self.ids), dtype=bool)
+        self.annotated = annotated
+        self.xy = (np.full((len(self.ids), 2), np.nan, dtype=np.float32) if xy is None
+                   else np.ascontiguousarray(xy, dtype=np.float32))
+        if v_norm is not None and self.raw.kind == "dense":
+            self.__dict__["v_norm"] = DenseScoreMatrix(v_norm)  # seeds the cached_property
+
+        self.row_of: dict[str, int] = {}
+        self.aliases: dict[str, int] = {}
+        for i, pid in enumerate(self.ids):
+            self.row_of.setdefault(pid, i)
+            self.aliases.setdefault(str(pid).strip().upper(), i)
+        self.pathway_col = {pw: j for j, pw in enumerate(self.pathways)}
+
+    @cached_property
+    def v_norm(self):
+        return self.raw.normalized()
+
+    @classmethod
+    def from_frames(cls, vecs: pd.DataFrame, coords: pd.DataFrame | None = None,
+                    backend: str = SCORE_BACKEND) -> "ProteinRegistry":
+        xy = None
+        if coords is not None:
+            xy = (coords.drop_duplicates("protein_id").set_index("protein_id")[["x", "y"]]
+                  .reindex(vecs.index).to_numpy(dtype=np.float32))
+        return cls(vecs.index.to_numpy(), vecs.columns.to_numpy(), vecs.to_numpy(dtype=np.float32), xy, backend)
+
+    @classmethod
+    def from_arena(cls, meta: dict, arrays: dict, backend: str = SCORE_BACKEND) -> "ProteinRegistry":
+        return cls(meta["proteins"], meta["pathways"], arrays["raw"], arrays["xy"], backend,
+                   annotated=arrays["annotated"], v_norm=arrays["v_norm"])
+
+    @classmethod
+    def empty_registry(cls) -> "ProteinRegistry":
+        return cls([], [], np.zeros((0, 0), dtype=np.float32), backend="dense")
+
+    @property
+    def empty(self) -> bool:
+        return self.raw.size == 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, gene) -> int | None:
+        """Row index for a gene id (exact match, else case-insensitive alias), or None."""
+        i = self.row_of.get(gene)
+        if i is None and isinstance(gene, str):
+            i = self.aliases.get(gene.strip().upper())
+        return i
+
+    def rows(self, genes) -> np.ndarray:
+        """Row indices for many genes; -1 where unknown."""
+        return np.fromiter((-1 if (i := self.row(g)) is None else i for g in genes),
+                           dtype=np.int64, count=len(genes))
+
+def _topk_cosine(reg: ProteinRegistry, query_protein: str, k: int = 10) -> pd.DataFrame:
+    if reg.empty:
         raise RuntimeError("Embeddings not loaded. Check protein_map_outputs/manifest.json and parquet files.")
 
-    if query_protein not in _VECS_DF.index:
+    row = reg.row(query_protein)
+    if row is None:
         raise KeyError(f"{query_protein} not found in vectors index")
 
-    q = _VECS_DF.loc[query_protein].values.astype(np.float32)
-    q = q / (np.linalg.norm(q) + 1e-12)        # normalize query once
-
-    sims = _V_NORM @ q                          # (N, D) dot (D,) -> (N,)
-    # remove self
-    idx_self = np.where(_IDS == query_protein)[0]
-    if idx_self.size:
-        sims[idx_self[0]] = -np.inf
+    V = reg.v_norm
+    sims = V.matmul(V.row(row))                 # (N, D) dot (D,) -> (N,)
+    sims[row] = -np.inf                         # remove self
 
     k = int(max(1, min(k, len(sims)-1)))
     topk_idx = np.argpartition(-sims, kth=k)[:k]
@@ -108,70 +392,470 @@ def _topk_cosine(query_protein: str, k: int = 10) -> pd.DataFrame:
     topk_idx = topk_idx[order]
 
     return pd.DataFrame({
-        "protein_id": _IDS[topk_idx],
+        "protein_id": reg.ids[topk_idx],
         "cosine_sim": sims[topk_idx].astype(float)
     })
 
-def _shared_pathways(query_protein: str, others: list[str], thresh: float = 0.0) -> pd.DataFrame:
-    # pathways = vector columns
-    if _VECS_DF.empty:
-        return pd.DataFrame(columns=["other_protein","pathway_id","score_query","score_other","joint_score"])
-
-    q_vec = _VECS_DF.loc[query_protein]
-    q_present = (q_vec > thresh).values
-    pathways = _VECS_DF.columns.to_numpy()
+# ---------------- Neighbour engines ----------------
+# "exact" = brute-force scan (_topk_cosine), "knn" = precomputed edges parquet,
+# "ann" = Annoy index from the manifest, or a NumPy IVF index when annoy is unavailable.
+try:
+    from annoy import AnnoyIndex
+except ImportError:
+    AnnoyIndex = None
+
+NEIGHBOR_ENGINES = ("exact", "knn", "ann")
+
+class ExactNeighbors:
+    name = "exact"
+
+    def __init__(self, reg: ProteinRegistry):
+        self.reg = reg
+
+    def query(self, protein: str, k: int) -> pd.DataFrame:
+        return _topk_cosine(self.reg, protein, k=k)
+
+class KnnTableNeighbors:
+    """Answers topk <= k_neighbors straight from protein_knn_edges.parquet."""
+    name = "knn"
+
+    def __init__(self, edges: pd.DataFrame, k_neighbors: int, reg: ProteinRegistry):
+        self.reg = reg
+        # edges built against a different vector set must not return unknown proteins; a
+        # source that lost any edge no longer has its true top-k in the table
+        known = edges["target"].isin(reg.ids)
+        edges = edges[known & ~edges["source"].isin(edges.loc[~known, "source"].unique())]
+        edges = edges.sort_values(["source", "cosine_sim"], ascending=[True, False], kind="stable")
+        src = edges["source"].astype(str).to_numpy()
+        self.targets = edges["target"].astype(str).to_numpy()
+        self.sims = edges["cosine_sim"].to_numpy(dtype=np.float32)
+        starts = np.flatnonzero(np.r_[True, src[1:] != src[:-1]]) if len(src) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(src)]
+        self.slices = {src[s]: (s, e) for s, e in zip(starts, ends)}
+        self.k_neighbors = int(k_neighbors)
+
+    def query(self, protein: str, k: int) -> pd.DataFrame:
+        s, e = self.slices.get(protein, (0, 0))
+        if k > self.k_neighbors or e - s < k:
+            # table can't answer this one (too few edges, or some were dropped above);
+            # fall back to the exact scan
+            return _topk_cosine(self.reg, protein, k=k)
+        e = s + k
+        return pd.DataFrame({
+            "protein_id": self.targets[s:e],
+            "cosine_sim": self.sims[s:e].astype(float),
+        })
+
+class AnnoyNeighbors:
+    name = "ann"
+
+    def __init__(self, index_path: Path, id_map: pd.DataFrame, dim: int, metric: str):
+        self.index = AnnoyIndex(dim, metric)
+        self.index.load(str(index_path))  # mmap'd by annoy
+        id_map = id_map.sort_values("annoy_id")
+        self.item_to_pid = dict(zip(id_map["annoy_id"].astype(int), id_map["protein_id"].astype(str)))
+        self.pid_to_item = {p: i for i, p in self.item_to_pid.items()}
+
+    def query(self, protein: str, k: int) -> pd.DataFrame:
+        if protein not in self.pid_to_item:
+            raise KeyError(f"{protein} not found in annoy id map")
+        items, dists = self.index.get_nns_by_item(self.pid_to_item[protein], k + 1, include_distances=True)
+        pairs = [(self.item_to_pid[i], d) for i, d in zip(items, dists) if self.item_to_pid.get(i) != protein][:k]
+        # annoy angular distance = sqrt(2 * (1 - cos))
+        return pd.DataFrame({
+            "protein_id": [p for p, _ in pairs],
+            "cosine_sim": [1.0 - d * d / 2.0 for _, d in pairs],
+        })
+
+class IVFNeighbors:
+    """
+    Pure-NumPy inverted-file index over reg.v_norm (spherical k-means lists).
+    Built on first use; nprobe trades recall for latency.
+    """
+    name = "ann"
+
+    def __init__(self, reg: ProteinRegistry, n_lists: int | None = None,
+                 nprobe: int = 8, n_iter: int = 10, seed: int = 0):
+        V = reg.v_norm
+        self.V = V
+        self.reg = reg
+        self.nprobe = nprobe
+        n = V.shape[0]
+        n_lists = n_lists or max(1, int(math.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        C = V.rows(rng.choice(n, size=min(n_lists, n), replace=False)).copy()
+        for _ in range(n_iter):
+            assign = np.argmax(V.matmul(C.T), axis=1)
+            onehot = sparse.csr_matrix((np.ones(n, dtype=np.float32), (assign, np.arange(n))),
+                                       shape=(len(C), n))
+            sums = V.lmul(onehot)                                  # per-list sum of member rows
+            filled = np.bincount(assign, minlength=len(C)) > 0     # empty lists keep their centroid
+            C[filled] = sums[filled] / (np.linalg.norm(sums[filled], axis=1, keepdims=True) + 1e-12)
+        assign = np.argmax(V.matmul(C.T), axis=1)
+        self.centroids = C
+        order = np.argsort(assign, kind="stable")
+        self.list_rows = np.split(order, np.cumsum(np.bincount(assign, minlength=len(C)))[:-1])
+
+    def query(self, protein: str, k: int) -> pd.DataFrame:
+        qi = self.reg.row(protein)
+        if qi is None:
+            raise KeyError(f"{protein} not found in vectors index")
+        q = self.V.row(qi)
+        probe = np.argsort(-(self.centroids @ q))[:self.nprobe]
+        cand = np.concatenate([self.list_rows[c] for c in probe])
+        cand = cand[cand != qi]
+        sims = self.V.rows(cand) @ q
+        k = min(k, len(cand))
+        top = np.argpartition(-sims, kth=k - 1)[:k] if k < len(cand) else np.arange(len(cand))
+        top = top[np.argsort(-sims[top])]
+        return pd.DataFrame({
+            "protein_id": self.reg.ids[cand[top]],
+            "cosine_sim": sims[top].astype(float),
+        })
+
+def _load_neighbor_engines(base: Path, man: dict, reg: ProteinRegistry) -> dict:
+    engines = {"exact": ExactNeighbors(reg)}
+    if not man:
+        return engines
+
+    edges_name = man.get("edges_parquet")
+    if edges_name and (base / edges_name).exists():
+        try:
+            edges = pd.read_parquet(base / edges_name)
+            engines["knn"] = KnnTableNeighbors(edges, man.get("k_neighbors", 0), reg)
+        except Exception as e:
+            print("[LOAD][WARN] knn edges unavailable:", e)
+
+    ann_name, map_name = man.get("annoy_index"), man.get("annoy_id_map")
+    if AnnoyIndex is not None and ann_name and map_name \
+            and (base / ann_name).exists() and (base / map_name).exists():
+        try:
+            engines["ann"] = AnnoyNeighbors(base / ann_name, pd.read_parquet(base / map_name),
+                                            int(man["dim"]), man.get("metric", "angular"))
+        except Exception as e:
+            print("[LOAD][WARN] annoy index unavailable:", e)
+    return engines
+
+# ---------------- Artifact snapshots + hot reload ----------------
+# Everything /plot serves from one protein_map_outputs build lives in one immutable
+# PlotSnapshot. Requests take PLOT_ARTIFACTS.current once and use it throughout, so a
+# reload (one attribute assignment) never mixes two builds inside a request, and the
+# requests already running finish on the old snapshot.
+#
+# ArtifactManager swaps in a new snapshot when
+# - manifest.json changes (polled every PLOT_WATCH_S; deploy by writing it last),
+# - POST /admin/reload is called (X-Admin-Token must match ADMIN_TOKEN), or
+# - another worker publishes a newer arena generation (see build_artifacts.py plot-arena).
+# A failed reload keeps serving the previous snapshot.
+
+PLOT_WATCH_S = float(os.environ.get("PLOT_WATCH_S", 2.0))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+class PlotSnapshot:
+    def __init__(self, man: dict, reg: ProteinRegistry, engines: dict, generation: int | None,
+                 version: str | None, load_sec: float = 0.0, error: str | None = None):
+        self.man = man
+        self.reg = reg
+        self.engines = engines
+        self.generation = generation
+        self.version = version
+        self.loaded_at = time.time()
+        self.load_sec = load_sec
+        self.error = error
+        self._ivf_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, base: Path = PLOT_OUT_DIR, arena_dir: Path = ARENA_DIR, force: bool = False) -> "PlotSnapshot":
+        """
+        Build a snapshot from the shared arena: the first worker to start publishes it
+        and the others attach. If the arena cannot be written, this worker loads a
+        private copy (generation 0).
+        """
+        t0 = time.time()
+        try:
+            gen, meta, arrays = ensure_plot_arena(base, arena_dir, force=force)
+        except OSError as e:
+            print("[LOAD][WARN] plot arena unavailable, loading a private copy:", e)
+            gen, (meta, arrays) = 0, compute_plot_arrays(base)
+        return cls.from_arena(base, gen, meta, arrays, t0)
+
+    @classmethod
+    def from_arena(cls, base: Path, gen: int, meta: dict, arrays: dict, t0: float) -> "PlotSnapshot":
+        reg = ProteinRegistry.from_arena(meta, arrays)
+        engines = _load_neighbor_engines(base, meta["manifest"], reg)
+        version = meta["manifest"].get("version") or signature_version(meta["source"])
+        snap = cls(meta["manifest"], reg, engines, gen, str(version), time.time() - t0)
+        print(f"[LOAD] vectors={reg.v_norm.shape} ({reg.raw.kind}, {reg.raw.nbytes / 1e6:.1f} MB) "
+              f"coords={tuple(meta['coords_shape'])} version={snap.version} generation={gen} "
+              f"in {snap.load_sec:.3f}s")
+        return snap
+
+    @classmethod
+    def failed(cls, error: str) -> "PlotSnapshot":
+        reg = ProteinRegistry.empty_registry()
+        return cls({}, reg, {"exact": ExactNeighbors(reg)}, None, None, error=error)
+
+    def neighbor_engine(self, engine: str | None = None):
+        """Engine per request, else manifest 'neighbor_engine', else exact."""
+        name = (engine or self.man.get("neighbor_engine") or "exact").lower()
+        if name not in NEIGHBOR_ENGINES:
+            raise ValueError(f"Unknown engine '{name}'. Use one of: {', '.join(NEIGHBOR_ENGINES)}")
+        if name == "ann" and "ann" not in self.engines:
+            if self.reg.empty:
+                raise RuntimeError("Embeddings not loaded. Check protein_map_outputs/manifest.json and parquet files.")
+            # no annoy build on disk: fall back to the NumPy IVF index, built once per snapshot
+            with self._ivf_lock:
+                if "ann" not in self.engines:
+                    self.engines["ann"] = IVFNeighbors(self.reg, nprobe=int(self.man.get("ivf_nprobe", 8)))
+        return self.engines.get(name, self.engines["exact"])
+
+    def status(self) -> dict:
+        return {
+            "version": self.version,
+            "generation": self.generation,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at)),
+            "load_sec": round(self.load_sec, 3),
+            "proteins": len(self.reg),
+            "error": self.error,
+        }
 
-    out = []
-    for pid in others:
-        if pid not in _VECS_DF.index:
-            continue
-        p_vec = _VECS_DF.loc[pid]
-        both = q_present & (p_vec.values > thresh)
-        if not np.any(both):
+class ArtifactManager:
+    def __init__(self, base: Path = PLOT_OUT_DIR, arena_dir: Path = ARENA_DIR):
+        self.base = base
+        self.arena_dir = arena_dir
+        self.current = PlotSnapshot.failed("not loaded yet")
+        self.last_error: str | None = None
+        self._reload_lock = threading.Lock()  # one build at a time
+        self._manifest_sig = None
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def _manifest_stat(self):
+        try:
+            st = (self.base / "manifest.json").stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    def reload(self, force: bool = False) -> bool:
+        """Build a new snapshot and swap it in; on failure keep the current one. Blocks."""
+        with self._reload_lock:
+            self._manifest_sig = self._manifest_stat()
+            try:
+                snap = PlotSnapshot.load(self.base, self.arena_dir, force=force)
+            except Exception as e:
+                self.last_error = str(e)
+                print("[LOAD][ERROR]", e)
+                traceback.print_exc()
+                if self.current.reg.empty:
+                    self.current = PlotSnapshot.failed(str(e))
+                return False
+            self.current = snap
+            self.last_error = None
+            return True
+
+    def reload_in_background(self, force: bool = False) -> bool:
+        """Start a reload thread; False if one is already running."""
+        if self.reloading:
+            return False
+        threading.Thread(target=self.reload, args=(force,), daemon=True, name="plot-reload").start()
+        return True
+
+    def sync_generation(self):
+        """Adopt a newer arena generation published by another worker or the CLI."""
+        cur = arena_current(self.arena_dir)
+        if cur is None or self.current.generation in (0, cur["generation"]):
+            return
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            hit = attach_arena(self.arena_dir)
+            if hit is not None:
+                self.current = PlotSnapshot.from_arena(self.base, *hit, time.time())
+        except Exception as e:
+            print("[LOAD][WARN] could not attach arena generation", cur["generation"], e)
+        finally:
+            self._reload_lock.release()
+
+    def poll(self):
+        if self._manifest_stat() != self._manifest_sig:
+            self.reload()
+        else:
+            self.sync_generation()
+
+    def start_watcher(self, interval: float = PLOT_WATCH_S):
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    print("[LOAD][WARN] artifact watcher:", e)
+        self._watcher = threading.Thread(target=loop, daemon=True, name="plot-artifact-watcher")
+        self._watcher.start()
+
+    def stop_watcher(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+# loaded and watched from startup(); serves the "not loaded yet" snapshot until then
+PLOT_ARTIFACTS = ArtifactManager()
+
+@app.post("/admin/reload")
+def admin_reload(request: Request, force: bool = False, wait: bool = False):
+    """
+    Reload protein_map_outputs into a new snapshot (force: republish even if unchanged).
+    Runs in the background unless wait=true. Disabled unless ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN or request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+    if wait:
+        ok = PLOT_ARTIFACTS.reload(force=force)
+        return {"status": "ok" if ok else "failed", "error": PLOT_ARTIFACTS.last_error,
+                "artifacts": PLOT_ARTIFACTS.current.status()}
+    started = PLOT_ARTIFACTS.reload_in_background(force=force)
+    return JSONResponse(content={"status": "started" if started else "already running",
+                                 "artifacts": PLOT_ARTIFACTS.current.status()},
+                        status_code=202)
+
+def _topk_neighbors(snap: PlotSnapshot, query_protein: str, k: int = 10, engine: str | None = None) -> pd.DataFrame:
+    """Top-k neighbours via the selected engine (per request, else manifest 'neighbor_engine', else exact)."""
+    return snap.neighbor_engine(engine).query(query_protein, int(k))
+
+def _neighbor_recall(reg: ProteinRegistry, query_protein: str, nbrs_df: pd.DataFrame, k: int) -> float:
+    """Fraction of the brute-force top-k recovered by nbrs_df."""
+    exact = _topk_cosine(reg, query_protein, k=k)
+    if exact.empty:
+        return 1.0
+    hits = len(set(exact["protein_id"]) & set(nbrs_df["protein_id"]))
+    return hits / len(exact)
+
+BATCH_SIMS_BYTES = 256 * 1024 * 1024  # cap on the (chunk, N) float32 similarity block
+
+def _topk_cosine_batch(reg: ProteinRegistry, rows: np.ndarray, k: int = 10, max_bytes: int = BATCH_SIMS_BYTES):
+    """
+    Yield (rows_chunk, topk_idx, topk_sims) for query row indices, one GEMM per chunk.
+    Self matches are excluded; each result row is sorted by descending cosine.
+    """
+    if reg.empty:
+        raise RuntimeError("Embeddings not loaded. Check protein_map_outputs/manifest.json and parquet files.")
+    V = reg.v_norm
+    n = V.shape[0]
+    k = int(max(0, min(k, n - 1)))  # never more than the other proteins: self is excluded
+    chunk = max(1, int(max_bytes // (n * np.dtype(np.float32).itemsize)))
+
+    for start in range(0, len(rows), chunk):
+        q_rows = rows[start:start + chunk]
+        if k == 0:
+            empty = np.zeros((len(q_rows), 0))
+            yield q_rows, empty.astype(np.int64), empty.astype(np.float32)
             continue
-        shared = pathways[both]
-        q_scores = q_vec[both].values
-        p_scores = p_vec[both].values
-        joint = q_scores * p_scores
-        for pw, sq, sp, js in zip(shared, q_scores, p_scores, joint):
-            out.append({
-                "other_protein": pid,
-                "pathway_id": pw,
-                "score_query": float(sq),
-                "score_other": float(sp),
-                "joint_score": float(js),
-            })
-    if not out:
-        return pd.DataFrame(columns=["other_protein","pathway_id","score_query","score_other","joint_score"])
-    return (pd.DataFrame(out)
-            .sort_values(["other_protein","joint_score"], ascending=[True, False])
-            .reset_index(drop=True))
-
-def _plot_network(query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float = 0.6) -> go.Figure:
-    keep = [query] + nbrs_df["protein_id"].tolist()
-    pos = _COORDS[_COORDS["protein_id"].isin(keep)].set_index("protein_id")[["x","y"]].copy()
+        sims = V.matmul(V.rows(q_rows).T).T   # (N, D) @ (D, c) -> (c, N)
+        sims[np.arange(len(q_rows)), q_rows] = -np.inf  # remove self
+        part = np.argpartition(-sims, kth=k - 1, axis=1)[:, :k]
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_sims, axis=1)
+        yield q_rows, np.take_along_axis(part, order, axis=1), np.take_along_axis(part_sims, order, axis=1)
+
+SHARED_PW_COLUMNS = ["other_protein","pathway_id","score_query","score_other","joint_score"]
+
+def _shared_pathways_columns(reg: ProteinRegistry, query_protein: str, others: list[str], thresh: float = 0.0) -> dict:
+    """
+    Shared pathways (score > thresh in both) between the query and each neighbour, as column arrays
+    sorted by other_protein, then joint_score descending.
+    """
+    # pathways = vector columns
+    q_row = reg.row(query_protein)
+    if reg.empty or q_row is None or not len(others):
+        return {c: np.array([], dtype=object if c in ("other_protein", "pathway_id") else float)
+                for c in SHARED_PW_COLUMNS}
+
+    others = np.asarray(others, dtype=object)
+    rows = reg.rows(others)
+    others, rows = others[rows >= 0], rows[rows >= 0]
+
+    # one (k, P) neighbour block; a single mask gives every (neighbour, pathway) pair
+    q_vec = reg.raw.row(q_row)
+    block = reg.raw.rows(rows)
+    r, c = np.nonzero((block > thresh) & (q_vec > thresh))
+    score_query = q_vec[c].astype(float)
+    score_other = block[r, c].astype(float)
+    joint = score_query * score_other
+
+    _, name_rank = np.unique(others, return_inverse=True)
+    order = np.lexsort((-joint, name_rank[r]))
+    return {
+        "other_protein": others[r][order],
+        "pathway_id": reg.pathways[c][order],
+        "score_query": score_query[order],
+        "score_other": score_other[order],
+        "joint_score": joint[order],
+    }
+
+def _shared_pathways(reg: ProteinRegistry, query_protein: str, others: list[str], thresh: float = 0.0) -> pd.DataFrame:
+    return pd.DataFrame(_shared_pathways_columns(reg, query_protein, others, thresh), columns=SHARED_PW_COLUMNS)
+
+def _columns_json(cols: dict) -> dict:
+    """Column arrays -> {name: list} for a columnar JSON body."""
+    return {k: np.asarray(v).tolist() for k, v in cols.items()}
+
+def _network_layout(reg: ProteinRegistry, query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float = 0.6) -> dict:
+    """
+    Node positions and edges of the /plot network, shared by the Plotly figure and the compact payload.
+    - pos: (k+1, 2) coordinates in [-1, 1], query first, then neighbours in nbrs_df order
+    - nn_i, nn_j, nn_sim: neighbour pairs (indexes into nbrs_df) with cosine > nn_edge_threshold
+    """
+    nbr_ids = nbrs_df["protein_id"].tolist()
+    keep = [query] + nbr_ids
+    keep_rows = reg.rows(keep)
+    pos = reg.xy[np.maximum(keep_rows, 0)].astype(float)
+    pos[keep_rows < 0] = np.nan
 
     # fill missing coords near query
-    missing = set(keep) - set(pos.index)
-    if missing:
-        cx, cy = (pos.loc[query].values if query in pos.index else (0.0, 0.0))
+    missing = np.isnan(pos).any(axis=1)
+    if missing.any():
+        cx, cy = (0.0, 0.0) if missing[0] else pos[0]
         r = 0.05
-        for i, pid in enumerate(sorted(missing)):
-            ang = 2 * math.pi * i / max(1, len(missing))
-            pos.loc[pid, "x"] = cx + r * math.cos(ang)
-            pos.loc[pid, "y"] = cy + r * math.sin(ang)
+        miss_ids = sorted({keep[i] for i in np.flatnonzero(missing)})
+        ring = {pid: (cx + r * math.cos(2 * math.pi * i / max(1, len(miss_ids))),
+                      cy + r * math.sin(2 * math.pi * i / max(1, len(miss_ids))))
+                for i, pid in enumerate(miss_ids)}
+        for i in np.flatnonzero(missing):
+            pos[i] = ring[keep[i]]
 
     # normalize [-1,1]
-    for col in ["x","y"]:
-        mn, mx = pos[col].min(), pos[col].max()
-        if mx > mn:
-            pos[col] = (pos[col] - mn) / (mx - mn) * 2 - 1
+    mn, mx = pos.min(axis=0), pos.max(axis=0)
+    span = np.where(mx > mn, mx - mn, 1.0)
+    pos = np.where(mx > mn, (pos - mn) / span * 2 - 1, pos)
+
+    # --- Neighbor ↔ Neighbor edges: cosine > threshold
+    # one (k, k) block from the normalized rows; upper triangle = each pair once
+    rows = keep_rows[1:]
+    known = rows >= 0
+    Vk = reg.v_norm.rows(np.where(known, rows, 0)) * known[:, None]   # unknown ids get a zero row -> sim 0
+    sims_nn = Vk @ Vk.T
+    ii, jj = np.nonzero(np.triu(sims_nn > nn_edge_threshold, k=1))
+    return {"ids": keep, "pos": pos, "nn_i": ii, "nn_j": jj, "nn_sim": sims_nn[ii, jj]}
+
+def _plot_network(reg: ProteinRegistry, query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float = 0.6) -> go.Figure:
+    nbr_ids = nbrs_df["protein_id"].tolist()
+    layout = _network_layout(reg, query, nbrs_df, nn_edge_threshold)
+    pos, ii, jj = layout["pos"], layout["nn_i"], layout["nn_j"]
+    qx, qy = pos[0]
+    px, py = pos[1:, 0], pos[1:, 1]
 
     # --- Query → Neighbor edges (blue)
-    xe_q2n, ye_q2n = [], []
-    for pid in nbrs_df["protein_id"]:
-        xe_q2n += [pos.loc[query,"x"], pos.loc[pid,"x"], None]
-        ye_q2n += [pos.loc[query,"y"], pos.loc[pid,"y"], None]
+    gaps = np.full(len(nbr_ids), None, dtype=object)
+    xe_q2n = np.column_stack([np.full(len(nbr_ids), qx), px, gaps]).ravel().tolist()
+    ye_q2n = np.column_stack([np.full(len(nbr_ids), qy), py, gaps]).ravel().tolist()
     e_q2n = go.Scatter(
         x=xe_q2n, y=ye_q2n, mode="lines",
         line=dict(width=1.2, color="blue"),
@@ -179,17 +863,9 @@ def _plot_network(query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float =
     )
 
     # --- Neighbor ↔ Neighbor edges (orange if cosine > threshold)
-    xe_nn, ye_nn = [], []
-    for i, pid1 in enumerate(nbrs_df["protein_id"]):
-        for j, pid2 in enumerate(nbrs_df["protein_id"]):
-            if j <= i: 
-                continue
-            v1 = _VECS_DF.loc[pid1].values.astype(np.float32)
-            v2 = _VECS_DF.loc[pid2].values.astype(np.float32)
-            sim = float(np.dot(v1, v2) / ((np.linalg.norm(v1) * np.linalg.norm(v2)) + 1e-12))
-            if sim > nn_edge_threshold:
-                xe_nn += [pos.loc[pid1,"x"], pos.loc[pid2,"x"], None]
-                ye_nn += [pos.loc[pid1,"y"], pos.loc[pid2,"y"], None]
+    gaps = np.full(len(ii), None, dtype=object)
+    xe_nn = np.column_stack([px[ii], px[jj], gaps]).ravel().tolist()
+    ye_nn = np.column_stack([py[ii], py[jj], gaps]).ravel().tolist()
     e_nn = go.Scatter(
         x=xe_nn, y=ye_nn, mode="lines",
         line=dict(width=1, color="orange"),
@@ -197,19 +873,18 @@ def _plot_network(query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float =
     )
 
     # --- Nodes
-    cos_by_id = {r["protein_id"]: r["cosine_sim"] for _, r in nbrs_df.iterrows()}
-    ids = nbrs_df["protein_id"].tolist()
+    cos = nbrs_df["cosine_sim"].to_numpy(dtype=float)
     n_nbrs = go.Scatter(
-        x=pos.loc[ids,"x"], y=pos.loc[ids,"y"],
-        mode="markers+text", text=ids, textposition="top center", textfont=dict(size=9),
-        hovertext=[f"{pid}<br>cos={cos_by_id[pid]:.3f}" for pid in ids],
+        x=px, y=py,
+        mode="markers+text", text=nbr_ids, textposition="top center", textfont=dict(size=9),
+        hovertext=[f"{pid}<br>cos={c:.3f}" for pid, c in zip(nbr_ids, cos)],
         hoverinfo="text",
-        marker=dict(size=10, color=[cos_by_id[pid] for pid in ids],
+        marker=dict(size=10, color=cos,
                     colorscale="Blues", showscale=True, colorbar=dict(title="Cosine")),
         name="Closest proteins" 
     )
     n_query = go.Scatter(
-        x=[pos.loc[query,"x"]], y=[pos.loc[query,"y"]],
+        x=[qx], y=[qy],
         mode="markers+text", text=[query],
         textposition="top center", textfont=dict(size=12, color="black"),
         marker=dict(size=14, color="red", line=dict(width=1, color="black")),
@@ -236,67 +911,149 @@ def _plot_network(query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float =
     )
     return fig
 
-def has_annotations(protein: str) -> bool:
+def _compact_network(reg: ProteinRegistry, query: str, nbrs_df: pd.DataFrame, nn_edge_threshold: float = 0.6) -> dict:
+    """
+    The /plot network as typed arrays for the client to draw: nodes (query first) with
+    x / y / cosine to the query, and edges as index pairs into the nodes. The first
+    len(nbrs_df) edges join the query to each neighbour; the rest are neighbour pairs
+    with cosine > nn_edge_threshold.
     """
-    Returns True if the protein has at least one nonzero pathway score.
+    layout = _network_layout(reg, query, nbrs_df, nn_edge_threshold)
+    k = len(nbrs_df)
+    cos = nbrs_df["cosine_sim"].to_numpy(dtype=np.float32)
+    return {
+        "nodes": {
+            "id": np.asarray(layout["ids"], dtype=object),
+            "x": layout["pos"][:, 0].astype(np.float32),
+            "y": layout["pos"][:, 1].astype(np.float32),
+            "cosine": np.concatenate([[np.float32(1.0)], cos]),
+        },
+        "edges": {
+            "source": np.concatenate([np.zeros(k, dtype=np.int32), layout["nn_i"].astype(np.int32) + 1]),
+            "target": np.concatenate([np.arange(1, k + 1, dtype=np.int32), layout["nn_j"].astype(np.int32) + 1]),
+            "cosine": np.concatenate([cos, layout["nn_sim"].astype(np.float32)]),
+        },
+    }
+
+def _compact_network_arrow(net: dict, metadata: dict) -> bytes:
     """
-    if protein not in _VECS_DF.index:
-        return False
-    row = _VECS_DF.loc[protein]
-    return (row > 0).any()
+    Arrow IPC stream of a compact network: one row whose columns are the node_* and
+    edge_* lists (nodes and edges differ in length), plus `metadata` on the schema.
+    """
+    def as_list(values) -> pa.Array:
+        values = pa.array(values.tolist() if values.dtype == object else values)
+        return pa.ListArray.from_arrays(pa.array([0, len(values)], type=pa.int32()), values)
+    columns = {f"node_{k}": as_list(v) for k, v in net["nodes"].items()}
+    columns.update({f"edge_{k}": as_list(v) for k, v in net["edges"].items()})
+    table = pa.table(columns).replace_schema_metadata({k: str(v) for k, v in metadata.items()})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+PLOT_FORMATS = ("plotly", "compact", "arrow")
+PLOT_MAX_TOPK = 200        # neighbours drawn per /plot or /shared_pathways request
+RECALL_MAX_SAMPLE = 2000   # queries per /neighbors/recall run (each one is a brute-force scan)
+
+SHARED_PATHWAYS_FORMATS = ("json", "arrow")
+
+def _check_engine(engine: str | None):
+    """400 for an engine name PlotSnapshot.neighbor_engine would reject (None: manifest default)."""
+    if engine is not None and engine.lower() not in NEIGHBOR_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(NEIGHBOR_ENGINES)}")
 
 
 @app.get("/plot_ping", response_class=PlainTextResponse)
 def plot_ping(gene: str = "KEAP1"):
     """
-    Lightweight sanity check for Panel 5. Returns timing + quick stats or an error message.
+    Lightweight sanity check for Panel 5. Returns timing + quick stats or an error message,
+    plus the artifact version being served.
     """
     t0 = time.time()
+    snap = PLOT_ARTIFACTS.current
+    reg = snap.reg
+    st = snap.status()
+    artifacts = (f"artifacts version={st['version']} generation={st['generation']} "
+                 f"loaded_at={st['loaded_at']} load_sec={st['load_sec']}"
+                 + (" (reloading)" if PLOT_ARTIFACTS.reloading else "")
+                 + (f"; last reload failed: {PLOT_ARTIFACTS.last_error}" if PLOT_ARTIFACTS.last_error else ""))
     try:
-        if _V_NORM.size == 0 or _VECS_DF.empty:
-            return "[plot_ping] ERROR: embeddings not loaded. Check manifest/parquet paths."
+        if reg.empty:
+            return f"[plot_ping] ERROR: embeddings not loaded. Check manifest/parquet paths. ({snap.error}; {artifacts})"
 
-        if gene not in _VECS_DF.index:
-            return f"[plot_ping] ERROR: gene '{gene}' not in vectors index (N={len(_VECS_DF)})."
+        row = reg.row(gene)
+        if row is None:
+            return f"[plot_ping] ERROR: gene '{gene}' not in vectors index (N={len(reg)}). {artifacts}"
 
-        nbrs = _topk_cosine(gene, k=10)
-        return f"[plot_ping] OK in {time.time()-t0:.3f}s; neighbors={len(nbrs)} first={nbrs.iloc[0]['protein_id'] if len(nbrs) else 'NA'}"
+        nbrs = _topk_cosine(reg, reg.ids[row], k=10)
+        return (f"[plot_ping] OK in {time.time()-t0:.3f}s; neighbors={len(nbrs)} "
+                f"first={nbrs.iloc[0]['protein_id'] if len(nbrs) else 'NA'}; {artifacts}")
     except Exception as e:
         return f"[plot_ping] EXCEPTION: {e}\n{traceback.format_exc()}"
 
 @app.get("/plot")
-def get_plot(gene: str, topk: int = 10):
+def get_plot(gene: str, topk: int = Query(10, ge=1, le=PLOT_MAX_TOPK), engine: str | None = None,
+             recall: bool = False, columnar: bool = False, format: str = "plotly"):
+    """
+    engine: "exact" | "knn" | "ann" (defaults to manifest 'neighbor_engine', else exact).
+    recall: also report recall@topk of the chosen engine against brute force.
+    columnar: return neighbors / shared_pathways as {column: [values]} instead of a list of records.
+    format:
+    - plotly: "plot" is the full Plotly figure JSON
+    - compact: "network" is typed arrays for the client to draw (see _compact_network) instead
+    - arrow: only the compact network, as an Arrow IPC stream (shared pathways: /shared_pathways?format=arrow)
+    """
+    if format not in PLOT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PLOT_FORMATS)}")
+    _check_engine(engine)
     t0 = time.time()
+    snap = PLOT_ARTIFACTS.current
+    reg = snap.reg
     try:
-        if _V_NORM.size == 0 or _VECS_DF.empty:
+        if reg.empty:
             raise RuntimeError("Embeddings not loaded. See server logs for load errors.")
 
         # ✅ Case 1: gene not in dataset
-        if gene not in _VECS_DF.index:
+        row = reg.row(gene)
+        if row is None:
             return JSONResponse(
                 content={"error": f"Sorry, we don't have info for {gene}."},
                 status_code=404
             )
 
         # ✅ Case 2: gene exists but no nonzero pathway values
-        if not has_annotations(gene):
+        if not reg.annotated[row]:
             return JSONResponse(
                 content={"error": f"Sorry, we don't have info for {gene}."},
                 status_code=404
             )
+        gene = reg.ids[row]  # canonical id for aliases / other casings
 
         # Normal case: build network + shared pathways
-        nbrs_df = _topk_cosine(gene, k=topk)
-        shared_pw = _shared_pathways(gene, nbrs_df["protein_id"].tolist())
-        fig = _plot_network(gene, nbrs_df)
-
-        out = {
-            "plot": fig.to_plotly_json(),
-            "neighbors": nbrs_df.to_dict(orient="records"),
-            "shared_pathways": shared_pw.to_dict(orient="records"),
+        nbr_engine = snap.neighbor_engine(engine)
+        nbrs_df = nbr_engine.query(gene, topk)
+        if format == "arrow":
+            body = _compact_network_arrow(_compact_network(reg, gene, nbrs_df),
+                                          {"query": gene, "engine": nbr_engine.name})
+            return Response(content=body, media_type="application/vnd.apache.arrow.stream")
+        shared_pw = _shared_pathways_columns(reg, gene, nbrs_df["protein_id"].tolist())
+
+        if format == "compact":
+            out = {"network": _compact_network(reg, gene, nbrs_df)}
+        else:
+            out = {"plot": _plot_network(reg, gene, nbrs_df).to_plotly_json()}
+        # columnar bodies go out as numpy arrays; FastJSONResponse writes them directly
+        out.update({
+            "neighbors": ({c: nbrs_df[c].to_numpy() for c in nbrs_df.columns} if columnar
+                          else nbrs_df.to_dict(orient="records")),
+            "shared_pathways": (shared_pw if columnar else
+                                [dict(zip(shared_pw, vals)) for vals in zip(*_columns_json(shared_pw).values())]),
+            "engine": nbr_engine.name,
             "elapsed_sec": round(time.time() - t0, 3),
-        }
-        return JSONResponse(content=out)
+        })
+        if recall:
+            out["recall"] = round(_neighbor_recall(reg, gene, nbrs_df, len(nbrs_df)), 4)
+        return FastJSONResponse(content=out)
 
     except Exception as e:
         print("[/plot][ERROR]", e)
@@ -306,15 +1063,160 @@ def get_plot(gene: str, topk: int = 10):
             status_code=500
         )
 
-    
+
+@app.get("/shared_pathways")
+def shared_pathways(gene: str, topk: int = Query(10, ge=1, le=PLOT_MAX_TOPK), thresh: float = 0.0,
+                    engine: str | None = None,
+                    format: str = "json"):
+    """
+    Shared pathways between a gene and its top-k neighbours, in columnar form.
+    - json: {"gene", "columns": {column: [values]}}
+    - arrow: Arrow IPC stream with one record batch
+    """
+    if format not in SHARED_PATHWAYS_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(SHARED_PATHWAYS_FORMATS)}")
+    _check_engine(engine)
+    snap = PLOT_ARTIFACTS.current
+    row = snap.reg.row(gene)
+    if row is None:
+        return JSONResponse(content={"error": f"Sorry, we don't have info for {gene}."}, status_code=404)
+    gene = snap.reg.ids[row]
+    try:
+        nbrs_df = snap.neighbor_engine(engine).query(gene, topk)
+        cols = _shared_pathways_columns(snap.reg, gene, nbrs_df["protein_id"].tolist(), thresh)
+    except Exception as e:
+        return JSONResponse(content={"error": f"Internal error: {str(e)}"}, status_code=500)
+
+    if format == "arrow":
+        table = pa.table({k: pa.array(np.asarray(v).tolist() if k in ("other_protein", "pathway_id")
+                                      else np.asarray(v, dtype=np.float64))
+                          for k, v in cols.items()})
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue(), media_type="application/vnd.apache.arrow.stream")
+    return FastJSONResponse({"gene": gene, "columns": cols})
+
+@app.get("/neighbors/recall")
+def neighbors_recall(engine: str = "ann", topk: int = Query(10, ge=1, le=PLOT_MAX_TOPK),
+                     sample: int = Query(200, ge=1, le=RECALL_MAX_SAMPLE), seed: int = Query(0, ge=0)):
+    """
+    Mean recall@topk and per-query latency of an engine vs brute force over a random sample of proteins.
+    """
+    _check_engine(engine)
+    snap = PLOT_ARTIFACTS.current
+    try:
+        if snap.reg.empty:
+            raise RuntimeError("Embeddings not loaded. See server logs for load errors.")
+        nbr_engine = snap.neighbor_engine(engine)
+        rng = np.random.default_rng(seed)
+        genes = rng.choice(snap.reg.ids, size=min(sample, len(snap.reg)), replace=False)
+
+        recalls, t_engine, t_exact = [], 0.0, 0.0
+        for g in genes:
+            t0 = time.time()
+            approx = nbr_engine.query(g, topk)
+            t_engine += time.time() - t0
+            t0 = time.time()
+            exact = _topk_cosine(snap.reg, g, k=topk)
+            t_exact += time.time() - t0
+            hits = len(set(exact["protein_id"]) & set(approx["protein_id"]))
+            recalls.append(hits / max(1, len(exact)))
+
+        n = max(1, len(genes))
+        return {
+            "engine": nbr_engine.name,
+            "topk": topk,
+            "n_queries": len(genes),
+            "mean_recall": round(float(np.mean(recalls)) if recalls else 1.0, 4),
+            "min_recall": round(float(np.min(recalls)) if recalls else 1.0, 4),
+            "engine_ms_per_query": round(1000 * t_engine / n, 3),
+            "exact_ms_per_query": round(1000 * t_exact / n, 3),
+        }
+    except Exception as e:
+        return JSONResponse(content={"error": f"Internal error: {str(e)}"}, status_code=500)
+
+MISSING_HEADER_MAX = 50  # names listed in an X-Missing-* header; X-Missing-*-Count has the total
+NEIGHBOR_BATCH_MAX_TOPK = 1000
+NEIGHBOR_BATCH_MAX_PROTEINS = 50_000
+NEIGHBOR_BATCH_MAX_CHUNK_MB = BATCH_SIMS_BYTES // (1024 * 1024)  # clients may lower the budget, not raise it
+
+def _missing_headers(kind: str, names: list[str]) -> dict:
+    """
+    X-Missing-<kind>: the first MISSING_HEADER_MAX unknown names, percent-encoded (any
+    name is a valid header value, commas only separate), and X-Missing-<kind>-Count.
+    """
+    if not names:
+        return {}
+    return {f"X-Missing-{kind}": ",".join(quote(n, safe="") for n in names[:MISSING_HEADER_MAX]),
+            f"X-Missing-{kind}-Count": str(len(names))}
+
+class NeighborBatchRequest(BaseModel):
+    proteins: list[str] = Field(..., max_length=NEIGHBOR_BATCH_MAX_PROTEINS)
+    topk: int = Field(10, ge=1, le=NEIGHBOR_BATCH_MAX_TOPK)
+    format: str = "ndjson"          # "ndjson" | "arrow"
+    chunk_mb: int = Field(NEIGHBOR_BATCH_MAX_CHUNK_MB, ge=1, le=NEIGHBOR_BATCH_MAX_CHUNK_MB)  # one similarity block
+
+@app.post("/neighbors/batch")
+def neighbors_batch(req: NeighborBatchRequest):
+    """
+    Top-k exact neighbours for many proteins at once, streamed chunk by chunk.
+    - ndjson: one {"query", "neighbors", "cosine_sim"} object per line
+    - arrow: IPC stream with columns query, rank, protein_id, cosine_sim
+    Unknown proteins are listed in the X-Missing-Proteins header (see _missing_headers).
+    """
+    reg = PLOT_ARTIFACTS.current.reg  # the whole stream is served from this snapshot
+    ids = reg.ids
+    if reg.empty:
+        return JSONResponse(content={"error": "Embeddings not loaded. See server logs for load errors."},
+                            status_code=500)
+    fmt = req.format.lower()
+    if fmt not in ("ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'arrow'")
+
+    rows = reg.rows(req.proteins)
+    missing = [p for p, r in zip(req.proteins, rows) if r < 0]
+    rows = rows[rows >= 0]
+    headers = _missing_headers("Proteins", missing)
+    batches = _topk_cosine_batch(reg, rows, k=req.topk, max_bytes=req.chunk_mb * 1024 * 1024)
+
+    if fmt == "ndjson":
+        def gen_ndjson():
+            for q_rows, idx, sims in batches:
+                for qi, nb, sv in zip(q_rows, idx, sims):
+                    yield dumps({
+                        "query": ids[qi],
+                        "neighbors": ids[nb],
+                        "cosine_sim": sv,
+                    }) + b"\n"
+        return StreamingResponse(gen_ndjson(), media_type="application/x-ndjson", headers=headers)
+
+    schema = pa.schema([("query", pa.string()), ("rank", pa.int16()),
+                        ("protein_id", pa.string()), ("cosine_sim", pa.float32())])
+
+    def gen_arrow():
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for q_rows, idx, sims in batches:
+                kk = idx.shape[1]
+                writer.write_batch(pa.record_batch([
+                    pa.array(np.repeat(ids[q_rows], kk).astype(str)),
+                    pa.array(np.tile(np.arange(1, kk + 1, dtype=np.int16), len(q_rows))),
+                    pa.array(ids[idx.ravel()].astype(str)),
+                    pa.array(sims.ravel().astype(np.float32)),
+                ], schema=schema))
+                yield sink.getvalue()
+                sink.seek(0); sink.truncate()
+        yield sink.getvalue()  # end-of-stream marker
+    return StreamingResponse(gen_arrow(), media_type="application/vnd.apache.arrow.stream", headers=headers)
+
 @app.get("/group_label")
 def get_group_label(gene: str):
     try:
-        df = pd.read_csv("llm_group_labels.csv")  # keep file in backend directory
-        row = df[df["gene"].str.upper() == gene.upper()]
-        if row.empty:
+        row = GROUP_LABELS.first(gene)
+        if row is None:
             return {"group_label": None}
-        return {"group_label": row.iloc[0]["llm_output"]}
+        return {"group_label": row["llm_output"]}
     except Exception as e:
         return {"error": str(e)}
     
@@ -327,13 +1229,21 @@ def shared_pathway_groups(query: str, neighbor: str):
     - Filters out anything < 0.5 after normalization
     """
     try:
+        # resolve both genes to canonical ids (case-insensitive)
+        reg = PLOT_ARTIFACTS.current.reg
+        q_row, n_row = reg.row(query), reg.row(neighbor)
+        if q_row is not None:
+            query = reg.ids[q_row]
+        if n_row is not None:
+            neighbor = reg.ids[n_row]
+
         # get top-k neighbors for query
-        nbrs_df = _topk_cosine(query, k=10)
+        nbrs_df = _topk_cosine(reg, query, k=10)
         if nbrs_df.empty:
             return {"groups": []}
 
         # compute shared pathways with ALL neighbors
-        all_shared = _shared_pathways(query, nbrs_df["protein_id"].tolist())
+        all_shared = _shared_pathways(reg, query, nbrs_df["protein_id"].tolist())
         if all_shared.empty:
             return {"groups": []}
 
@@ -359,8 +1269,8 @@ def shared_pathway_groups(query: str, neighbor: str):
         if shared_df.empty:
             return {"groups": []}
 
-        # load group labels
-        labels = pd.read_csv("tf_function_labels_10groups.csv")
+        # group labels (loaded once, see REFERENCE DATA)
+        labels = TF_GROUPS.df
 
         # merge shared pathways with functional groups
         merged = pd.merge(
@@ -390,16 +1300,9 @@ def shared_pathway_groups(query: str, neighbor: str):
 @app.get("/gene_info")
 def gene_info(gene: str):
     try:
-        df = pd.read_csv("cleaned_mappings_2.csv")
-
-        df["Gene Names"] = df["Gene Names"].astype(str).str.strip().str.upper()
-        g = gene.strip().upper()
-
-        row = df[df["Gene Names"] == g]
-        if row.empty:
+        record = GENE_INFO.first(gene)
+        if record is None:
             return {"info": {}}
-
-        record = row.iloc[0].to_dict()
         record.pop("Gene Names", None)
 
         # split values on semicolons for lists
@@ -415,52 +1318,190 @@ def gene_info(gene: str):
 
 
 # =========================================================
-# ========= PANEL 2: /flatmap endpoints (matplotlib) ======
+# ========= RENDER CACHE (all matplotlib PNG endpoints) ===
 # =========================================================
 
-from pathlib import Path
-import re, io
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
-from matplotlib import cm, patheffects
-from scipy.interpolate import griddata
-from fastapi import HTTPException
-from fastapi.responses import StreamingResponse
-
-DATA_DIR = Path(__file__).resolve().parent / "data"
-
-# ---------------- Palette (matches Panel1) ----------------
-BASE_COLORS = [
-    "#e41a1c", "#377eb8", "#4daf4a", "#984ea3",
-    "#ff7f00", "#ffff33", "#a65628", "#f781bf",
-    "#999999"
-]
-
-def make_cluster_cmap(n_clusters: int) -> ListedColormap:
-    """Return ListedColormap using the same palette as Panel1, cycling if needed."""
-    colors = [BASE_COLORS[i % len(BASE_COLORS)] for i in range(n_clusters)]
-    return ListedColormap(colors)
-
-# ---------------- Data loaders ----------------
-def load_nmf(gene: str) -> pd.DataFrame:
-    """Load nmfinfo file for a given gene."""
-    fn = DATA_DIR / f"{gene}_nmfinfo_final.csv"
-    if not fn.exists():
-        raise HTTPException(status_code=404, detail=f"No nmfinfo file for {gene}")
-    nmf = pd.read_csv(fn)
-    nmf = nmf.rename(columns={"x_axis": "x", "y_axis": "y", "clust": "cluster"})
-    nmf["x_r"] = nmf["x"].round(6)
-    nmf["y_r"] = nmf["y"].round(6)
-    return nmf
-
-POINT_RX = re.compile(r"POINT\s*\(([-0-9\.Ee+]+)\s+([-0-9\.Ee+]+)\)")
-def parse_wkt_point(s: str):
-    m = POINT_RX.search(str(s))
-    if not m:
-        return None, None
-    return float(m.group(1)), float(m.group(2))
+RENDER_CACHE_DIR = BACKEND_DIR / "render_cache"
+RENDER_CACHE_MEM_ITEMS = 256     # LRU tier in memory
+RENDER_CACHE_DISK_MB = float(os.environ.get("RENDER_CACHE_DISK_MB", 512))  # LRU tier on disk
+RENDER_VERSION = 1               # bump when plotting code changes so old renders are not served
+
+class RenderCache:
+    """
+    Content-addressed PNG cache: memory LRU in front of one file per key on disk.
+    Keys hash the plot kind, its parameters and the mtime/size of every input file.
+    Disk files live under v<RENDER_VERSION>/; prune() (at startup) deletes other versions,
+    and the least recently used files (by mtime, touched on every disk hit) are evicted
+    once the tier outgrows max_disk_bytes, so renders of replaced inputs age out.
+    Also counts requests per gene so the warm-up command knows what is popular.
+    """
+    def __init__(self, disk_dir: Path = RENDER_CACHE_DIR, max_items: int = RENDER_CACHE_MEM_ITEMS,
+                 max_disk_bytes: int = int(RENDER_CACHE_DISK_MB * 1024 * 1024)):
+        self.disk_dir = disk_dir
+        self.png_dir = disk_dir / f"v{RENDER_VERSION}"
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self.mem: OrderedDict[str, bytes] = OrderedDict()
+        self.popular: Counter = Counter()
+        self.lock = threading.Lock()
+        self._disk_bytes = 0  # this process's running estimate; _evict() recounts
+
+    def load_popular(self):
+        """Add the request counts saved by previous runs (popular.json)."""
+        pop_path = self.disk_dir / "popular.json"
+        if pop_path.exists():
+            try:
+                saved = json.loads(pop_path.read_text())
+                with self.lock:
+                    self.popular.update(saved)
+            except Exception as e:
+                print("[render_cache][WARN] Could not read popular.json:", e)
+
+    @staticmethod
+    def key(kind: str, params: dict, inputs: list[Path]) -> str:
+        payload = json.dumps({"v": RENDER_VERSION, "kind": kind, "params": params,
+                              "inputs": source_signature(*inputs)}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        with self.lock:
+            if key in self.mem:
+                self.mem.move_to_end(key)
+                return self.mem[key]
+        fn = self.png_dir / f"{key}.png"
+        try:
+            data = fn.read_bytes()
+            os.utime(fn)  # recently used: evicted last
+        except OSError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        try:
+            self.png_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.png_dir / f"{key}.png.tmp"
+            tmp.write_bytes(data)
+            tmp.replace(self.png_dir / f"{key}.png")
+        except OSError as e:
+            print("[render_cache][WARN] Could not write disk tier:", e)
+            return
+        with self.lock:
+            self._disk_bytes += len(data)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._evict()
+
+    def prune(self):
+        """Delete renders of other RENDER_VERSIONs (and the old unversioned layout), then trim to size."""
+        if self.disk_dir.is_dir():
+            for p in self.disk_dir.iterdir():
+                if p == self.png_dir:
+                    continue
+                if p.is_dir() and re.fullmatch(r"v\d+", p.name):
+                    shutil.rmtree(p, ignore_errors=True)
+                elif p.name.endswith((".png", ".png.tmp")):
+                    p.unlink(missing_ok=True)
+        self._evict()
+
+    def _evict(self):
+        """Delete the least recently used PNGs until the disk tier is below 90% of its cap."""
+        files = []
+        for p in self.png_dir.glob("*.png"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue  # another worker got there first
+            files.append((st.st_mtime_ns, st.st_size, p))
+        total = sum(size for _, size, _ in files)
+        if total > self.max_disk_bytes:
+            for _, size, p in sorted(files):
+                if total <= 0.9 * self.max_disk_bytes:
+                    break
+                p.unlink(missing_ok=True)
+                total -= size
+        with self.lock:
+            self._disk_bytes = total
+
+    def _remember(self, key: str, data: bytes):
+        with self.lock:
+            self.mem[key] = data
+            self.mem.move_to_end(key)
+            while len(self.mem) > self.max_items:
+                self.mem.popitem(last=False)
+
+    def count(self, gene: str):
+        with self.lock:
+            self.popular[gene.upper()] += 1
+            flush = sum(self.popular.values()) % 50 == 0
+        if flush:
+            self.save_popular()
+
+    def save_popular(self):
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            with self.lock:
+                text = json.dumps(dict(self.popular))
+            (self.disk_dir / "popular.json").write_text(text)
+        except OSError as e:
+            print("[render_cache][WARN] Could not write popular.json:", e)
+
+    def most_popular(self, n: int) -> list[str]:
+        with self.lock:
+            return [g for g, _ in self.popular.most_common(n)]
+
+RENDER_CACHE = RenderCache()
+
+# Cache misses render in worker processes (see render_service.py for the RENDER_* knobs);
+# startup() spawns and warms them
+RENDER_POOL = RenderPool()
+
+def _if_none_match(request: Request | None) -> list[str]:
+    if request is None:
+        return []
+    header = request.headers.get("if-none-match")
+    if not header:
+        return []
+    return [t.strip().removeprefix("W/") for t in header.split(",")]
+
+def cached_png(request: Request | None, kind: str, params: dict, inputs: list[Path], render) -> Response:
+    """
+    Serve a PNG through RENDER_CACHE with a strong ETag; 304 when If-None-Match matches.
+    render() returns PNG bytes, or None for "nothing to plot" (404, not cached).
+    If-None-Match: * only gets its 304 once the image is known to exist.
+    """
+    key = RenderCache.key(kind, params, inputs)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    tags = _if_none_match(request)
+    if etag in tags:
+        RENDER_CACHE.count(str(params.get("gene", "")))
+        return Response(status_code=304, headers=headers)
+
+    data = RENDER_CACHE.get(key)
+    if data is None:
+        try:
+            data = render()
+        except RenderOverloaded as e:
+            return JSONResponse({"error": str(e)}, status_code=503,
+                                headers={"Retry-After": str(e.retry_after)})
+        except RenderTimeout as e:
+            return JSONResponse({"error": str(e)}, status_code=504)
+        if data is None:
+            return Response(status_code=404)
+        RENDER_CACHE.put(key, data)
+    if request is not None:  # warm-up renders don't count towards popularity
+        RENDER_CACHE.count(str(params.get("gene", "")))
+    if "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type="image/png", headers=headers)
+
+
+
+# =========================================================
+# ========= PANEL 2: /flatmap endpoints (matplotlib) ======
+# =========================================================
 
 def list_pathways_for_gene(gene: str) -> list[str]:
     """Return available pathway names for this gene based on *_GSEA.csv_gdf.csv files."""
@@ -476,251 +1517,79 @@ def list_pathways_for_gene(gene: str) -> list[str]:
 def flatmap_pathways(gene: str):
     return {"pathways": list_pathways_for_gene(gene)}
 
+@app.get("/flatmap/gi")
+def flatmap_gi(gene: str, collapse: str = "max", level: str = "cluster"):
+    """
+    GI* of every pathway for a gene in one call (comparison views).
+    - level=cluster: (clusters x pathways), the per-cluster score the overlay paints.
+    - level=residue: (residues x pathways), GI* collapsed per residue.
+    - collapse: "max" or "mean". null where a pathway has no points there.
+    """
+    if not (DATA_DIR / f"{gene}_nmfinfo_final.csv").exists():
+        raise HTTPException(status_code=404, detail=f"No nmfinfo file for {gene}")
+    if collapse not in ("max", "mean") or level not in ("cluster", "residue"):
+        raise HTTPException(status_code=400, detail="collapse must be max|mean and level cluster|residue")
+    try:
+        gi = render_service.get_gi_matrix(gene, build=True)
+        M = np.asarray(gi[f"{level}_{collapse}"], dtype=float)
+        return {
+            "gene": gene,
+            "collapse": collapse,
+            "level": level,
+            "pathways": gi["pathways"],
+            f"{level}s": np.asarray(gi[f"{level}s"]).tolist(),
+            "gi": np.where(np.isnan(M), None, M).tolist(),
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
 @app.get("/flatmap/image")
-def flatmap_image(gene: str, name: str | None = None, collapse: str = "max"):
+def flatmap_image(request: Request, gene: str, name: str | None = None, collapse: str = "max"):
     """
     Returns a PNG flatmap.
     - Default (no pathway): categorical clusters, clipped to mask.
     - Pathway-specific: clusters colored by GI* (mean/max), clipped to mask.
     - collapse: "max" or "mean".
     """
-    df = load_nmf(gene)
-
-    gi_vals = None
+    nmf_fn = DATA_DIR / f"{gene}_nmfinfo_final.csv"
+    if not nmf_fn.exists():
+        raise HTTPException(status_code=404, detail=f"No nmfinfo file for {gene}")
+    inputs = [nmf_fn]
     if name:
-        fn = DATA_DIR / f"{gene}_{name}_GSEA.csv_gdf.csv"
-        if not fn.exists():
+        gdf_fn = DATA_DIR / f"{gene}_{name}_GSEA.csv_gdf.csv"
+        if not gdf_fn.exists():
             raise HTTPException(status_code=404, detail=f"No file for pathway {name}")
-        gdf = pd.read_csv(fn)
-        if "geometry" not in gdf.columns or "Gi_sum" not in gdf.columns:
-            raise HTTPException(status_code=400, detail=f"Expected 'geometry' and 'Gi_sum' in {fn.name}")
-
-        # Parse WKT points -> (x, y)
-        xy = gdf["geometry"].apply(parse_wkt_point).apply(pd.Series)
-        xy.columns = ["x", "y"]
-        gdf = pd.concat([gdf, xy], axis=1)
-        gdf["x_r"] = gdf["x"].round(6)
-        gdf["y_r"] = gdf["y"].round(6)
-
-        # Collapse GI* values per residue
-        if collapse == "mean":
-            collapsed = gdf.groupby(["x_r", "y_r"])["Gi_sum"].mean().reset_index()
-        else:
-            collapsed = gdf.groupby(["x_r", "y_r"])["Gi_sum"].max().reset_index()
+        inputs.append(gdf_fn)
+    if (DATA_DIR / "annotated_clusters.csv").exists():
+        inputs.append(DATA_DIR / "annotated_clusters.csv")
 
-        merged = pd.merge(df, collapsed, on=["x_r", "y_r"], how="left")
-        gi_vals = merged["Gi_sum"].fillna(0.0).astype(float)
-    else:
-        merged = df
-
-    # --- Plotting ---
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.set_aspect("equal")
-    ax.axis("off")
-
-    xmn, xmx = df["x"].min(), df["x"].max()
-    ymn, ymx = df["y"].min(), df["y"].max()
-    pad_x = 0.05 * (xmx - xmn)
-    pad_y = 0.05 * (ymx - ymn)
-    xmn_pad, xmx_pad = xmn - pad_x, xmx + pad_x
-    ymn_pad, ymx_pad = ymn - pad_y, ymx + pad_y
-
-    nx, ny = 400, 400
-    xi = np.linspace(xmn_pad, xmx_pad, nx)
-    yi = np.linspace(ymn_pad, ymx_pad, ny)
-    Xi, Yi = np.meshgrid(xi, yi)
-
-    # Cluster grid (categorical)
-    Zi_cluster = griddata((df["x"], df["y"]), df["cluster"], (Xi, Yi), method="nearest")
-
-    # Altitude grid
-    Zi_alt = griddata((df["x"], df["y"]), df["altitude"], (Xi, Yi), method="linear")
-    if isinstance(Zi_alt, np.ma.MaskedArray):
-        Zi_alt = Zi_alt.filled(np.nan)
-
-    # Mask definition from altitude
-    outer_mask = np.isnan(Zi_alt) | (Zi_alt <= np.nanmin(Zi_alt) + 1e-6)
-    inside_mask = (~outer_mask).astype(float)
-
-    # Precompute masked fields
-    Zi_cluster_masked = np.ma.array(Zi_cluster, mask=outer_mask)
-    Zi_alt_masked     = np.ma.array(Zi_alt,     mask=outer_mask)
-
-    if gi_vals is None:
-        # --- Default cluster view ---
-        n_clusters = df["cluster"].nunique()
-        cmap_clusters = make_cluster_cmap(n_clusters)
-
-        cmap_clusters_plot = ListedColormap(list(cmap_clusters.colors))
+    def render():
         try:
-            cmap_clusters_plot.set_bad(alpha=0.0)
-        except Exception:
-            pass
-
-        ax.imshow(Zi_cluster_masked, origin="lower",
-                  extent=(xmn_pad, xmx_pad, ymn_pad, ymx_pad),
-                  cmap=cmap_clusters_plot, alpha=0.25,
-                  interpolation="nearest", zorder=0)
-
-        ax.contour(Xi, Yi, Zi_cluster_masked, levels=np.unique(df["cluster"]),
-                   colors="black", linewidths=0.8, alpha=0.6, zorder=4)
-
-        sm = plt.cm.ScalarMappable(
-            cmap=cmap_clusters,
-            norm=plt.Normalize(vmin=0, vmax=n_clusters - 1)
-        )
-        cbar = plt.colorbar(sm, ax=ax, fraction=0.046, pad=0.04,
-                            ticks=np.arange(n_clusters) + 0.5)
-        cbar.ax.set_yticklabels([])
-        cbar.set_label("Clusters")
-
-        colors = cmap_clusters(df["cluster"].to_numpy())
-        ax.scatter(df["x"], df["y"], c=colors, s=150,
-                   edgecolors="black", linewidths=0.2, alpha=0.95, zorder=3)
-
-    else:
-        # --- Pathway-specific ---
-        merged["cluster"] = merged["cluster"].astype(int)
-        if collapse == "mean":
-            cluster_scores = merged.groupby("cluster")["Gi_sum"].mean()
-        else:
-            cluster_scores = merged.groupby("cluster")["Gi_sum"].max()
-
-        Zi_gi_cluster = np.zeros_like(Zi_cluster, dtype=float)
-        for clust, score in cluster_scores.items():
-            Zi_gi_cluster[Zi_cluster == clust] = score
-
-        cmap_redgreen = plt.cm.RdYlGn_r
-        vmax = max(1.0, float(np.nanpercentile(np.abs(cluster_scores), 99)))
-        norm = plt.Normalize(vmin=0, vmax=vmax)
-
-        Zi_gi_masked = np.ma.array(Zi_gi_cluster, mask=outer_mask)
-        im = ax.imshow(Zi_gi_masked, origin="lower",
-                       extent=(xmn_pad, xmx_pad, ymn_pad, ymx_pad),
-                       cmap=cmap_redgreen, norm=norm, alpha=0.6,
-                       interpolation="nearest", zorder=1)
-
-        ax.contour(Xi, Yi, Zi_cluster_masked, levels=np.unique(df["cluster"]),
-                   colors="black", linewidths=1.2, alpha=0.9, zorder=4)
-
-        ax.scatter(merged["x"], merged["y"], s=150,
-                   edgecolors="darkgrey", facecolors="none", linewidths=0, zorder=3)
-
-        cb = plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
-        cb.set_label(f"Cluster GI* ({collapse})\nGreen = Low, Red = High")
-
-    # ---------- Altitude + Border ----------
-    ax.contour(Xi, Yi, Zi_alt_masked, levels=40,
-               colors="darkgrey", alpha=0, linewidths=0.5, zorder=5)
-
-    ax.contour(Xi, Yi, inside_mask, levels=[0.5],
-               colors="black", linewidths=2.5, zorder=6)
-
-    # ---------- Cluster Annotations ----------
-    try:
-        ann_path = DATA_DIR / "annotated_clusters.csv"
-        if ann_path.exists():
-            ann = pd.read_csv(ann_path)
-            ann["cluster"] = ann["cluster"].astype(int)
-            df["cluster"] = df["cluster"].astype(int)
-
-            ann_sub = ann[ann["gene"].str.upper() == gene.upper()]
-            if not ann_sub.empty:
-                centroids = df.groupby("cluster")[["x", "y"]].mean()
-
-                for _, row in ann_sub.iterrows():
-                    clust = row["cluster"]
-                    label = str(row["annotation_type"])
-                    if clust in centroids.index:
-                        sub_points = df[df["cluster"] == clust]
-                        if len(sub_points) < 20:
-                            cx, cy = sub_points[["x", "y"]].median()
-                        else:
-                            cx, cy = centroids.loc[clust]
-
-                        cx_true, cy_true = cx, cy
-
-                        # Push labels outside if near edge
-                        margin_x = 0.03 * (xmx - xmn)
-                        margin_y = 0.03 * (ymx - ymn)
-                        moved = False
-                        if cx <= xmn + margin_x:
-                            cx = xmn_pad - 0.05 * (xmx - xmn); moved = True
-                        if cx >= xmx - margin_x:
-                            cx = xmx_pad + 0.05 * (xmx - xmn); moved = True
-                        if cy <= ymn + margin_y:
-                            cy = ymn_pad - 0.05 * (ymx - ymn); moved = True
-                        if cy >= ymx - margin_y:
-                            cy = ymx_pad + 0.05 * (ymx - ymn); moved = True
-
-                        if moved:
-                            ax.plot([cx_true, cx], [cy_true, cy],
-                                    color="black", linewidth=0.8, zorder=998)
-
-                        ax.text(
-                            cx, cy, label,
-                            ha="center", va="center",
-                            fontsize=10, fontweight="bold",
-                            color="white",
-                            path_effects=[
-                                patheffects.Stroke(linewidth=2, foreground="black"),
-                                patheffects.Normal()
-                            ],
-                            clip_on=False,
-                            zorder=999
-                        )
-
-        ax.set_xlim(xmn_pad - 0.1*(xmx-xmn), xmx_pad + 0.1*(xmx-xmn))
-        ax.set_ylim(ymn_pad - 0.1*(ymx-ymn), ymx_pad + 0.1*(ymx-ymn))
-
-    except Exception as e:
-        print("[flatmap_image][WARN] Could not add annotations:", e)
-
-    # ------------------------------------------------------------------
-    fig.tight_layout(pad=0)
-
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", dpi=170, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-    return StreamingResponse(
-        buf,
-        media_type="image/png",
-        headers={"Cache-Control": "no-store"}
-    )
-
+            return RENDER_POOL.render(render_service.render_flatmap_png, gene, name, collapse)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+    return cached_png(request, "flatmap", {"gene": gene, "name": name, "collapse": collapse}, inputs, render)
 
 # =========================================================
 # ========= PANEL 3: /empirical (matplotlib) ======
 # =========================================================
-# Path to your calibration CSV
-CALIBRATION_DF = pd.read_csv("calibration.csv")
+# calibration.csv is served from the CALIBRATION reference table
 @app.get("/calibration/image")
-def calibration_image(gene: str):
-    # filter rows for this gene
-    sub = CALIBRATION_DF[CALIBRATION_DF["gene"] == gene]
+def calibration_image(request: Request, gene: str):
+    gene = gene.strip().upper()  # the table lookup is case-insensitive; one cache entry per gene
+    return cached_png(request, "calibration", {"gene": gene}, [CALIBRATION.path],
+                      lambda: render_calibration_png(gene))
+
+def render_calibration_png(gene: str) -> bytes | None:
+    # filter rows for this gene; only the two plotted columns go to the render worker
+    sub = CALIBRATION.rows(gene)
     if sub.empty:
-        return Response(status_code=404)
-
-    # make plot
-    fig, ax = plt.subplots()
-    ax.plot(sub["adjusted_rank"], sub["confidence"])
-    ax.set_xlabel("Rank (from computational method)")
-    ax.set_ylabel("Confidence (% significant)")
-    ax.grid(False)
-
-    # save to PNG buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png", bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-
-    return Response(
-        content=buf.read(),
-        media_type="image/png",
-        headers={"Cache-Control": "no-store"}
-    )
+        return None
+    return RENDER_POOL.render(render_service.render_calibration_png,
+                              sub["adjusted_rank"].to_numpy(), sub["confidence"].to_numpy())
 
 
 # =========================================================
@@ -738,16 +1607,10 @@ def get_structures(gene: str):
         default = "alphafold"
         pdb_ids: list[str] = []
 
-        csv_path = Path("gene_to_pdb.csv")
-        if csv_path.exists():
-            df = pd.read_csv(csv_path)
-            # normalize colnames
-            cols = [c.lower().strip() for c in df.columns]
-            if "gene" in cols and "pdb_id" in cols:
-                gcol, pcol = cols.index("gene"), cols.index("pdb_id")
-                # select rows for this gene (case-insensitive)
-                sub = df[df.iloc[:, gcol].str.upper() == gene.upper()]
-                pdb_ids = [str(x).strip() for x in sub.iloc[:, pcol] if pd.notna(x)]
+        # rows for this gene (case-insensitive); column names are lower-cased on load
+        sub = GENE_TO_PDB.rows(gene)
+        if "pdb_id" in sub.columns:
+            pdb_ids = [str(x).strip() for x in sub["pdb_id"] if pd.notna(x)]
 
         return {"default": default, "pdb_ids": pdb_ids}
     except Exception as e:
@@ -760,43 +1623,103 @@ def get_structures(gene: str):
 # =============== PATHWAY ENDPOINT ========================
 # =========================================================
 
-# Load once at startup
-PATHWAY_MATRIX = pd.read_csv("all_proteins_max_score_matrix_cleaned.csv", index_col=0)
+class PathwayRanking:
+    """
+    Every pathway's proteins presorted by descending score (ties in matrix row order),
+    concatenated CSC-style: column j is rows[indptr[j]:indptr[j+1]]. Only scores > 0 are
+    indexed, so a threshold >= 0 is a binary search plus a slice; negative thresholds
+    fall back to scanning the column.
+    """
+    def __init__(self, raw, indptr: np.ndarray, rows: np.ndarray, neg_scores: np.ndarray):
+        self.raw = raw
+        self.indptr = indptr
+        self.rows = rows
+        self.neg_scores = neg_scores  # -score, ascending within each column
+
+    @classmethod
+    def build(cls, raw) -> "PathwayRanking":
+        return cls(raw, *rank_columns(*raw.positive_entries(), raw.shape[1]))
+
+    def ranked(self, j: int, threshold: float, offset: int = 0, limit: int | None = None):
+        """(rows, scores, total) of proteins with score > threshold, best first, sliced [offset:offset+limit]."""
+        if threshold < 0:
+            rows, vals = self.raw.column(j, threshold)
+            order = np.argsort(-vals, kind="stable")
+            rows, vals = rows[order], vals[order]
+        else:
+            a, b = self.indptr[j], self.indptr[j + 1]
+            # scores are float32, so compare against the float32 threshold like the column scan does
+            total = np.searchsorted(self.neg_scores[a:b], -np.float32(threshold), side="left")
+            rows, vals = self.rows[a:a + total], -self.neg_scores[a:a + total]
+        total = len(rows)
+        end = total if limit is None else offset + limit
+        return rows[offset:end], vals[offset:end], total
+
+# Load once at startup: protein x pathway max-score matrix, held in the same registry form
+# as the /plot vectors. Served memory-mapped from score_matrix/ (build_artifacts.py
+# score-matrix); on a miss the CSV is parsed once and the store written for next time.
+
+def _load_pathway_scores():
+    t0 = time.time()
+    sig = source_signature(SCORE_MATRIX_CSV) if SCORE_MATRIX_CSV.exists() else None
+    store = load_score_store(sig)
+    if store is None and sig is not None:
+        try:
+            build_score_store()
+            store = load_score_store(sig)
+        except OSError as e:
+            print("[LOAD][WARN] Could not write score_matrix store:", e)
+    if store is not None:
+        reg = ProteinRegistry(store["proteins"], store["pathways"], store["scores"])
+        ranking = PathwayRanking(reg.raw, store["rank_indptr"], store["rank_rows"], store["rank_neg_scores"])
+    else:
+        reg = ProteinRegistry.from_frames(pd.read_csv(SCORE_MATRIX_CSV, index_col=0))
+        ranking = PathwayRanking.build(reg.raw)
+    mapped = store is not None and reg.raw.kind == "dense" and np.shares_memory(reg.raw.X, store["scores"])
+    version = signature_version((store["source"] if store is not None else None) or sig or {})
+    print(f"[LOAD] pathway matrix={reg.raw.shape} ({reg.raw.kind}{', mmap' if mapped else ''}, "
+          f"{reg.raw.nbytes / 1e6:.1f} MB) version={version} in {time.time()-t0:.3f}s")
+    return reg, ranking, version
+
+# Loaded by startup(); empty until then. PATHWAY_VERSION identifies the matrix contents,
+# results derived from it are cached under it.
+PATHWAY_SCORES = ProteinRegistry.empty_registry()
+PATHWAY_RANKING = PathwayRanking.build(PATHWAY_SCORES.raw)
+PATHWAY_VERSION = ""
 
 @app.get("/pathway/proteins")
-def pathway_proteins(pathway: str, threshold: float = 0.1):
+def pathway_proteins(pathway: str, threshold: float = 0.1, limit: int | None = None, offset: int = 0):
     """
-    Return all proteins associated with a pathway above a score threshold.
+    Return proteins associated with a pathway above a score threshold, best first.
+    - limit/offset page through the ranked list; "total" is the full match count.
     """
     try:
-        if pathway not in PATHWAY_MATRIX.columns:
+        j = PATHWAY_SCORES.pathway_col.get(pathway)
+        if j is None:
             return {"error": f"Pathway '{pathway}' not found."}
 
-        col = PATHWAY_MATRIX[pathway]
-        sel = col[col > threshold].sort_values(ascending=False)
+        offset = max(int(offset), 0)
+        limit = None if limit is None else max(int(limit), 0)
+        rows, vals, total = PATHWAY_RANKING.ranked(j, threshold, offset, limit)
 
-        return {
+        return FastJSONResponse({
             "pathway": pathway,
             "threshold": threshold,
-            "proteins": sel.index.tolist(),
-            "scores": sel.tolist()
-        }
+            "total": int(total),
+            "offset": offset,
+            "limit": limit,
+            "proteins": PATHWAY_SCORES.ids[rows],
+            "scores": vals
+        })
     except Exception as e:
         return {"error": str(e)}
 
+# GENESET_DIR (build_artifacts): <pathway>_geneset.csv, indexed once into GENESETS (see GENESET INDEX)
 
-import os
-import requests
-
-GENESET_DIR = Path("geneset_files")
-
-def chunk_list(lst, size):
-    """Yield successive chunks from list of given size."""
-    for i in range(0, len(lst), size):
-        yield lst[i:i + size]
+STRING_CLIENT = StringClient()
 
 @app.get("/stringdb/pathway_interactions")
-def stringdb_pathway_interactions(pathway: str, threshold: float = 0.5, species: int = 9606):
+async def stringdb_pathway_interactions(pathway: str, threshold: float = 0.5, species: int = 9606):
     """
     Check STRING interactions between:
       - proteins above threshold for this pathway (prediction set)
@@ -804,36 +1727,28 @@ def stringdb_pathway_interactions(pathway: str, threshold: float = 0.5, species:
     """
     try:
         # 1. Get threshold proteins
-        if pathway not in PATHWAY_MATRIX.columns:
+        j = PATHWAY_SCORES.pathway_col.get(pathway)
+        if j is None:
             return {"error": f"Pathway '{pathway}' not found."}
-        col = PATHWAY_MATRIX[pathway]
-        threshold_proteins = col[col > threshold].index.tolist()
+        rows, _, _ = PATHWAY_RANKING.ranked(j, threshold)
+        threshold_proteins = set(PATHWAY_SCORES.ids[rows].tolist())
         if not threshold_proteins:
             return {"interactions": []}
 
-        # 2. Load geneset proteins from file
-        geneset_file = GENESET_DIR / f"{pathway}_geneset.csv"
-        if not geneset_file.exists():
+        # 2. Geneset proteins (indexed at startup)
+        geneset_proteins = GENESETS.gene_set(pathway)
+        if geneset_proteins is None:
             return {"error": f"Geneset file not found for pathway '{pathway}'"}
-        geneset_df = pd.read_csv(geneset_file)
-        geneset_proteins = geneset_df.iloc[:, 0].dropna().astype(str).tolist()
-
-        # 3. Query STRING in batches
-        query_proteins = list(set(threshold_proteins) | set(geneset_proteins))
-        STRING_API_URL = "https://string-db.org/api/json/network"
-        all_data = []
-
-        # batch into groups of ~100 proteins (safe size for STRING API)
-        for chunk in chunk_list(query_proteins, 100):
-            identifiers = "%0d".join(chunk)
-            params = {
-                "identifiers": identifiers,
-                "species": species,
-                "caller_identity": "my_app"
-            }
-            r = requests.get(STRING_API_URL, params=params)
-            r.raise_for_status()
-            all_data.extend(r.json())
+
+        # 3a. Local STRING snapshot: one vectorized join over the CSR adjacency
+        index = get_string_index(species) if STRING_SOURCE != "api" else None
+        if index is not None:
+            return {"interactions": index.interactions(threshold_proteins, geneset_proteins)}
+        if STRING_SOURCE == "local":
+            return {"error": f"No local STRING index for species {species}"}
+
+        # 3b. Query STRING: chunks in parallel, cached on disk (see string_client.py)
+        all_data = await STRING_CLIENT.network(threshold_proteins | geneset_proteins, species)
 
         # 4. Keep only edges where one is prediction and the other is geneset
         interactions = []
@@ -857,114 +1772,589 @@ def stringdb_pathway_interactions(pathway: str, threshold: float = 0.5, species:
     except Exception as e:
         return {"error": str(e)}
 
+# The id lists are encoded and compressed once per data version and served with an ETag,
+# so repeat visits get a 304 and first visits the precompressed bytes.
+_LIST_BODIES: dict[str, PrecompressedBody] = {}
+
+def _list_body(name: str, version: str, content) -> PrecompressedBody:
+    body = _LIST_BODIES.get(name)
+    if body is None or body.version != version:
+        body = _LIST_BODIES[name] = PrecompressedBody(content(), version)
+    return body
+
 @app.get("/pathways/list")
-def list_pathways():
+def list_pathways(request: Request):
     try:
-        return {"pathways": PATHWAY_MATRIX.columns.tolist()}
+        return _list_body("pathways", PATHWAY_VERSION,
+                          lambda: {"pathways": PATHWAY_SCORES.pathways}).response(request)
     except Exception as e:
         return {"error": str(e)}
 
 @app.get("/proteins/list")
-def list_proteins():
+def list_proteins(request: Request):
     try:
-        if _VECS_DF.empty:
-            return {"proteins": []}
-        return {"proteins": _VECS_DF.index.tolist()}
+        snap = PLOT_ARTIFACTS.current
+        return _list_body("proteins", f"{snap.version}-{snap.generation}",
+                          lambda: {"proteins": [] if snap.reg.empty else snap.reg.ids}).response(request)
     except Exception as e:
         return {"error": str(e)}
 
 
-from io import StringIO
+# ---------------- MSigDB descriptions ----------------
+# Served from memory, backed by data/msigdb_descriptions.json (build_artifacts.py
+# descriptions). Stale entries are returned as they are and refreshed in the background;
+# a pathway that was never fetched is fetched once, waiting at most DESCRIPTION_WAIT_S.
+# /pathway/descriptions queues at most DESCRIPTION_MAX_ENQUEUE fetches per call.
+DESCRIPTION_WAIT_S = float(os.environ.get("DESCRIPTION_WAIT_S", 2.0))
+DESCRIPTION_MAX_ENQUEUE = int(os.environ.get("DESCRIPTION_MAX_ENQUEUE", 8))
+DESCRIPTION_FIELDS = ("pathway", "description", "pubmed", "authors")
+
+class DescriptionStore:
+    def __init__(self, path: Path = DESCRIPTIONS_PATH, workers: int = 2):
+        self.path = path
+        self.workers = workers
+        self.entries: dict[str, dict] = {}
+        self._sig = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}
+        self._pool: ThreadPoolExecutor | None = None
+
+    def load(self):
+        self._sig = self._stat()
+        self._checked_at = time.time()
+        self.entries = load_descriptions(self.path)
+        print(f"[LOAD] {len(self.entries)} pathway descriptions from {self.path.name}")
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _maybe_reload(self):
+        # picks up a re-run of the build command and other workers' refreshes
+        now = time.time()
+        if now - self._checked_at < REFERENCE_RELOAD_CHECK_S:
+            return
+        self._checked_at = now
+        sig = self._stat()
+        if sig != self._sig:
+            self._sig = sig
+            fresh = load_descriptions(self.path)
+            with self._lock:
+                # keep what this worker checked more recently (e.g. failures that aren't saved)
+                newer = {k: e for k, e in fresh.items()
+                         if description_checked_at(e) >= description_checked_at(self.entries.get(k, {}))}
+                if newer:
+                    self.entries = {**self.entries, **newer}
+
+    def _fetch(self, key: str) -> dict:
+        try:
+            entry = refresh_description(key, self.entries.get(key))
+            with self._lock:
+                self.entries = {**self.entries, key: entry}
+            try:
+                if persistable_descriptions({key: entry}):
+                    save_descriptions({key: entry}, self.path)
+            except OSError as e:
+                print("[descriptions][WARN] Could not write store:", e)
+            return entry
+        finally:
+            # also on an unexpected error, so the next request can try again
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def refresh(self, key: str) -> Future:
+        """Background fetch of one entry (at most one in flight per pathway)."""
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="msigdb")
+                fut = self._pending[key] = self._pool.submit(self._fetch, key)
+            return fut
+
+    def get(self, pathway: str, wait_s: float = 0.0, refresh: bool = True) -> dict | None:
+        """
+        The entry for a pathway (missing / stale ones trigger a refresh unless refresh=False);
+        None if not cached within wait_s.
+        """
+        self._maybe_reload()
+        key = pathway.upper()
+        entry = self.entries.get(key)
+        if entry is None:
+            if not refresh:
+                return None
+            fut = self.refresh(key)
+            try:
+                return fut.result(timeout=wait_s) if wait_s > 0 else None
+            except FutureTimeout:
+                return None
+        if refresh and description_is_stale(entry):
+            self.refresh(key)
+        return entry
+
+DESCRIPTIONS = DescriptionStore()  # entries read by startup()
+
+def _split_list(values: list[str] | None) -> list[str] | None:
+    """Repeated and/or comma-separated query values -> one list."""
+    if values is None:
+        return None
+    return [v.strip() for item in values for v in item.split(",") if v.strip()]
+
+def _description_body(entry: dict) -> dict:
+    if "error" in entry:
+        return {"error": f"Could not fetch description for {entry['pathway']}: {entry['error']}"}
+    return {k: entry.get(k) for k in DESCRIPTION_FIELDS}
 
 @app.get("/pathway/description")
 def pathway_description(pathway: str):
     try:
-        # Handle NRF2 separately
-        if pathway.upper() == "NRF2":
-            url = "https://www.gsea-msigdb.org/gsea/msigdb/human/download_geneset.jsp?geneSetName=SINGH_NFE2L2_TARGETS&fileType=TSV"
+        entry = DESCRIPTIONS.get(pathway, wait_s=DESCRIPTION_WAIT_S)
+        if entry is None:
+            return {"error": f"Description for {pathway.upper()} is being fetched; try again shortly."}
+        return _description_body(entry)
+    except Exception as e:
+        return {"error": f"Could not fetch description for {pathway}: {e}"}
+
+@app.get("/pathway/descriptions")
+def pathway_descriptions(pathways: list[str] | None = Query(None)):
+    """
+    Many descriptions at once, never waiting on MSigDB (repeated or comma-separated
+    ?pathways=; omitted = every pathway in the score matrix). Uncached ones are listed
+    in "pending"; the first DESCRIPTION_MAX_ENQUEUE missing or stale ones are fetched in
+    the background, the rest on later calls.
+    """
+    names = _split_list(pathways) if pathways is not None else PATHWAY_SCORES.pathways.astype(str).tolist()
+    out, errors, pending = {}, {}, []
+    budget = DESCRIPTION_MAX_ENQUEUE
+    for name in dict.fromkeys(names):
+        entry = DESCRIPTIONS.get(name, refresh=False)
+        if budget > 0 and (entry is None or description_is_stale(entry)):
+            DESCRIPTIONS.refresh(name.upper())
+            budget -= 1
+        if entry is None:
+            pending.append(name.upper())
+        elif "error" in entry:
+            errors[entry["pathway"]] = entry["error"]
         else:
-            url = f"https://www.gsea-msigdb.org/gsea/msigdb/human/download_geneset.jsp?geneSetName={pathway.upper()}_TARGET_GENES&fileType=TSV"
+            out[entry["pathway"]] = {k: entry.get(k) for k in DESCRIPTION_FIELDS[1:]}
+    return {"descriptions": out, "errors": errors, "pending": pending}
 
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
 
-        # Load TSV into dataframe
-        df = pd.read_csv(io.StringIO(r.text), sep="\t")
+# =========================================================
+# =============== GENESET INDEX ===========================
+# =========================================================
 
-        # Convert first two columns (key, value) into dictionary
-        if df.shape[1] >= 2:
-            meta = pd.Series(df.iloc[:, 1].values, index=df.iloc[:, 0]).to_dict()
-        else:
-            return {"error": f"Unexpected TSV format for {pathway}"}
+PR_SWEEP_THRESHOLDS = tuple(round(0.05 * i, 2) for i in range(20))  # 0.0 .. 0.95
+
+class GenesetIndex:
+    """
+    Every geneset_files/<pathway>_geneset.csv, loaded once. Genes are interned to int ids:
+    score-matrix proteins keep their matrix row, genes found only in genesets follow.
+    Pathway p's genes are the sorted slice genes[indptr[p]:indptr[p+1]]; `member` is the
+    same as a (pathways, genes) sparse 0/1 matrix for the set algebra.
+    """
+    def __init__(self, names: list[str], gene_lists: list[list[str]], proteins, version: str = ""):
+        self.names = np.asarray(names, dtype=object)
+        self.version = version  # of the geneset files, like PATHWAY_VERSION
+        self.pathway_idx = {n: i for i, n in enumerate(names)}
+        self.n_matrix = len(proteins)
+        self.gene_id: dict[str, int] = {}
+        for i, pid in enumerate(proteins):
+            self.gene_id.setdefault(str(pid), i)
+        extra = []
+        for genes in gene_lists:
+            for g in genes:
+                if g not in self.gene_id:
+                    self.gene_id[g] = self.n_matrix + len(extra)
+                    extra.append(g)
+        self.gene_names = np.array([str(p) for p in proteins] + extra, dtype=object)
+
+        per = [np.unique(np.fromiter((self.gene_id[g] for g in genes), dtype=np.int32, count=len(genes)))
+               for genes in gene_lists]
+        self.indptr = np.zeros(len(per) + 1, dtype=np.int64)
+        np.cumsum([len(a) for a in per], out=self.indptr[1:])
+        self.genes = np.concatenate(per) if per else np.empty(0, np.int32)
+        self.sizes = np.diff(self.indptr)
+        self.in_matrix = np.array([np.count_nonzero(a < self.n_matrix) for a in per], dtype=np.int64)
+        self.member = sparse.csr_matrix((np.ones(len(self.genes), dtype=np.float32), self.genes, self.indptr),
+                                        shape=(len(per), len(self.gene_names)))
+
+    @classmethod
+    def from_dir(cls, gdir: Path, proteins) -> "GenesetIndex":
+        t0 = time.time()
+        names, gene_lists = [], []
+        files = sorted(gdir.glob("*_geneset.csv"))
+        for p in files:
+            with open(p) as f:
+                lines = f.read().splitlines()[1:]  # first line is the column header
+            names.append(p.name[:-len("_geneset.csv")])
+            gene_lists.append([g for g in (l.strip() for l in lines) if g])
+        index = cls(names, gene_lists, proteins, signature_version(source_signature(*files)))
+        print(f"[LOAD] {len(names)} genesets, {len(index.genes)} memberships, "
+              f"{len(index.gene_names)} genes in {time.time()-t0:.3f}s")
+        return index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def ids(self, pathway: str) -> np.ndarray | None:
+        p = self.pathway_idx.get(pathway)
+        return None if p is None else self.genes[self.indptr[p]:self.indptr[p + 1]]
+
+    def gene_set(self, pathway: str) -> set[str] | None:
+        ids = self.ids(pathway)
+        return None if ids is None else set(self.gene_names[ids].tolist())
+
+    def intersections(self, idx: np.ndarray) -> np.ndarray:
+        """(k, k) |A ∩ B| between the selected genesets."""
+        M = self.member[idx]
+        return np.rint((M @ M.T).toarray()).astype(np.int64)
+
+    def pr_sweep(self, ranking: PathwayRanking, cols, sets, thresholds) -> tuple[np.ndarray, np.ndarray]:
+        """
+        For matrix column cols[i] against geneset sets[i]: how many proteins are predicted
+        (score > t) and how many of those are in the geneset, for every threshold t >= 0.
+        Each predicted set is a prefix of the presorted ranking, so one cumulative sum
+        per column answers every threshold.
+        """
+        neg_t = -np.asarray(thresholds, dtype=np.float32)
+        predicted = np.zeros((len(cols), len(neg_t)), dtype=np.int64)
+        tp = np.zeros_like(predicted)
+        hit = np.zeros(self.n_matrix, dtype=bool)
+        for i, (j, p) in enumerate(zip(cols, sets)):
+            ids = self.genes[self.indptr[p]:self.indptr[p + 1]]
+            ids = ids[ids < self.n_matrix]
+            hit[ids] = True
+            a, b = ranking.indptr[j], ranking.indptr[j + 1]
+            k = np.searchsorted(ranking.neg_scores[a:b], neg_t, side="left")
+            cum = np.concatenate([[0], np.cumsum(hit[ranking.rows[a:b]])])
+            predicted[i], tp[i] = k, cum[k]
+            hit[ids] = False
+        return predicted, tp
+
+    def enrichment(self, genes: list[str]):
+        """
+        Hypergeometric over-representation of a gene list in every geneset at once
+        (universe = all interned genes). Returns (overlap, p_value, fdr, unknown genes).
+        """
+        ids = np.unique(np.fromiter((self.gene_id[g] for g in genes if g in self.gene_id), dtype=np.int64))
+        unknown = [g for g in genes if g not in self.gene_id]
+        q = np.zeros(len(self.gene_names), dtype=np.float32)
+        q[ids] = 1.0
+        overlap = np.rint(self.member @ q).astype(np.int64)
+        pvals = hypergeom.sf(overlap - 1, len(self.gene_names), self.sizes, len(ids))
+        return overlap, pvals, _bh_fdr(pvals), unknown
+
+def _bh_fdr(p: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values."""
+    n = len(p)
+    if not n:
+        return p
+    order = np.argsort(p)
+    adj = np.minimum.accumulate((p[order] * n / np.arange(1, n + 1))[::-1])[::-1]
+    out = np.empty(n)
+    out[order] = np.minimum(adj, 1.0)
+    return out
+
+GENESETS = GenesetIndex([], [], [])  # indexed by startup()
+
+@app.get("/genesets/overlap")
+def genesets_overlap(pathways: list[str] | None = Query(None), metric: str = "jaccard"):
+    """
+    Pairwise overlap of the curated genesets (repeated or comma-separated ?pathways=;
+    omitted = all). metric: jaccard (|A∩B| / |A∪B|) | count (|A∩B|)
+    """
+    if metric not in ("jaccard", "count"):
+        raise HTTPException(status_code=400, detail="metric must be 'jaccard' or 'count'")
+    names = _split_list(pathways)
+    names = GENESETS.names.tolist() if names is None else list(dict.fromkeys(names))
+    idx = np.asarray([GENESETS.pathway_idx[n] for n in names if n in GENESETS.pathway_idx], dtype=np.int64)
+
+    inter = GENESETS.intersections(idx)
+    sizes = GENESETS.sizes[idx]
+    if metric == "jaccard":
+        union = sizes[:, None] + sizes[None, :] - inter
+        matrix = np.round(np.divide(inter, union, out=np.zeros(inter.shape), where=union > 0), 6)
+    else:
+        matrix = inter
+    return {
+        "pathways": GENESETS.names[idx].tolist(),
+        "sizes": sizes.tolist(),
+        "metric": metric,
+        "matrix": matrix.tolist(),
+        "missing": [n for n in names if n not in GENESETS.pathway_idx],
+    }
+
+def _nan_to_none(a: np.ndarray) -> list:
+    if a.ndim > 1:
+        return [_nan_to_none(row) for row in a]
+    return [None if math.isnan(v) else round(v, 6) for v in a.tolist()]
+
+@app.get("/genesets/pr_sweep")
+def genesets_pr_sweep(pathways: list[str] | None = Query(None), thresholds: list[str] | None = Query(None)):
+    """
+    Precision / recall of each pathway's predicted set (matrix score > t) against its
+    curated geneset, for every threshold t (default 0.0, 0.05, ... 0.95).
+    - recall is out of the geneset genes present in the score matrix ("in_matrix")
+    - null where nothing is predicted / nothing can be recalled
+    - pathways without both a matrix column and a geneset are listed in "missing"
+    """
+    try:
+        ts = [float(t) for t in (_split_list(thresholds) or PR_SWEEP_THRESHOLDS)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="thresholds must be numbers")
+    if min(ts) < 0:
+        raise HTTPException(status_code=400, detail="thresholds must be >= 0")
+
+    names = _split_list(pathways)
+    names = GENESETS.names.tolist() if names is None else list(dict.fromkeys(names))
+    both = [n for n in names if n in GENESETS.pathway_idx and n in PATHWAY_SCORES.pathway_col]
+    sets = np.asarray([GENESETS.pathway_idx[n] for n in both], dtype=np.int64)
+    cols = [PATHWAY_SCORES.pathway_col[n] for n in both]
+    predicted, tp = GENESETS.pr_sweep(PATHWAY_RANKING, cols, sets, ts)
+    relevant = GENESETS.in_matrix[sets][:, None]
+
+    precision = np.divide(tp, predicted, out=np.full(tp.shape, np.nan), where=predicted > 0)
+    recall = np.divide(tp, relevant, out=np.full(tp.shape, np.nan), where=relevant > 0)
+    return {
+        "thresholds": ts,
+        "pathways": both,
+        "geneset_size": GENESETS.sizes[sets].tolist(),
+        "in_matrix": relevant[:, 0].tolist(),
+        "predicted": predicted.tolist(),
+        "true_positives": tp.tolist(),
+        "precision": _nan_to_none(precision),
+        "recall": _nan_to_none(recall),
+        "missing": [n for n in names if n not in both],
+    }
+
+class EnrichmentRequest(BaseModel):
+    genes: list[str]
+    max_fdr: float = 1.0            # only genesets at or below this FDR
+    top: int | None = None          # at most this many rows, best first
+
+@app.post("/genesets/enrichment")
+def genesets_enrichment(req: EnrichmentRequest):
+    """
+    Over-representation of a gene list in every curated geneset (hypergeometric test,
+    Benjamini-Hochberg FDR), as columns sorted by p-value. Genesets with no overlap are left out.
+    """
+    overlap, pvals, fdr, unknown = GENESETS.enrichment(req.genes)
+    order = np.lexsort((GENESETS.names.astype(str), pvals))
+    order = order[(overlap[order] > 0) & (fdr[order] <= req.max_fdr)]
+    if req.top is not None:
+        order = order[:max(0, req.top)]
+    return {
+        "n_genes": len(set(req.genes)) - len(set(unknown)),
+        "universe": len(GENESETS.gene_names),
+        "unknown": unknown,
+        "columns": {
+            "pathway": GENESETS.names[order].tolist(),
+            "overlap": overlap[order].tolist(),
+            "geneset_size": GENESETS.sizes[order].tolist(),
+            "p_value": pvals[order].tolist(),
+            "fdr": fdr[order].tolist(),
+        },
+    }
+
+# =========================================================
+# =============== PATHWAY EVALUATION ======================
+# =========================================================
 
-        desc = meta.get("DESCRIPTION_BRIEF")
-        pubmed = meta.get("PMID")
-        authors = meta.get("AUTHORS")
+def _slice_positions(indptr: np.ndarray, sel: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Flat positions of CSR slices sel[0], sel[1], ... concatenated, and each slice's length."""
+    starts = indptr[sel]
+    lens = indptr[sel + 1] - starts
+    return np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum()), lens
 
+class PathwayEvaluation:
+    """
+    Precision-recall of every pathway column against its curated geneset, all pathways
+    in one pass over the flat PathwayRanking arrays.
+    - curve points: "predict every protein scoring >= s" for each distinct score s > 0
+      in the column (tied proteins enter together)
+    - recall is out of the geneset genes present in the matrix ("in_matrix")
+    - auprc is average precision: sum over points of precision x recall gained
+    """
+    def __init__(self, scores: ProteinRegistry, ranking: PathwayRanking, genesets: GenesetIndex, version: str):
+        self.version = version
+        self.names = [n for n in genesets.names.tolist() if n in scores.pathway_col]
+        self.pathway_idx = {n: i for i, n in enumerate(self.names)}
+        n_pw, n_prot = len(self.names), genesets.n_matrix
+        sets = np.asarray([genesets.pathway_idx[n] for n in self.names], dtype=np.int64)
+        cols = np.asarray([scores.pathway_col[n] for n in self.names], dtype=np.int64)
+        self.geneset_size = genesets.sizes[sets]
+        self.in_matrix = genesets.in_matrix[sets]
+
+        # ranked entries of the evaluated columns, flattened; entry e belongs to pathway pid[e]
+        pos, lens = _slice_positions(ranking.indptr, cols)
+        pid = np.repeat(np.arange(n_pw), lens)
+        neg = ranking.neg_scores[pos]
+        self.predicted = lens
+        # hit[e]: the protein is in its pathway's geneset (keys pathway * n_prot + protein)
+        mpos, mlens = _slice_positions(genesets.indptr, sets)
+        members = genesets.genes[mpos].astype(np.int64)
+        mkeys = (np.repeat(np.arange(n_pw), mlens) * n_prot + members)[members < n_prot]
+        hit = np.isin(pid * n_prot + ranking.rows[pos], mkeys)
+
+        # true positives among the top k of each column, at the last entry of each tie run
+        cum = np.cumsum(hit)
+        offsets = np.zeros(n_pw + 1, dtype=np.int64)
+        np.cumsum(lens, out=offsets[1:])
+        tp = cum - np.repeat(np.concatenate([[0], cum])[offsets[:-1]], lens)
+        k = np.arange(len(pid)) - np.repeat(offsets[:-1], lens) + 1
+        last = np.ones(len(pid), dtype=bool)
+        last[:-1] = (neg[1:] != neg[:-1]) | (pid[1:] != pid[:-1])
+        pts = np.flatnonzero(last)
+        pp = pid[pts]
+        self.point_ptr = np.zeros(n_pw + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pp, minlength=n_pw), out=self.point_ptr[1:])
+        self.min_score = -neg[pts]
+        self.point_predicted = k[pts]
+        self.point_tp = tp[pts]
+
+        relevant = self.in_matrix[pp].astype(np.float64)
+        self.precision = self.point_tp / self.point_predicted
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.recall = self.point_tp / relevant
+        gained = np.diff(self.point_tp, prepend=0)
+        gained[self.point_ptr[:-1][lens > 0]] = self.point_tp[self.point_ptr[:-1][lens > 0]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.auprc = np.bincount(pp, weights=gained * self.precision, minlength=n_pw) / self.in_matrix
+        f1 = 2 * self.point_tp / (self.point_predicted + relevant)
+
+        # best F1 per pathway; on ties the higher cutoff (fewer proteins) wins
+        order = np.lexsort((self.point_predicted, -f1, pp))
+        has = lens > 0
+        best = order[self.point_ptr[:-1][has]]
+        self.best_f1 = np.zeros(n_pw)
+        self.best_min_score = np.full(n_pw, np.nan)
+        self.best_precision = np.full(n_pw, np.nan)
+        self.best_recall = np.full(n_pw, np.nan)
+        self.best_f1[has] = f1[best]
+        self.best_min_score[has] = self.min_score[best]
+        self.best_precision[has] = self.precision[best]
+        self.best_recall[has] = self.recall[best]
+
+    def curve(self, i: int) -> dict:
+        a, b = self.point_ptr[i], self.point_ptr[i + 1]
         return {
-            "pathway": pathway.upper(),
-            "description": desc,
-            "pubmed": pubmed,
-            "authors": authors,
+            "min_score": _nan_to_none(self.min_score[a:b]),  # float32 cutoffs, rounded like the rates
+            "predicted": self.point_predicted[a:b].tolist(),
+            "true_positives": self.point_tp[a:b].tolist(),
+            "precision": _nan_to_none(self.precision[a:b]),
+            "recall": _nan_to_none(self.recall[a:b]),
         }
 
-    except Exception as e:
-        return {"error": f"Could not fetch description for {pathway}: {e}"}
-
+_EVALUATION: PathwayEvaluation | None = None
+_EVALUATION_LOCK = threading.Lock()
+
+def pathway_evaluation() -> PathwayEvaluation:
+    """The evaluation for the loaded matrix and genesets, computed once per version pair."""
+    global _EVALUATION
+    version = f"{PATHWAY_VERSION}-{GENESETS.version}"
+    with _EVALUATION_LOCK:
+        if _EVALUATION is None or _EVALUATION.version != version:
+            t0 = time.time()
+            _EVALUATION = PathwayEvaluation(PATHWAY_SCORES, PATHWAY_RANKING, GENESETS, version)
+            print(f"[evaluation] {len(_EVALUATION.names)} pathways, {len(_EVALUATION.min_score)} curve points "
+                  f"in {time.time()-t0:.3f}s (version {version})")
+        return _EVALUATION
+
+@app.get("/pathway/evaluation")
+def evaluate_pathways(pathways: list[str] | None = Query(None), curve: bool = False):
+    """
+    How well each pathway's matrix scores recover its curated geneset: AUPRC and the
+    best-F1 cutoff (predict proteins scoring >= best_min_score), as columns.
+    - pathways: repeated or comma-separated (omitted = every pathway with both a matrix column and a geneset)
+    - curve=true adds the full precision-recall curve of each requested pathway
+    - "version" changes when the matrix or genesets do
+    """
+    ev = pathway_evaluation()
+    names = _split_list(pathways)
+    names = ev.names if names is None else list(dict.fromkeys(names))
+    found = [n for n in names if n in ev.pathway_idx]
+    idx = np.asarray([ev.pathway_idx[n] for n in found], dtype=np.int64)
+    body = {
+        "version": ev.version,
+        "missing": [n for n in names if n not in ev.pathway_idx],
+        "columns": {
+            "pathway": found,
+            "geneset_size": ev.geneset_size[idx].tolist(),
+            "in_matrix": ev.in_matrix[idx].tolist(),
+            "predicted": ev.predicted[idx].tolist(),
+            "auprc": _nan_to_none(ev.auprc[idx]),
+            "best_f1": _nan_to_none(ev.best_f1[idx]),
+            "best_min_score": _nan_to_none(ev.best_min_score[idx]),
+            "best_precision": _nan_to_none(ev.best_precision[idx]),
+            "best_recall": _nan_to_none(ev.best_recall[idx]),
+        },
+    }
+    if curve:
+        body["curves"] = {n: ev.curve(i) for n, i in zip(found, idx.tolist())}
+    return body
 
 # =========================================================
 # ========= PANEL 4: AUPRC plot (matplotlib) ==============
 # =========================================================
-DRUG_AUC_DF = pd.read_csv("drug_AUC.csv")
-
 @app.get("/auprc/image")
-def auprc_image(gene: str):
+def auprc_image(request: Request, gene: str):
     """
     Return AUPRC plot for a given gene.
     """
     try:
-        df = pd.read_csv("drug_AUC.csv")
-
-        # Subset to this gene
-        sub = df[df["gene"].str.upper() == gene.upper()]
-        if sub.empty:
-            return Response(status_code=404)
-
-        fig, ax = plt.subplots()
-
-        # ✅ Plot drug_norm vs AUPRC_mean
-        ax.plot(sub["drug_norm"], sub["AUPRC_mean"], marker="o", linestyle="-")
-
-        # ✅ Formatting: clean minimal plot
-        ax.set_xticks([])                # remove ticks
-        ax.set_xticklabels([])           # remove labels
-        ax.grid(False)                   # remove gridlines
-        ax.set_title("")                 # remove title
-        ax.set_ylabel("AUPRC (mean)")    # keep only y-axis label
-
-        # Save to PNG buffer
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight")
-        plt.close(fig)
-        buf.seek(0)
-
-        return Response(
-            content=buf.read(),
-            media_type="image/png",
-            headers={"Cache-Control": "no-store"}
-        )
-
+        gene = gene.strip().upper()
+        return cached_png(request, "auprc", {"gene": gene}, [DRUG_AUC.path],
+                          lambda: render_auprc_png(gene))
     except Exception as e:
         return {"error": str(e)}
 
+def render_auprc_png(gene: str) -> bytes | None:
+    # Subset to this gene (DRUG_AUC reference table)
+    sub = DRUG_AUC.rows(gene)
+    if sub.empty:
+        return None
+    return RENDER_POOL.render(render_service.render_auprc_png,
+                              sub["drug_norm"].to_numpy(), sub["AUPRC_mean"].to_numpy())
+
 
 
+def warm_render_cache(genes: list[str] | None = None, top: int = 20) -> int:
+    """
+    Pre-render the default flatmap, every per-pathway flatmap (both collapse modes),
+    calibration and AUPRC plots. Default genes: the `top` most requested, else all with nmfinfo files.
+    Returns the number of images rendered.
+    """
+    genes = genes or RENDER_CACHE.most_popular(top) or genes_with_nmf()
+    n = 0
+    for gene in genes:
+        requests_ = [(flatmap_image, dict(gene=gene))]
+        requests_ += [(flatmap_image, dict(gene=gene, name=pw, collapse=c))
+                      for pw in list_pathways_for_gene(gene) for c in ("max", "mean")]
+        requests_ += [(calibration_image, dict(gene=gene)), (auprc_image, dict(gene=gene))]
+        for endpoint, kw in requests_:
+            try:
+                r = endpoint(None, **kw)
+                n += getattr(r, "status_code", 500) == 200
+            except HTTPException:
+                pass
+    print(f"[render_cache] warmed {n} image(s) for {len(genes)} gene(s)")
+    return n
+
 # =========================================================
 # =============== DOWNLOADS ENDPOINT ======================
 # =========================================================
 
-from fastapi.responses import FileResponse
-
 DOWNLOADABLES = {
     "all_proteins_max_score_matrix_cleaned.csv": "Protein–Pathway association scores (max scores per protein–pathway)",
     "calibration.csv": "Calibration curves for computational ranking confidence",
@@ -976,6 +2366,72 @@ DOWNLOADABLES = {
     "residue-pathway-score.csv": "Residue-level association scores with pathways",
     "data/gsea_gdf_files.zip": "All GSEA pathway results (*.gdf.csv) bundled into a ZIP archive",
 }
+GSEA_ZIP = "data/gsea_gdf_files.zip"  # streamed from data/*_GSEA.csv_gdf.csv when not pre-built
+ZIP_CHUNK = 1024 * 1024
+
+def download_path(filename: str) -> Path | None:
+    """On-disk path of a DOWNLOADABLES entry (relative to BACKEND_DIR), or None."""
+    fpath = BACKEND_DIR / filename
+    return fpath if fpath.exists() else None
+
+def _accepted_encodings(request: Request) -> set[str]:
+    """Content codings the client accepts (q > 0)."""
+    return set(accepted_encodings(request.headers.get("accept-encoding")))
+
+class _DrainSink:
+    """
+    Write-only, unseekable file object for zipfile / pyarrow writers: whatever was
+    written is drained into a streaming response. tell() counts every byte written.
+    """
+    def __init__(self):
+        self.buf = bytearray()
+        self.written = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        self.buf += b
+        self.written += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.written
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = bytes(self.buf)
+        self.buf.clear()
+        return out
+
+def _zip_stream(members: list[tuple[str, Path]]):
+    """
+    Yield a ZIP of (arcname, path) members as it is written. zipfile falls back to data
+    descriptors on an unseekable sink, so nothing is staged on disk or held whole in memory.
+    """
+    sink = _DrainSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, path in members:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, "w") as dst:
+                while chunk := src.read(ZIP_CHUNK):
+                    dst.write(chunk)
+                    if len(sink.buf) >= ZIP_CHUNK:
+                        yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()  # central directory
+
+def _zip_response(members: list[tuple[str, Path]], filename: str) -> StreamingResponse:
+    return StreamingResponse(_zip_stream(members), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+def _gsea_members(gene: str | None = None) -> list[tuple[str, Path]]:
+    pattern = f"{gene}_*_GSEA.csv_gdf.csv" if gene else "*_GSEA.csv_gdf.csv"
+    return [(p.name, p) for p in sorted(DATA_DIR.glob(pattern))]
 
 @app.get("/downloads/list")
 def list_downloads():
@@ -985,22 +2441,187 @@ def list_downloads():
         for fname, desc in DOWNLOADABLES.items()
     ]
 
-@app.get("/downloads/get/{filename}")
-def get_download(filename: str):
-    """Serve a file for download if it exists in DOWNLOADABLES."""
+@app.get("/downloads/get/{filename:path}")
+def get_download(request: Request, filename: str):
+    """
+    Serve a file for download if it exists in DOWNLOADABLES.
+    - Range / If-Range requests resume interrupted transfers (handled by FileResponse)
+    - a zstd or gzip copy from data/precompressed is sent when the client accepts it
+      (build_artifacts.py compress-downloads); ranges then apply to the compressed bytes
+    - the GSEA ZIP is streamed from the gdf CSVs if it was never built
+    """
     if filename not in DOWNLOADABLES:
         raise HTTPException(status_code=404, detail="File not found.")
 
-    fpath = Path(filename)
-    if not fpath.exists():
-        # If relative path, resolve from backend folder
-        fpath = Path(__file__).resolve().parent / filename
-
-    if not fpath.exists():
+    fpath = download_path(filename)
+    if fpath is None and filename == GSEA_ZIP:
+        return _zip_response(_gsea_members(), Path(GSEA_ZIP).name)
+    if fpath is None:
         raise HTTPException(status_code=404, detail=f"File {filename} missing on server.")
 
-    return FileResponse(path=fpath, filename=fpath.name, media_type="application/octet-stream")
+    accepted = _accepted_encodings(request)
+    for enc in DOWNLOAD_ENCODINGS:
+        variant = precompressed_variant(fpath, enc) if enc in accepted else None
+        if variant is not None:
+            return FileResponse(path=variant, filename=fpath.name, media_type="application/octet-stream",
+                                headers={"Content-Encoding": enc, "Vary": "Accept-Encoding"})
+    return FileResponse(path=fpath, filename=fpath.name, media_type="application/octet-stream",
+                        headers={"Vary": "Accept-Encoding"})
+
+@app.get("/downloads/bundle")
+def download_bundle(files: list[str] = Query(...)):
+    """Any selection of DOWNLOADABLES as one streamed ZIP (?files=a.csv&files=b.csv)."""
+    unknown = [f for f in files if f not in DOWNLOADABLES]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Not downloadable: {', '.join(unknown)}")
+    members = []
+    for f in dict.fromkeys(files):
+        fpath = download_path(f)
+        if fpath is None and f == GSEA_ZIP:
+            members += [(f"gsea_gdf_files/{name}", p) for name, p in _gsea_members()]
+        elif fpath is None:
+            raise HTTPException(status_code=404, detail=f"File {f} missing on server.")
+        else:
+            members.append((Path(f).name, fpath))
+    return _zip_response(members, "downloads.zip")
+
+@app.get("/downloads/gene/{gene}")
+def download_gene(gene: str):
+    """One gene's nmfinfo table and all its GSEA gdf files as a streamed ZIP."""
+    if not re.fullmatch(r"[A-Za-z0-9._-]+", gene) or gene.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid gene name.")
+    members = [(p.name, p) for p in gene_pathways(gene).values()]
+    nmf = DATA_DIR / f"{gene}_nmfinfo_final.csv"
+    if nmf.exists():
+        members.insert(0, (nmf.name, nmf))
+    if not members:
+        raise HTTPException(status_code=404, detail=f"No files for {gene}.")
+    return _zip_response(members, f"{gene}_gsea.zip")
+
 
+# =========================================================
+# =============== EXPORT ENDPOINT =========================
+# =========================================================
+# Slices of the protein x pathway score matrix, streamed in row chunks straight from
+# PATHWAY_SCORES (memory-mapped, see build_artifacts.py score-matrix).
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+EXPORT_CHUNK_ROWS = 4096
+
+class ExportMatrixRequest(BaseModel):
+    proteins: list[str] | None = None    # default: every protein, in matrix order
+    pathways: list[str] | None = None    # default: every pathway
+    threshold: float | None = None       # keep rows with any selected score > threshold
+    format: str = "csv"                  # "csv" | "parquet" | "arrow"
+
+def _export_batches(reg: ProteinRegistry, rows: np.ndarray, cols: np.ndarray, names: list[str],
+                    threshold: float | None, schema: pa.Schema):
+    for start in range(0, len(rows), EXPORT_CHUNK_ROWS):
+        r = rows[start:start + EXPORT_CHUNK_ROWS]
+        block = reg.raw.rows(r)[:, cols]
+        if threshold is not None:
+            keep = (block > np.float32(threshold)).any(axis=1)
+            r, block = r[keep], block[keep]
+        if not len(r):
+            continue
+        yield pa.record_batch(
+            [pa.array(reg.ids[r].astype(str))] + [pa.array(block[:, j]) for j in range(len(cols))],
+            schema=schema)
+
+def _export_matrix(proteins, pathways, threshold, fmt: str):
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    reg = PATHWAY_SCORES
+
+    headers = {}
+    if proteins is None:
+        rows = np.arange(len(reg), dtype=np.int64)
+    else:
+        rows = reg.rows(proteins)
+        headers.update(_missing_headers("Proteins", [p for p, r in zip(proteins, rows) if r < 0]))
+        rows = np.asarray(list(dict.fromkeys(rows[rows >= 0].tolist())), dtype=np.int64)
+        if not len(rows):
+            raise HTTPException(status_code=404, detail="None of the requested proteins are in the score matrix.")
+    if pathways is None:
+        cols = np.arange(len(reg.pathways), dtype=np.int64)
+    else:
+        headers.update(_missing_headers("Pathways", [pw for pw in pathways if pw not in reg.pathway_col]))
+        cols = np.asarray(list(dict.fromkeys(reg.pathway_col[pw] for pw in pathways
+                                             if pw in reg.pathway_col)), dtype=np.int64)
+        if not len(cols):
+            raise HTTPException(status_code=404, detail="None of the requested pathways are in the score matrix.")
+
+    names = reg.pathways[cols].astype(str).tolist()
+    schema = pa.schema([("protein_id", pa.string())] + [(n, pa.float32()) for n in names])
+    batches = _export_batches(reg, rows, cols, names, threshold, schema)
+
+    def gen():
+        sink = _DrainSink()
+        out = pa.PythonFile(sink, mode="w")
+        if fmt == "csv":
+            writer = pa_csv.CSVWriter(out, schema)
+        elif fmt == "parquet":
+            writer = pq.ParquetWriter(out, schema)
+        else:
+            writer = pa.ipc.new_stream(out, schema)
+        with writer:
+            for batch in batches:
+                if fmt == "parquet":
+                    writer.write_table(pa.Table.from_batches([batch]))  # one row group per chunk
+                else:
+                    writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()  # parquet footer / arrow end-of-stream
+
+    media_type, ext = EXPORT_FORMATS[fmt]
+    headers["Content-Disposition"] = f'attachment; filename="matrix_slice.{ext}"'
+    return StreamingResponse(gen(), media_type=media_type, headers=headers)
+
+@app.get("/export/matrix")
+def export_matrix(proteins: list[str] | None = Query(None), pathways: list[str] | None = Query(None),
+                  threshold: float | None = None, format: str = "csv"):
+    """
+    A slice of the protein x pathway score matrix, streamed in row chunks.
+    - proteins / pathways: repeated or comma-separated; omitted = all. Unknown names are
+      skipped and listed (percent-encoded, first MISSING_HEADER_MAX) in the
+      X-Missing-Proteins / X-Missing-Pathways headers, with totals in X-Missing-*-Count;
+      404 when none of the given names is known.
+    - threshold: only rows with at least one selected score > threshold
+    - format: csv | parquet | arrow (IPC stream); first column protein_id
+    For long protein lists POST the same fields as JSON.
+    """
+    return _export_matrix(_split_list(proteins), _split_list(pathways), threshold, format)
 
+@app.post("/export/matrix")
+def export_matrix_post(req: ExportMatrixRequest):
+    return _export_matrix(req.proteins, req.pathways, req.threshold, req.format)
 
 
+# =========================================================
+# =============== STARTUP / SHUTDOWN ======================
+# =========================================================
+# Run by the app's lifespan handler (once per uvicorn worker). Until then every
+# data-backed global above is an empty placeholder.
+
+def startup():
+    global PATHWAY_SCORES, PATHWAY_RANKING, PATHWAY_VERSION, GENESETS
+    PLOT_ARTIFACTS.reload()  # Don’t crash app; a failure is reported on /plot_ping
+    PLOT_ARTIFACTS.start_watcher()
+    PATHWAY_SCORES, PATHWAY_RANKING, PATHWAY_VERSION = _load_pathway_scores()
+    GENESETS = GenesetIndex.from_dir(GENESET_DIR, PATHWAY_SCORES.ids)
+    DESCRIPTIONS.load()
+    RENDER_CACHE.load_popular()
+    RENDER_CACHE.prune()
+    RENDER_POOL.start()
+    print(f"[render_pool] {RENDER_POOL.workers} worker(s), queue depth {RENDER_POOL.queue_depth}")
+
+def shutdown():
+    PLOT_ARTIFACTS.stop_watcher()
+    DESCRIPTIONS.shutdown()
+    RENDER_CACHE.save_popular()
+    RENDER_POOL.shutdown(wait=True)
@@ -0,0 +1,436 @@
+# backend/render_service.py
+"""
+Matplotlib rendering for the PNG endpoints (flatmap, calibration, AUPRC).
+
+Plots are drawn with the object-oriented Figure API only (no pyplot state machine),
+so they are safe to run concurrently. main.py submits them to RENDER_POOL, a bounded
+process pool: renders scale with cores instead of contending on the GIL, and once
+every worker is busy and the queue is full new requests are rejected with
+RenderOverloaded (served as 503 + Retry-After). A render that outlasts RENDER_TIMEOUT
+raises RenderTimeout (served as 504). Workers are spawned and warmed up (imports, font
+cache) by RenderPool.start() at server start, not by the first requests.
+
+This module deliberately does not import main.py: spawned workers only pay for
+numpy/pandas/matplotlib, not for the score matrices and neighbour indexes.
+
+Tuning (environment):
+    RENDER_WORKERS      worker processes (default: min(4, CPUs); 0 renders inline)
+    RENDER_QUEUE_DEPTH  renders allowed to wait for a free worker (default: 2 x workers)
+    RENDER_TIMEOUT      seconds a request waits for its render (default: 60), then 504
+    RENDER_RETRY_AFTER  Retry-After seconds sent with 503 (default: 2)
+"""
+import io
+import os
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.cm import ScalarMappable
+from matplotlib.colors import ListedColormap, Normalize
+from matplotlib import patheffects
+
+from build_artifacts import (
+    DATA_DIR, source_signature, load_nmf, load_gdf_points, collapse_gi,
+    compute_flatmap_grid, save_flatmap_grid, load_flatmap_grid,
+    gi_signature, compute_gi_matrix, save_gi_matrix, load_gi_matrix,
+)
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+RENDER_QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", 2 * max(RENDER_WORKERS, 1)))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 60))
+RENDER_RETRY_AFTER = int(os.environ.get("RENDER_RETRY_AFTER", 2))
+
+# =========================================================
+# ===================== Process pool ======================
+# =========================================================
+
+class RenderOverloaded(Exception):
+    """Every worker is busy and the wait queue is full, or the pool just lost a worker."""
+    def __init__(self, retry_after: int = RENDER_RETRY_AFTER):
+        super().__init__(f"render queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class RenderTimeout(Exception):
+    """The render did not finish within the pool's timeout."""
+    def __init__(self, timeout: float = RENDER_TIMEOUT):
+        super().__init__(f"render did not finish within {timeout:g}s")
+        self.timeout = timeout
+
+def _init_worker():
+    # unpickling this function already imported this module (numpy, pandas, matplotlib);
+    # one tiny figure also builds matplotlib's font cache before the first real render
+    _png_bytes(Figure(figsize=(1, 1)))
+
+def _ready() -> bool:
+    return True
+
+class RenderPool:
+    """
+    ProcessPoolExecutor with admission control: at most workers + queue_depth renders
+    in flight. A slot is only released when its render finishes, so requests that
+    time out still count against the limit until the worker is actually free.
+    """
+    def __init__(self, workers: int = RENDER_WORKERS, queue_depth: int = RENDER_QUEUE_DEPTH,
+                 timeout: float = RENDER_TIMEOUT):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self.capacity = max(workers, 1) + queue_depth
+        self.in_flight = 0
+        self.rejected = 0
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def _release(self, *_):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the server process has live threads (uvicorn, threadpool)
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=mp.get_context("spawn"),
+                                                 initializer=_init_worker)
+            return self._pool
+
+    def start(self):
+        """Spawn every worker now (spawned workers start on demand); returns without waiting for them."""
+        if self.workers <= 0:
+            return
+        pool = self._executor()
+        for _ in range(self.workers):
+            pool.submit(_ready)
+
+    def render(self, fn, *args) -> bytes | None:
+        if not self._acquire():
+            raise RenderOverloaded()
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+
+        try:
+            fut = self._executor().submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        fut.add_done_callback(self._release)
+        try:
+            return fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise RenderTimeout(self.timeout)
+        except BrokenProcessPool:
+            # a worker died (e.g. OOM-killed): start a fresh pool for the next request
+            with self._lock:
+                self._pool = None
+            raise RenderOverloaded()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "queue_depth": self.queue_depth,
+                    "in_flight": self.in_flight, "rejected": self.rejected}
+
+    def shutdown(self, wait: bool = False):
+        """Cancel queued renders; wait=True also waits for running ones and the workers to exit."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+def _png_bytes(fig: Figure, **savefig_kw) -> bytes:
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", **savefig_kw)
+    return buf.getvalue()
+
+# =========================================================
+# ======================== Flatmap ========================
+# =========================================================
+
+# ---------------- Palette (matches Panel1) ----------------
+BASE_COLORS = [
+    "#e41a1c", "#377eb8", "#4daf4a", "#984ea3",
+    "#ff7f00", "#ffff33", "#a65628", "#f781bf",
+    "#999999"
+]
+
+def make_cluster_cmap(n_clusters: int) -> ListedColormap:
+    """Return ListedColormap using the same palette as Panel1, cycling if needed."""
+    colors = [BASE_COLORS[i % len(BASE_COLORS)] for i in range(n_clusters)]
+    return ListedColormap(colors)
+
+_FLATMAP_GRIDS: dict[str, tuple[dict, dict]] = {}  # gene -> (source signature, grid), per worker
+
+def get_flatmap_grid(gene: str, df: pd.DataFrame) -> dict:
+    """
+    Cluster/altitude interpolation grids for a gene: memory first, then the .npy cache
+    under data/flatmap_grids (see build_artifacts.py), else computed once and stored.
+    The .npy files are memory-mapped, so all workers share one copy in the page cache.
+    """
+    sig = source_signature(DATA_DIR / f"{gene}_nmfinfo_final.csv")
+    hit = _FLATMAP_GRIDS.get(gene)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+
+    grid = load_flatmap_grid(gene, sig)
+    if grid is None:
+        grid = compute_flatmap_grid(df)
+        try:
+            save_flatmap_grid(gene, grid, sig)
+        except OSError as e:
+            print("[flatmap_image][WARN] Could not store grid cache:", e)
+    _FLATMAP_GRIDS[gene] = (sig, grid)
+    return grid
+
+_GI_MATRICES: dict[str, tuple[dict, dict]] = {}  # gene -> (source signature, GI* matrices), per process
+
+def get_gi_matrix(gene: str, build: bool = False) -> dict | None:
+    """
+    A gene's residue/cluster x pathway GI* matrices (see build_artifacts.py gi-matrices):
+    memory first, then the .npy cache. Computed and stored on a miss only with build=True,
+    since that reads every pathway file of the gene.
+    """
+    sig = gi_signature(gene)
+    hit = _GI_MATRICES.get(gene)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+
+    gi = load_gi_matrix(gene, sig)
+    if gi is None:
+        if not build:
+            return None
+        gi = compute_gi_matrix(gene)
+        try:
+            save_gi_matrix(gene, gi, sig)
+        except OSError as e:
+            print("[gi_matrix][WARN] Could not store GI* matrix:", e)
+    _GI_MATRICES[gene] = (sig, gi)
+    return gi
+
+def render_flatmap_png(gene: str, name: str | None = None, collapse: str = "max") -> bytes:
+    """
+    Default (no pathway): categorical clusters, clipped to mask.
+    Pathway-specific: clusters colored by GI* (mean/max), clipped to mask.
+    Raises FileNotFoundError / ValueError for missing or malformed inputs.
+    """
+    df = load_nmf(gene)
+
+    gi_vals = None
+    if name:
+        # GI* per residue and per cluster: one column of the gene's GI* matrix when it is
+        # built, else collapsed from this pathway's points
+        mode = "mean" if collapse == "mean" else "max"
+        gi_mat = get_gi_matrix(gene)
+        if gi_mat is not None and name in gi_mat["pathways"]:
+            j = gi_mat["pathways"].index(name)
+            merged = df.assign(Gi_sum=gi_mat[f"residue_{mode}"][:, j])
+            cluster_scores = pd.Series(gi_mat[f"cluster_{mode}"][:, j], index=gi_mat["clusters"])
+        else:
+            residue, gi = load_gdf_points(gene, name, df)
+            merged = df.assign(Gi_sum=collapse_gi(residue, gi, df["point"].to_numpy(), mode))
+            cluster_scores = merged.groupby(merged["cluster"].astype(int))["Gi_sum"].agg(mode)
+        gi_vals = merged["Gi_sum"].fillna(0.0).astype(float)
+    else:
+        merged = df
+
+    # --- Plotting ---
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
+    ax.set_aspect("equal")
+    ax.axis("off")
+
+    xmn, xmx = df["x"].min(), df["x"].max()
+    ymn, ymx = df["y"].min(), df["y"].max()
+
+    # Cluster / altitude grids and mask: cached per gene, independent of pathway and collapse
+    grid = get_flatmap_grid(gene, df)
+    xmn_pad, xmx_pad, ymn_pad, ymx_pad = grid["extent"]
+    Xi, Yi = np.meshgrid(np.linspace(xmn_pad, xmx_pad, grid["nx"]),
+                         np.linspace(ymn_pad, ymx_pad, grid["ny"]))
+    Zi_cluster = grid["Zi_cluster"]
+    Zi_alt = grid["Zi_alt"]
+    outer_mask = np.array(grid["outer_mask"])  # writable copy: matplotlib updates masks in place
+    inside_mask = (~outer_mask).astype(float)
+
+    # Precompute masked fields
+    Zi_cluster_masked = np.ma.array(Zi_cluster, mask=outer_mask)
+    Zi_alt_masked     = np.ma.array(Zi_alt,     mask=outer_mask)
+
+    if gi_vals is None:
+        # --- Default cluster view ---
+        n_clusters = df["cluster"].nunique()
+        cmap_clusters = make_cluster_cmap(n_clusters)
+
+        cmap_clusters_plot = ListedColormap(list(cmap_clusters.colors))
+        try:
+            cmap_clusters_plot.set_bad(alpha=0.0)
+        except Exception:
+            pass
+
+        ax.imshow(Zi_cluster_masked, origin="lower",
+                  extent=(xmn_pad, xmx_pad, ymn_pad, ymx_pad),
+                  cmap=cmap_clusters_plot, alpha=0.25,
+                  interpolation="nearest", zorder=0)
+
+        ax.contour(Xi, Yi, Zi_cluster_masked, levels=np.unique(df["cluster"]),
+                   colors="black", linewidths=0.8, alpha=0.6, zorder=4)
+
+        sm = ScalarMappable(
+            cmap=cmap_clusters,
+            norm=Normalize(vmin=0, vmax=n_clusters - 1)
+        )
+        cbar = fig.colorbar(sm, ax=ax, fraction=0.046, pad=0.04,
+                            ticks=np.arange(n_clusters) + 0.5)
+        cbar.ax.set_yticklabels([])
+        cbar.set_label("Clusters")
+
+        colors = cmap_clusters(df["cluster"].to_numpy())
+        ax.scatter(df["x"], df["y"], c=colors, s=150,
+                   edgecolors="black", linewidths=0.2, alpha=0.95, zorder=3)
+
+    else:
+        # --- Pathway-specific ---
+        # paint each grid cell with its cluster's score: one gather through a cluster-id LUT
+        ids = cluster_scores.index.to_numpy(dtype=np.intp)
+        lo = ids.min()
+        lut = np.zeros(ids.max() - lo + 1)
+        lut[ids - lo] = cluster_scores.to_numpy(dtype=float)
+        Zi_gi_cluster = lut[np.asarray(Zi_cluster, dtype=np.intp) - lo]
+
+        cmap_redgreen = matplotlib.colormaps["RdYlGn_r"]
+        vmax = max(1.0, float(np.nanpercentile(np.abs(cluster_scores), 99)))
+        norm = Normalize(vmin=0, vmax=vmax)
+
+        Zi_gi_masked = np.ma.array(Zi_gi_cluster, mask=outer_mask)
+        im = ax.imshow(Zi_gi_masked, origin="lower",
+                       extent=(xmn_pad, xmx_pad, ymn_pad, ymx_pad),
+                       cmap=cmap_redgreen, norm=norm, alpha=0.6,
+                       interpolation="nearest", zorder=1)
+
+        ax.contour(Xi, Yi, Zi_cluster_masked, levels=np.unique(df["cluster"]),
+                   colors="black", linewidths=1.2, alpha=0.9, zorder=4)
+
+        ax.scatter(merged["x"], merged["y"], s=150,
+                   edgecolors="darkgrey", facecolors="none", linewidths=0, zorder=3)
+
+        cb = fig.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+        cb.set_label(f"Cluster GI* ({collapse})\nGreen = Low, Red = High")
+
+    # ---------- Altitude + Border ----------
+    ax.contour(Xi, Yi, Zi_alt_masked, levels=40,
+               colors="darkgrey", alpha=0, linewidths=0.5, zorder=5)
+
+    ax.contour(Xi, Yi, inside_mask, levels=[0.5],
+               colors="black", linewidths=2.5, zorder=6)
+
+    # ---------- Cluster Annotations ----------
+    try:
+        ann_path = DATA_DIR / "annotated_clusters.csv"
+        if ann_path.exists():
+            ann = pd.read_csv(ann_path)
+            ann["cluster"] = ann["cluster"].astype(int)
+            df["cluster"] = df["cluster"].astype(int)
+
+            ann_sub = ann[ann["gene"].str.upper() == gene.upper()]
+            if not ann_sub.empty:
+                centroids = df.groupby("cluster")[["x", "y"]].mean()
+
+                for _, row in ann_sub.iterrows():
+                    clust = row["cluster"]
+                    label = str(row["annotation_type"])
+                    if clust in centroids.index:
+                        sub_points = df[df["cluster"] == clust]
+                        if len(sub_points) < 20:
+                            cx, cy = sub_points[["x", "y"]].median()
+                        else:
+                            cx, cy = centroids.loc[clust]
+
+                        cx_true, cy_true = cx, cy
+
+                        # Push labels outside if near edge
+                        margin_x = 0.03 * (xmx - xmn)
+                        margin_y = 0.03 * (ymx - ymn)
+                        moved = False
+                        if cx <= xmn + margin_x:
+                            cx = xmn_pad - 0.05 * (xmx - xmn); moved = True
+                        if cx >= xmx - margin_x:
+                            cx = xmx_pad + 0.05 * (xmx - xmn); moved = True
+                        if cy <= ymn + margin_y:
+                            cy = ymn_pad - 0.05 * (ymx - ymn); moved = True
+                        if cy >= ymx - margin_y:
+                            cy = ymx_pad + 0.05 * (ymx - ymn); moved = True
+
+                        if moved:
+                            ax.plot([cx_true, cx], [cy_true, cy],
+                                    color="black", linewidth=0.8, zorder=998)
+
+                        ax.text(
+                            cx, cy, label,
+                            ha="center", va="center",
+                            fontsize=10, fontweight="bold",
+                            color="white",
+                            path_effects=[
+                                patheffects.Stroke(linewidth=2, foreground="black"),
+                                patheffects.Normal()
+                            ],
+                            clip_on=False,
+                            zorder=999
+                        )
+
+        ax.set_xlim(xmn_pad - 0.1*(xmx-xmn), xmx_pad + 0.1*(xmx-xmn))
+        ax.set_ylim(ymn_pad - 0.1*(ymx-ymn), ymx_pad + 0.1*(ymx-ymn))
+
+    except Exception as e:
+        print("[flatmap_image][WARN] Could not add annotations:", e)
+
+    # ------------------------------------------------------------------
+    fig.tight_layout(pad=0)
+
+    return _png_bytes(fig, dpi=170, bbox_inches="tight")
+
+# =========================================================
+# ================= Calibration / AUPRC ===================
+# =========================================================
+# main.py selects the gene's rows and ships only the two plotted columns.
+
+def render_calibration_png(rank: np.ndarray, confidence: np.ndarray) -> bytes:
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(rank, confidence)
+    ax.set_xlabel("Rank (from computational method)")
+    ax.set_ylabel("Confidence (% significant)")
+    ax.grid(False)
+
+    return _png_bytes(fig, bbox_inches="tight")
+
+def render_auprc_png(drug_norm: np.ndarray, auprc_mean: np.ndarray) -> bytes:
+    fig = Figure()
+    ax = fig.subplots()
+
+    # ✅ Plot drug_norm vs AUPRC_mean
+    ax.plot(drug_norm, auprc_mean, marker="o", linestyle="-")
+
+    # ✅ Formatting: clean minimal plot
+    ax.set_xticks([])                # remove ticks
+    ax.set_xticklabels([])           # remove labels
+    ax.grid(False)                   # remove gridlines
+    ax.set_title("")                 # remove title
+    ax.set_ylabel("AUPRC (mean)")    # keep only y-axis label
+
+    return _png_bytes(fig, bbox_inches="tight")
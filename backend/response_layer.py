@@ -0,0 +1,269 @@
+# backend/response_layer.py
+"""
+JSON encoding and HTTP compression for the API responses.
+
+- FastJSONResponse encodes with orjson, which writes numpy arrays and scalars natively
+  (no .tolist() / float() per element); NaN and inf become null. Without orjson it
+  falls back to the stdlib encoder, converting numpy values on the way.
+- CompressionMiddleware compresses responses of at least COMPRESS_MIN_BYTES with the
+  best coding the client accepts: br (when the brotli package is installed), else gzip.
+  Responses that already carry a Content-Encoding (precompressed files and lists),
+  partial (206) responses and already-compressed / binary columnar types pass through.
+- PrecompressedBody holds an encoded JSON body together with its gzip / br variants and
+  an ETag, for large responses that only change with a data version.
+
+Tuning (environment):
+    COMPRESS_MIN_BYTES  smallest body that is compressed (default 1024)
+    GZIP_LEVEL          1-9 (default 6: most of level 9's ratio at a fraction of the CPU)
+    BROTLI_QUALITY      0-11 for on-the-fly responses (default 5); precompressed bodies use 11
+"""
+import gzip
+import hashlib
+import json
+import os
+import zlib
+
+import anyio.to_thread
+import numpy as np
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+COMPRESS_THREAD_BYTES = 128 * 1024  # chunks this large are compressed off the event loop
+# already-compressed (or binary columnar) bodies are not worth another pass; octet-stream
+# downloads keep the identity bytes so Range / resume requests line up with the first response
+COMPRESS_EXCLUDED_TYPES = (
+    "application/gzip", "application/x-gzip", "application/zip", "application/grpc",
+    "application/octet-stream", "application/vnd.apache.parquet",
+    "application/vnd.apache.arrow.stream", "application/vnd.apache.arrow.file",
+    "image/png", "image/jpeg", "image/gif", "image/webp", "image/avif",
+    "font/woff", "font/woff2", "audio/*", "video/*", "text/event-stream",
+)
+
+# -----------------------
+# JSON
+# -----------------------
+
+def _default(obj):
+    """Values the encoder doesn't take natively: numpy scalars, sets, and numpy arrays
+    orjson can't write directly (non-contiguous -> made contiguous; other dtypes -> lists)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        if orjson is not None and obj.dtype != object and not obj.flags.c_contiguous:
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def _nan_safe(obj):
+        if isinstance(obj, float) and (obj != obj or obj in (float("inf"), float("-inf"))):
+            return None
+        if isinstance(obj, dict):
+            return {k: _nan_safe(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [_nan_safe(v) for v in obj]
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return _nan_safe(obj.tolist())
+        return obj
+
+    def dumps(content) -> bytes:
+        return json.dumps(_nan_safe(content), default=_default, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse through dumps(): numpy arrays can be returned as they are."""
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+# -----------------------
+# Content-coding negotiation
+# -----------------------
+
+def _codings() -> tuple[str, ...]:
+    """Codings this server can produce, preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def accepted_encodings(header: str | None) -> dict[str, float]:
+    """Accept-Encoding -> {coding: q} for the codings the client accepts (q > 0)."""
+    out = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        try:
+            weight = float(q[2:]) if q.startswith("q=") else 1.0
+        except ValueError:
+            weight = 1.0
+        if name and weight > 0:
+            out[name.strip().lower()] = weight
+    return out
+
+def negotiate(header: str | None, available: tuple[str, ...] | None = None) -> str | None:
+    """Best coding from `available` the client accepts (highest q, then our preference); None = identity."""
+    accepted = accepted_encodings(header)
+    best = None
+    for coding in (available if available is not None else _codings()):
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (coding, q)
+    return None if best is None else best[0]
+
+def compress(body: bytes, coding: str, quality: int | None = None) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY if quality is None else quality)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL if quality is None else quality, mtime=0)
+
+# -----------------------
+# Middleware
+# -----------------------
+
+class _StreamCompressor:
+    """One response's gzip / br stream; chunks are flushed so streamed bodies decode as they arrive."""
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        self.coding = coding
+        if coding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _process(self, body: bytes, more_body: bool) -> bytes:
+        if self.coding == "br":
+            return self._c.process(body) + (self._c.flush() if more_body else self._c.finish())
+        return self._c.compress(body) + self._c.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+    async def __call__(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= COMPRESS_THREAD_BYTES:
+            # large chunks would block the event loop
+            return await anyio.to_thread.run_sync(self._process, body, more_body)
+        return self._process(body, more_body)
+
+def _excluded(content_type: str, excluded: tuple[str, ...]) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type in excluded or media_type.partition("/")[0] + "/*" in excluded
+
+class CompressionMiddleware:
+    """
+    Plain ASGI middleware: compresses responses of at least minimum_size (or streamed) with
+    the best coding the client accepts, br preferred when the brotli package is installed.
+    Responses that carry a Content-Encoding, partial (206) responses and excluded content
+    types pass through untouched.
+    """
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY,
+                 exclude_content_types: tuple[str, ...] = COMPRESS_EXCLUDED_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.exclude_content_types = exclude_content_types
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        start = None          # held back until the first body chunk decides the headers
+        passthrough = False
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, passthrough, compressor
+            kind = message["type"]
+            if kind == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = ("content-encoding" in headers or message["status"] == 206
+                               or _excluded(headers.get("content-type", ""), self.exclude_content_types))
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+            elif passthrough or kind != "http.response.body":
+                if start is not None:  # e.g. pathsend / trailers after a held-back start
+                    await send(start)
+                    start = None
+                await send(message)
+            elif start is not None:
+                # first body chunk
+                body = message.get("body", b"")
+                more_body = message.get("more_body", False)
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start)
+                    await send(message)
+                    start = None
+                    return
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if coding is not None:
+                    compressor = _StreamCompressor(coding, self.gzip_level, self.brotli_quality)
+                    message = {**message, "body": await compressor(body, more_body)}
+                    headers["Content-Encoding"] = coding
+                    if more_body or start.get("trailers", False):
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(message["body"]))
+                await send(start)
+                await send(message)
+                start = None
+            elif compressor is not None:
+                more_body = message.get("more_body", False)
+                await send({**message, "body": await compressor(message.get("body", b""), more_body)})
+            else:
+                await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+# -----------------------
+# Precompressed bodies
+# -----------------------
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+class PrecompressedBody:
+    """
+    One JSON body, encoded once and compressed once per coding at the highest level, for
+    responses that are the same until `version` changes. The ETag is weak (W/) because
+    the coded variants share it.
+    """
+    def __init__(self, content, version: str):
+        self.version = version
+        raw = dumps(content)
+        self.etag = f'W/"{hashlib.sha1(raw).hexdigest()[:16]}"'
+        self.variants = {None: raw}
+        if len(raw) >= COMPRESS_MIN_BYTES:
+            for coding in _codings():
+                self.variants[coding] = compress(raw, coding, quality=11 if coding == "br" else 9)
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request, self.etag):
+            return Response(status_code=304, headers={**headers, "Vary": "Accept-Encoding"})
+        coding = negotiate(request.headers.get("accept-encoding"), tuple(c for c in self.variants if c))
+        if coding is not None:
+            # identity bodies this large get Vary from CompressionMiddleware, coded ones skip it
+            headers.update({"Content-Encoding": coding, "Vary": "Accept-Encoding"})
+        return Response(content=self.variants[coding], media_type="application/json", headers=headers)
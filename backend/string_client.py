@@ -0,0 +1,210 @@
+# backend/string_client.py
+"""
+Async client for the STRING network API (https://string-db.org/api).
+
+- one pooled httpx.AsyncClient per event loop, at most STRING_MAX_CONCURRENCY
+  requests in flight, each bounded by STRING_TIMEOUT_S
+- proteins are sorted and split into STRING_CHUNK-sized chunks fetched in parallel
+- every chunk's edges are cached on disk as string_cache/<key>.json, keyed by
+  (species, protein set), and reused for STRING_CACHE_TTL_S; cache and fixture
+  files are read and written in a worker thread, off the event loop
+
+Tests and offline runs can point it elsewhere (environment):
+    STRING_API_URL      base URL of a local stand-in server (default: string-db.org)
+    STRING_FIXTURE_DIR  recorded responses, same <key>.json layout as the cache;
+                        when set the network is never used and a missing key is an error
+A fixture directory can be recorded by copying string_cache/ after a normal run.
+
+When a local snapshot has been built (build_artifacts.py string-index), StringIndex
+answers pathway queries from it instead, fully offline:
+    STRING_SOURCE       auto (local index if present, else API) | local | api
+    STRING_MIN_SCORE    minimum combined score for local edges (default 0.4, the API default)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import anyio.to_thread
+import httpx
+import numpy as np
+
+from build_artifacts import BACKEND_DIR, STRING_INDEX_DIR, STRING_INDEX_ARRAYS
+
+STRING_API_URL = os.environ.get("STRING_API_URL", "https://string-db.org/api")
+STRING_FIXTURE_DIR = os.environ.get("STRING_FIXTURE_DIR")
+STRING_CACHE_DIR = BACKEND_DIR / "string_cache"
+STRING_CACHE_TTL_S = float(os.environ.get("STRING_CACHE_TTL_S", 7 * 24 * 3600))
+STRING_MAX_CONCURRENCY = int(os.environ.get("STRING_MAX_CONCURRENCY", 4))
+STRING_TIMEOUT_S = float(os.environ.get("STRING_TIMEOUT_S", 20))
+STRING_CHUNK = 100                # proteins per request (safe size for the STRING API)
+STRING_CALLER_IDENTITY = "my_app"
+STRING_SOURCE = os.environ.get("STRING_SOURCE", "auto").lower()
+STRING_MIN_SCORE = float(os.environ.get("STRING_MIN_SCORE", 0.4))
+
+class StringClient:
+    def __init__(self, base_url: str = STRING_API_URL, fixture_dir: str | Path | None = STRING_FIXTURE_DIR,
+                 cache_dir: Path = STRING_CACHE_DIR, ttl_s: float = STRING_CACHE_TTL_S,
+                 max_concurrency: int = STRING_MAX_CONCURRENCY, timeout_s: float = STRING_TIMEOUT_S):
+        self.base_url = base_url.rstrip("/")
+        self.fixture_dir = Path(fixture_dir) if fixture_dir else None
+        self.cache_dir = cache_dir
+        self.ttl_s = ttl_s
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self._client: httpx.AsyncClient | None = None
+        self._loop = None
+        self._sem: asyncio.Semaphore | None = None
+
+    def _session(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # httpx clients and semaphores belong to one event loop; rebuild if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            self._client = httpx.AsyncClient(timeout=self.timeout_s, limits=limits)
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client, self._sem
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # -------- cache --------
+    @staticmethod
+    def key(species: int, proteins: list[str]) -> str:
+        payload = json.dumps({"species": int(species), "proteins": sorted(proteins)})
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cache_get(self, key: str) -> list[dict] | None:
+        fn = self.cache_dir / f"{key}.json"
+        try:
+            if time.time() - fn.stat().st_mtime > self.ttl_s:
+                return None
+            return json.loads(fn.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _cache_put(self, key: str, edges: list[dict]):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_dir / f"{key}.json.tmp"
+            tmp.write_text(json.dumps(edges))
+            tmp.replace(self.cache_dir / f"{key}.json")
+        except OSError as e:
+            print("[string_client][WARN] Could not write cache:", e)
+
+    def _fixture_get(self, key: str, n_proteins: int) -> list[dict]:
+        fn = self.fixture_dir / f"{key}.json"
+        if not fn.exists():
+            raise FileNotFoundError(f"No recorded STRING response {fn.name} ({n_proteins} proteins)")
+        return json.loads(fn.read_text())
+
+    # -------- requests --------
+    async def _fetch_chunk(self, chunk: list[str], species: int) -> list[dict]:
+        key = self.key(species, chunk)
+        if self.fixture_dir is not None:
+            return await anyio.to_thread.run_sync(self._fixture_get, key, len(chunk))
+
+        edges = await anyio.to_thread.run_sync(self._cache_get, key)
+        if edges is not None:
+            return edges
+
+        client, sem = self._session()
+        params = {
+            "identifiers": "%0d".join(chunk),
+            "species": species,
+            "caller_identity": STRING_CALLER_IDENTITY,
+        }
+        async with sem:
+            r = await client.get(f"{self.base_url}/json/network", params=params)
+        r.raise_for_status()
+        edges = r.json()
+        await anyio.to_thread.run_sync(self._cache_put, key, edges)
+        return edges
+
+    async def network(self, proteins, species: int = 9606) -> list[dict]:
+        """
+        STRING edges among `proteins`, queried in sorted STRING_CHUNK-sized chunks
+        (edges between proteins in different chunks are not returned).
+        """
+        proteins = sorted(set(proteins))
+        chunks = [proteins[i:i + STRING_CHUNK] for i in range(0, len(proteins), STRING_CHUNK)]
+        results = await asyncio.gather(*(self._fetch_chunk(c, species) for c in chunks))
+        return [d for edges in results for d in edges]
+
+
+# =========================================================
+# ================ Local snapshot (offline) ===============
+# =========================================================
+
+class StringIndex:
+    """
+    Memory-mapped CSR adjacency of one species' STRING network (see build_artifacts.py).
+    Proteins are integer rows; indptr/indices/scores are the symmetric edge lists.
+    """
+    def __init__(self, gdir: Path):
+        self.meta = json.loads((gdir / "meta.json").read_text())
+        arrays = {name: np.load(gdir / f"{name}.npy", mmap_mode="r") for name in STRING_INDEX_ARRAYS}
+        self.names = np.asarray(arrays["names"])
+        self.indptr, self.indices, self.scores = arrays["indptr"], arrays["indices"], arrays["scores"]
+        self.row_of: dict[str, int] = {}
+        for i, name in enumerate(self.names.tolist()):
+            self.row_of.setdefault(name, i)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _mask(self, proteins) -> np.ndarray:
+        m = np.zeros(len(self), dtype=bool)
+        m[[self.row_of[p] for p in proteins if p in self.row_of]] = True
+        return m
+
+    def interactions(self, prediction, geneset, min_score: float = STRING_MIN_SCORE) -> list[dict]:
+        """
+        Edges with one end in `prediction` and the other in `geneset`, as
+        {"prediction_protein", "geneset_protein", "score"}; each edge reported once.
+        """
+        in_pred, in_gs = self._mask(prediction), self._mask(geneset)
+        src_rows = np.flatnonzero(in_pred)
+        starts, ends = self.indptr[src_rows], self.indptr[src_rows + 1]
+        lens = ends - starts
+        if lens.sum() == 0:
+            return []
+        # flat positions of every adjacency entry of every prediction row
+        pos = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(lens.sum())
+        src = np.repeat(src_rows, lens)
+        dst = np.asarray(self.indices[pos])
+        score = np.asarray(self.scores[pos], dtype=np.float32)
+
+        # compare on STRING's 0-1000 scale: float16 cannot hold 0.4 etc. exactly
+        keep = in_gs[dst] & (np.rint(score * 1000) >= round(min_score * 1000))
+        # an edge between two proteins that are each in both sets shows up from both ends
+        keep &= ~(in_pred[dst] & in_gs[src] & (src > dst))
+        src, dst, score = src[keep], dst[keep], score[keep]
+        return [
+            {"prediction_protein": a, "geneset_protein": b, "score": round(float(sc), 3)}
+            for a, b, sc in zip(self.names[src].tolist(), self.names[dst].tolist(), score.tolist())
+        ]
+
+_STRING_INDEXES: dict[int, tuple[dict, StringIndex]] = {}  # species -> (meta.json stat, index)
+
+def get_string_index(species: int, index_dir: Path = STRING_INDEX_DIR) -> StringIndex | None:
+    """The local snapshot for a species, reloaded if it was rebuilt; None if there is none."""
+    gdir = index_dir / str(int(species))
+    try:
+        st = (gdir / "meta.json").stat()
+    except OSError:
+        return None
+    sig = (st.st_mtime_ns, st.st_size)
+    hit = _STRING_INDEXES.get(species)
+    if hit is not None and hit[0] == sig:
+        return hit[1]
+    index = StringIndex(gdir)
+    _STRING_INDEXES[species] = (sig, index)
+    print(f"[string_index] species {species}: {len(index)} proteins, {len(index.indices)} directed edges")
+    return index
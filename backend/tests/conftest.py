@@ -0,0 +1,124 @@
+# backend/tests/conftest.py
+"""
+Shared fixtures. The backend runs against a small synthetic data root (BACKEND_DIR),
+generated once per session before any backend module is imported:
+
+- 60 proteins x 12 pathways, row 5 all zero (no annotations), KEAP1 and BRCA1 included
+- protein_map_outputs/ with vectors, coords and a 5-NN edge table (a few edges point at
+  proteins that are not in the vectors, as after a partial rebuild)
+- the score-matrix CSV, geneset_files/ and the reference CSVs
+- KEAP1's nmfinfo / NRF2 and ADA2 gdfs / annotated clusters copied from the real data/
+
+Run from the backend directory:  python -m pytest -q
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND))
+
+N_PROTEINS = 60
+PATHWAYS = ["NRF2", "ADA2", "ADCYAP1"] + [f"PW{i:02d}" for i in range(3, 12)]
+KNN_K = 5
+UNANNOTATED = 5  # row with no nonzero pathway score
+
+_ROOT = Path(tempfile.mkdtemp(prefix="backend-tests-"))
+
+def protein_ids() -> list[str]:
+    return [f"G{i:03d}" for i in range(N_PROTEINS - 2)] + ["KEAP1", "BRCA1"]
+
+def score_matrix() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    V = rng.random((N_PROTEINS, len(PATHWAYS))).astype(np.float32)
+    V[V < 0.5] = 0
+    V[UNANNOTATED] = 0
+    return V
+
+def exact_knn(V: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    U = V / (np.linalg.norm(V, axis=1, keepdims=True) + 1e-12)
+    S = U @ U.T
+    np.fill_diagonal(S, -np.inf)
+    idx = np.argsort(-S, axis=1, kind="stable")[:, :k]
+    return idx, np.take_along_axis(S, idx, axis=1)
+
+def build_fixture_data(root: Path):
+    ids, V = protein_ids(), score_matrix()
+    out = root / "protein_map_outputs"
+    out.mkdir(parents=True)
+    vecs = pd.DataFrame(V, columns=PATHWAYS)
+    vecs.insert(0, "protein_id", ids)
+    vecs.to_parquet(out / "protein_vectors.parquet", index=False)
+    rng = np.random.default_rng(1)
+    pd.DataFrame({"protein_id": ids, "x": rng.normal(size=N_PROTEINS), "y": rng.normal(size=N_PROTEINS)}) \
+        .to_parquet(out / "protein_coords2d.parquet", index=False)
+    idx, sims = exact_knn(V, KNN_K)
+    edges = pd.DataFrame({"source": np.repeat(ids, KNN_K), "target": np.asarray(ids)[idx.ravel()],
+                          "cosine_sim": sims.ravel()})
+    # two of G000's edges point at proteins the vectors no longer have
+    edges.loc[[0, 1], "target"] = ["GONE1", "GONE2"]
+    edges.to_parquet(out / "protein_knn_edges.parquet", index=False)
+    (out / "manifest.json").write_text(json.dumps({
+        "vectors_parquet": "protein_vectors.parquet",
+        "coords_parquet": "protein_coords2d.parquet",
+        "edges_parquet": "protein_knn_edges.parquet",
+        "metric": "angular",
+        "dim": len(PATHWAYS),
+        "k_neighbors": KNN_K,
+    }))
+
+    pd.DataFrame(V, index=ids, columns=PATHWAYS).to_csv(root / "all_proteins_max_score_matrix_cleaned.csv")
+
+    # each geneset: the proteins scoring >= 0.7 on it, plus a gene outside the matrix
+    gdir = root / "geneset_files"
+    gdir.mkdir()
+    for j, pw in enumerate(PATHWAYS):
+        genes = [ids[i] for i in np.flatnonzero(V[:, j] >= 0.7)] + [f"OUT{j}"]
+        pd.DataFrame({"0": genes}).to_csv(gdir / f"{pw}_geneset.csv", index=False)
+
+    pd.DataFrame({"Gene Names": ["KEAP1", "BRCA1"], "Entry": ["Q14145", "P38398"], "GO": ["a; b", "c"]}) \
+        .to_csv(root / "cleaned_mappings_2.csv", index=False)
+    for name in ("calibration.csv", "drug_AUC.csv", "llm_group_labels.csv", "gene_to_pdb.csv",
+                 "tf_function_labels_10groups.csv"):
+        shutil.copy(BACKEND / name, root / name)
+    (root / "data").mkdir()
+    for name in ("KEAP1_nmfinfo_final.csv", "KEAP1_NRF2_GSEA.csv_gdf.csv", "KEAP1_ADA2_GSEA.csv_gdf.csv",
+                 "annotated_clusters.csv"):
+        shutil.copy(BACKEND / "data" / name, root / "data" / name)
+
+def pytest_configure(config):
+    # before any backend module is imported: their paths and knobs are read at import
+    if not (_ROOT / "protein_map_outputs").exists():
+        build_fixture_data(_ROOT)
+    os.environ["BACKEND_DIR"] = str(_ROOT)
+    os.environ.setdefault("RENDER_WORKERS", "1")
+    os.environ.setdefault("STRING_SOURCE", "local")
+    os.environ.setdefault("MSIGDB_URL", "http://127.0.0.1:9/unreachable")
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_ROOT, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def data_root() -> Path:
+    return _ROOT
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient on the app, started (lifespan run) on the fixture data."""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def backend(client):
+    """The started main module, for calling into its globals directly."""
+    import main
+    return main
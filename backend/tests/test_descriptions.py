@@ -0,0 +1,105 @@
+import json
+import time
+
+import pytest
+import requests
+
+import build_artifacts
+from build_artifacts import DESCRIPTION_RETRY_S, description_is_stale, description_retry_s, refresh_description
+
+def good(pathway: str) -> dict:
+    return {"pathway": pathway.upper(), "description": f"{pathway} targets", "pubmed": "1", "authors": "A",
+            "fetched_at": time.time()}
+
+def failing(exc: Exception):
+    def fetch(pathway):
+        raise exc
+    return fetch
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+def test_retry_backoff_grows_and_is_capped():
+    assert description_retry_s(1) == DESCRIPTION_RETRY_S
+    assert description_retry_s(3) == 4 * DESCRIPTION_RETRY_S
+    assert description_retry_s(50) == build_artifacts.DESCRIPTION_ERROR_TTL_S
+
+def test_failures_are_counted_and_retried_after_backoff(monkeypatch):
+    monkeypatch.setattr(build_artifacts, "fetch_msigdb_description", failing(requests.Timeout("slow")))
+    first = refresh_description("NRF2")
+    assert first["error"] and first["failures"] == 1 and first["transient"]
+    second = refresh_description("NRF2", first)
+    assert second["failures"] == 2
+    now = second["fetched_at"]
+    assert not description_is_stale(second, now + description_retry_s(2) - 1)
+    assert description_is_stale(second, now + description_retry_s(2) + 1)
+
+def test_failed_refresh_keeps_good_entry(monkeypatch):
+    monkeypatch.setattr(build_artifacts, "fetch_msigdb_description", failing(http_error(503)))
+    entry = refresh_description("NRF2", good("NRF2"))
+    assert entry["description"] == "NRF2 targets" and entry["refresh_error"] and entry["transient"]
+    monkeypatch.setattr(build_artifacts, "fetch_msigdb_description", good)
+    assert "failures" not in refresh_description("NRF2", entry)
+
+@pytest.mark.parametrize("exc, saved", [(requests.ConnectionError("down"), False), (http_error(429), False),
+                                        (http_error(404), True), (ValueError("bad TSV"), True)])
+def test_only_permanent_failures_are_saved(backend, tmp_path, monkeypatch, exc, saved):
+    monkeypatch.setattr(build_artifacts, "fetch_msigdb_description", failing(exc))
+    store = backend.DescriptionStore(tmp_path / "descriptions.json")
+    try:
+        entry = store.refresh("NRF2").result(timeout=10)
+    finally:
+        store.shutdown()
+    assert "error" in entry and store.entries["NRF2"] is entry
+    assert (tmp_path / "descriptions.json").exists() == saved
+
+def test_unexpected_error_clears_the_pending_fetch(backend, tmp_path, monkeypatch):
+    def broken(key, entry):
+        raise RuntimeError("bug")
+    monkeypatch.setattr(backend, "refresh_description", broken)
+    store = backend.DescriptionStore(tmp_path / "descriptions.json")
+    try:
+        first = store.refresh("NRF2")
+        with pytest.raises(RuntimeError):
+            first.result(timeout=10)
+        assert store._pending == {}
+        monkeypatch.setattr(backend, "refresh_description", lambda key, entry: good(key))
+        assert store.refresh("NRF2") is not first
+        assert store.refresh("NRF2").result(timeout=10)["description"] == "NRF2 targets"
+    finally:
+        store.shutdown()
+
+def test_reload_keeps_newer_unsaved_failures(backend, tmp_path):
+    path = tmp_path / "descriptions.json"
+    stale = dict(good("NRF2"), fetched_at=0)
+    path.write_text(json.dumps({"NRF2": stale}))
+    store = backend.DescriptionStore(path)
+    store.load()
+    store.entries = {"NRF2": dict(stale, checked_at=time.time(), refresh_error="down", transient=True)}
+    store._checked_at = 0
+    store._sig = None
+    store._maybe_reload()
+    assert store.entries["NRF2"]["refresh_error"] == "down"
+
+def test_descriptions_enqueue_is_capped(backend, client, tmp_path, monkeypatch):
+    store = backend.DescriptionStore(tmp_path / "descriptions.json")
+    queued = []
+    monkeypatch.setattr(store, "refresh", queued.append)
+    monkeypatch.setattr(backend, "DESCRIPTIONS", store)
+    body = client.get("/pathway/descriptions").json()
+    assert len(body["pending"]) == len(backend.PATHWAY_SCORES.pathways)
+    assert len(queued) == backend.DESCRIPTION_MAX_ENQUEUE
+
+def test_description_endpoint(backend, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(build_artifacts, "fetch_msigdb_description", good)
+    store = backend.DescriptionStore(tmp_path / "descriptions.json")
+    monkeypatch.setattr(backend, "DESCRIPTIONS", store)
+    try:
+        body = client.get("/pathway/description", params={"pathway": "nrf2"}).json()
+    finally:
+        store.shutdown()
+    assert body == {"pathway": "NRF2", "description": "NRF2 targets", "pubmed": "1", "authors": "A"}
+    listed = client.get("/pathway/descriptions", params={"pathways": "NRF2"}).json()
+    assert listed["descriptions"]["NRF2"]["description"] == "NRF2 targets"
@@ -0,0 +1,73 @@
+import gzip
+import io
+import zipfile
+
+import pytest
+
+from build_artifacts import build_precompressed
+
+def unzip(content: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(content)) as zf:
+        assert zf.testzip() is None
+        return {name: zf.read(name) for name in zf.namelist()}
+
+def test_zip_stream_is_chunked_and_valid(backend, data_root, monkeypatch):
+    monkeypatch.setattr(backend, "ZIP_CHUNK", 1024)
+    members = backend._gsea_members("KEAP1")
+    assert [name for name, _ in members] == ["KEAP1_ADA2_GSEA.csv_gdf.csv", "KEAP1_NRF2_GSEA.csv_gdf.csv"]
+    chunks = list(backend._zip_stream(members))
+    assert len([c for c in chunks if c]) > 2
+    assert unzip(b"".join(chunks)) == {name: path.read_bytes() for name, path in members}
+
+def test_plain_download_and_ranges(client, data_root):
+    want = (data_root / "calibration.csv").read_bytes()
+    identity = {"Accept-Encoding": "identity"}
+    r = client.get("/downloads/get/calibration.csv", headers=identity)
+    assert r.status_code == 200 and r.content == want and r.headers["accept-ranges"] == "bytes"
+    part = client.get("/downloads/get/calibration.csv", headers={**identity, "Range": "bytes=10-19"})
+    assert part.status_code == 206 and part.content == want[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(want)}"
+    tail = client.get("/downloads/get/calibration.csv", headers={**identity, "Range": "bytes=-5"})
+    assert tail.content == want[-5:]
+    stale = client.get("/downloads/get/calibration.csv",
+                       headers={**identity, "Range": "bytes=10-19", "If-Range": '"old-etag"'})
+    assert stale.status_code == 200 and stale.content == want
+
+def test_precompressed_variant(client, data_root):
+    src = data_root / "gene_to_pdb.csv"
+    build_precompressed([src])
+    with client.stream("GET", "/downloads/get/gene_to_pdb.csv", headers={"Accept-Encoding": "gzip"}) as r:
+        raw = b"".join(r.iter_raw())
+    assert r.headers["content-encoding"] == "gzip" and "Accept-Encoding" in r.headers["vary"]
+    assert gzip.decompress(raw) == src.read_bytes()
+    r = client.get("/downloads/get/gene_to_pdb.csv", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers and r.content == src.read_bytes()
+
+def test_gsea_zip_is_streamed_when_not_built(client, data_root):
+    r = client.get("/downloads/get/data/gsea_gdf_files.zip")
+    assert r.headers["content-type"] == "application/zip"
+    assert set(unzip(r.content)) == {"KEAP1_ADA2_GSEA.csv_gdf.csv", "KEAP1_NRF2_GSEA.csv_gdf.csv"}
+
+def test_bundle(client, data_root):
+    r = client.get("/downloads/bundle", params={"files": ["calibration.csv", "data/gsea_gdf_files.zip",
+                                                          "calibration.csv"]})
+    files = unzip(r.content)
+    assert sorted(files) == ["calibration.csv", "gsea_gdf_files/KEAP1_ADA2_GSEA.csv_gdf.csv",
+                             "gsea_gdf_files/KEAP1_NRF2_GSEA.csv_gdf.csv"]
+    assert files["calibration.csv"] == (data_root / "calibration.csv").read_bytes()
+
+@pytest.mark.parametrize("files", [["calibration.csv", "../secret"], ["residue-pathway-score.csv"]])
+def test_bundle_errors(client, files):
+    assert client.get("/downloads/bundle", params={"files": files}).status_code == 404
+
+def test_gene_zip(client, data_root):
+    r = client.get("/downloads/gene/KEAP1")
+    assert r.headers["content-disposition"] == 'attachment; filename="KEAP1_gsea.zip"'
+    assert list(unzip(r.content)) == ["KEAP1_nmfinfo_final.csv", "KEAP1_ADA2_GSEA.csv_gdf.csv",
+                                      "KEAP1_NRF2_GSEA.csv_gdf.csv"]
+    assert client.get("/downloads/gene/.hidden").status_code == 400
+    assert client.get("/downloads/gene/NOPE").status_code == 404
+
+def test_unknown_download(client):
+    assert client.get("/downloads/get/main.py").status_code == 404
+    assert len(client.get("/downloads/list").json()) == 9
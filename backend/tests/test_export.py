@@ -0,0 +1,57 @@
+import io
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+def read_body(fmt: str, content: bytes) -> pd.DataFrame:
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(content))
+    if fmt == "parquet":
+        return pd.read_parquet(io.BytesIO(content))
+    return pa.ipc.open_stream(content).read_all().to_pandas()
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet", "arrow"])
+def test_export_formats_match_matrix(client, fmt):
+    r = client.get("/export/matrix", params={"proteins": "KEAP1,G003,KEAP1", "pathways": ["NRF2", "PW04"],
+                                             "format": fmt})
+    assert r.status_code == 200
+    assert f"matrix_slice.{'arrow' if fmt == 'arrow' else fmt}" in r.headers["content-disposition"]
+    df = read_body(fmt, r.content)
+    ids, V = protein_ids(), score_matrix()
+    assert df.columns.tolist() == ["protein_id", "NRF2", "PW04"]
+    assert df["protein_id"].tolist() == ["KEAP1", "G003"]  # duplicates dropped, order kept
+    expected = V[[ids.index("KEAP1"), ids.index("G003")]][:, [PATHWAYS.index("NRF2"), PATHWAYS.index("PW04")]]
+    np.testing.assert_allclose(df[["NRF2", "PW04"]].to_numpy(), expected, rtol=1e-6)
+
+def test_export_everything_with_threshold(client):
+    r = client.get("/export/matrix", params={"threshold": 0.9, "format": "parquet"})
+    df = read_body("parquet", r.content)
+    V = score_matrix()
+    keep = (V > 0.9).any(axis=1)
+    assert df.columns.tolist() == ["protein_id"] + PATHWAYS
+    assert df["protein_id"].tolist() == [p for p, k in zip(protein_ids(), keep) if k]
+
+def test_export_post(client):
+    r = client.post("/export/matrix", json={"proteins": ["BRCA1"], "format": "csv"})
+    assert read_body("csv", r.content)["protein_id"].tolist() == ["BRCA1"]
+
+def test_export_missing_names_are_capped_and_encoded(backend, client):
+    unknown = ["ΔNRF2", "a,b"] + [f"NOPE{i}" for i in range(backend.MISSING_HEADER_MAX + 10)]
+    r = client.post("/export/matrix", json={"proteins": ["KEAP1"] + unknown, "pathways": ["NRF2", "ΔNRF2"]})
+    assert r.status_code == 200
+    listed = [unquote(n) for n in r.headers["x-missing-proteins"].split(",")]
+    assert listed == unknown[:backend.MISSING_HEADER_MAX]
+    assert r.headers["x-missing-proteins-count"] == str(len(unknown))
+    assert unquote(r.headers["x-missing-pathways"]) == "ΔNRF2"
+
+@pytest.mark.parametrize("params", [{"pathways": "NOPE"}, {"proteins": "NOPE1,NOPE2"}])
+def test_export_nothing_resolves(client, params):
+    assert client.get("/export/matrix", params=params).status_code == 404
+
+def test_export_bad_format(client):
+    assert client.get("/export/matrix", params={"format": "xlsx"}).status_code == 400
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import build_artifacts
+from build_artifacts import (build_flatmap_grids, compute_flatmap_grid, load_flatmap_grid, read_nmf_csv,
+                             save_flatmap_grid, source_signature)
+
+def square() -> pd.DataFrame:
+    """Four clusters on a 5 x 5 lattice; altitude rises away from the centre."""
+    x, y = np.meshgrid(np.arange(5.0), np.arange(5.0))
+    x, y = x.ravel(), y.ravel()
+    return pd.DataFrame({"x": x, "y": y, "altitude": np.hypot(x - 2, y - 2),
+                         "cluster": (x >= 2).astype(int) * 2 + (y >= 2).astype(int)})
+
+def test_grid_shape_extent_and_mask():
+    grid = compute_flatmap_grid(square(), nx=30, ny=20)
+    assert grid["Zi_cluster"].shape == grid["Zi_alt"].shape == grid["outer_mask"].shape == (20, 30)
+    assert grid["extent"] == pytest.approx((-0.2, 4.2, -0.2, 4.2))
+    assert set(np.unique(grid["Zi_cluster"])) == {0, 1, 2, 3}
+    assert grid["outer_mask"][0, 0] and not grid["outer_mask"][2, 2]  # padding is outside, lattice inside
+
+def test_save_and_load_round_trip(tmp_path):
+    grid = compute_flatmap_grid(square(), nx=16, ny=16)
+    sig = {"square.csv": [1, 2]}
+    save_flatmap_grid("SQ", grid, sig, tmp_path)
+    loaded = load_flatmap_grid("SQ", sig, tmp_path)
+    assert isinstance(loaded["Zi_alt"], np.memmap)
+    for name in build_artifacts.FLATMAP_GRID_ARRAYS:
+        np.testing.assert_array_equal(loaded[name], grid[name])
+    assert loaded["extent"] == grid["extent"] and loaded["nx"] == 16
+    assert load_flatmap_grid("SQ", {"square.csv": [1, 3]}, tmp_path) is None
+    assert load_flatmap_grid("OTHER", sig, tmp_path) is None
+
+def test_build_skips_current_grids(data_root, tmp_path):
+    data = data_root / "data"
+    assert build_flatmap_grids(["KEAP1", "NOPE"], data_dir=data, out_dir=tmp_path) == ["KEAP1"]
+    assert build_flatmap_grids(["KEAP1"], data_dir=data, out_dir=tmp_path) == []
+    assert build_flatmap_grids(["KEAP1"], force=True, data_dir=data, out_dir=tmp_path) == ["KEAP1"]
+    fn = data / "KEAP1_nmfinfo_final.csv"
+    grid = load_flatmap_grid("KEAP1", source_signature(fn), tmp_path)
+    np.testing.assert_array_equal(grid["Zi_cluster"], compute_flatmap_grid(read_nmf_csv(fn))["Zi_cluster"])
+
+@pytest.mark.parametrize("params", [{}, {"name": "NRF2"}, {"name": "NRF2", "collapse": "mean"}])
+def test_flatmap_image(client, params):
+    r = client.get("/flatmap/image", params={"gene": "KEAP1", **params})
+    assert r.status_code == 200 and r.content.startswith(b"\x89PNG")
+
+def test_flatmap_image_errors(client):
+    assert client.get("/flatmap/image", params={"gene": "NOPE"}).status_code == 404
+    assert client.get("/flatmap/image", params={"gene": "KEAP1", "name": "NOPE"}).status_code == 404
+    assert client.get("/flatmap/pathways", params={"gene": "KEAP1"}).json() == {"pathways": ["ADA2", "NRF2"]}
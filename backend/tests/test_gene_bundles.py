@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import build_artifacts
+from build_artifacts import (build_gene_bundles, gdf_bundle_path, gdf_residue_index, load_gdf_points, load_nmf,
+                             nmf_bundle_path, read_bundle, read_gdf_csv, read_nmf_csv, residue_points,
+                             source_signature, write_bundle)
+
+@pytest.fixture
+def keap1(data_root):
+    data = data_root / "data"
+    return data / "KEAP1_nmfinfo_final.csv", data / "KEAP1_NRF2_GSEA.csv_gdf.csv"
+
+def test_read_gdf_parses_wkt(tmp_path):
+    fn = tmp_path / "G_PW_GSEA.csv_gdf.csv"
+    fn.write_text("geometry,Gi_sum\nPOINT (1.5 -2e-3),0.5\nPOINT(3 4),1\n")
+    gdf = read_gdf_csv(fn)
+    assert gdf["x"].tolist() == [1.5, 3.0] and gdf["y"].tolist() == [-0.002, 4.0]
+    fn.write_text("geometry\nPOINT (1 2)\n")
+    with pytest.raises(ValueError):
+        read_gdf_csv(fn)
+
+def test_residue_index_matches_on_rounded_points():
+    nmf = pd.DataFrame({"x": [0.1, 0.2, 0.1000000001], "y": [0.5, 0.6, 0.5]})
+    gdf = pd.DataFrame({"x": [0.2, 0.1, 9.0], "y": [0.6, 0.5, 9.0]})
+    assert gdf_residue_index(nmf, gdf).tolist() == [1, 0, -1]
+    assert residue_points(nmf).tolist() == [0, 1, 0]
+
+def test_bundle_signature_check(tmp_path):
+    path = tmp_path / "G" / "nmfinfo.arrow"
+    write_bundle(path, pd.DataFrame({"a": [1, 2]}), {"f.csv": [1, 1]})
+    assert read_bundle(path, {"f.csv": [1, 1]}).column("a").to_pylist() == [1, 2]
+    assert read_bundle(path, {"f.csv": [2, 1]}) is None
+    assert read_bundle(tmp_path / "missing.arrow", {}) is None
+
+def test_build_gene_bundles(keap1, data_root, tmp_path):
+    data = data_root / "data"
+    built = build_gene_bundles(["KEAP1", "NOPE"], data_dir=data, out_dir=tmp_path)
+    assert {p.name for p in built} == {"nmfinfo.arrow", "NRF2_gdf.arrow", "ADA2_gdf.arrow"}
+    assert build_gene_bundles(["KEAP1"], data_dir=data, out_dir=tmp_path) == []
+    nmf_fn, gdf_fn = keap1
+    table = read_bundle(gdf_bundle_path("KEAP1", "NRF2", tmp_path), source_signature(nmf_fn, gdf_fn))
+    gdf = read_gdf_csv(gdf_fn)
+    np.testing.assert_array_equal(table.column("residue").to_numpy(), gdf_residue_index(read_nmf_csv(nmf_fn), gdf))
+    np.testing.assert_array_equal(table.column("Gi_sum").to_numpy(), gdf["Gi_sum"].to_numpy())
+    assert "geometry" not in table.column_names
+
+def test_loaders_agree_with_and_without_bundles(keap1, monkeypatch):
+    nmf_fn, gdf_fn = keap1
+    monkeypatch.setattr(build_artifacts, "read_bundle", lambda path, sig: None)  # CSV fallback
+    csv_nmf = load_nmf("KEAP1")
+    csv_points = load_gdf_points("KEAP1", "NRF2", csv_nmf)
+    monkeypatch.undo()
+
+    build_gene_bundles(["KEAP1"])  # default location, where the loaders look
+    assert nmf_bundle_path("KEAP1").exists()
+    nmf = load_nmf("KEAP1")
+    pd.testing.assert_frame_equal(nmf[list(build_artifacts.NMF_BUNDLE_COLUMNS) + ["point"]],
+                                  csv_nmf[list(build_artifacts.NMF_BUNDLE_COLUMNS) + ["point"]], check_dtype=False)
+    for a, b in zip(load_gdf_points("KEAP1", "NRF2", nmf), csv_points):
+        np.testing.assert_array_equal(a, b)
+
+def test_loaders_raise_for_missing_files():
+    with pytest.raises(FileNotFoundError):
+        load_nmf("NOPE")
+    with pytest.raises(FileNotFoundError):
+        load_gdf_points("KEAP1", "NOPE", load_nmf("KEAP1"))
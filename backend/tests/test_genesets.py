@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from scipy.stats import false_discovery_control, hypergeom
+
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+def genesets() -> dict[str, set[str]]:
+    """The fixture's geneset_files: proteins scoring >= 0.7 on the pathway, plus OUT<j>."""
+    ids, V = np.array(protein_ids()), score_matrix()
+    return {pw: set(ids[V[:, j] >= 0.7]) | {f"OUT{j}"} for j, pw in enumerate(PATHWAYS)}
+
+UNIVERSE = len(protein_ids()) + len(PATHWAYS)
+
+def test_index_from_dir(backend):
+    index = backend.GENESETS
+    assert sorted(index.names) == sorted(PATHWAYS) and len(index.gene_names) == UNIVERSE
+    for pw, genes in genesets().items():
+        assert index.gene_set(pw) == genes
+        assert index.in_matrix[index.pathway_idx[pw]] == len(genes) - 1
+    assert index.gene_set("NOPE") is None
+    assert index.gene_names[:len(protein_ids())].tolist() == protein_ids()  # matrix proteins keep their row
+
+def test_duplicate_and_unknown_genes(backend):
+    index = backend.GenesetIndex(["A", "B"], [["x", "P1", "x"], ["P0", "y"]], ["P0", "P1"])
+    assert index.sizes.tolist() == [2, 2] and index.in_matrix.tolist() == [1, 1]
+    assert index.gene_names.tolist() == ["P0", "P1", "x", "y"]
+    assert index.intersections(np.array([0, 1])).tolist() == [[2, 0], [0, 2]]
+
+@pytest.mark.parametrize("metric", ["jaccard", "count"])
+def test_overlap_matches_set_algebra(client, metric):
+    sets = genesets()
+    names = ["NRF2", "PW05", "ADA2"]
+    body = client.get("/genesets/overlap", params={"pathways": ",".join(names + ["NOPE"]), "metric": metric}).json()
+    assert body["pathways"] == names and body["missing"] == ["NOPE"]
+    for i, a in enumerate(names):
+        for j, b in enumerate(names):
+            inter = len(sets[a] & sets[b])
+            want = inter if metric == "count" else round(inter / len(sets[a] | sets[b]), 6)
+            assert body["matrix"][i][j] == want
+    assert client.get("/genesets/overlap", params={"metric": "dice"}).status_code == 400
+
+def test_pr_sweep_matches_counting(client):
+    sets, ids, V = genesets(), protein_ids(), score_matrix()
+    ts = [0.0, 0.5, 0.7, 0.9]
+    body = client.get("/genesets/pr_sweep", params={"thresholds": ts, "pathways": ["NRF2", "PW07", "NOPE"]}).json()
+    assert body["pathways"] == ["NRF2", "PW07"] and body["missing"] == ["NOPE"]
+    for i, pw in enumerate(body["pathways"]):
+        col = V[:, PATHWAYS.index(pw)]
+        relevant = {g for g in sets[pw] if g in ids}
+        for k, t in enumerate(ts):
+            predicted = {ids[r] for r in np.flatnonzero(col > np.float32(t))}
+            tp = len(predicted & relevant)
+            assert body["predicted"][i][k] == len(predicted) and body["true_positives"][i][k] == tp
+            assert body["precision"][i][k] == (round(tp / len(predicted), 6) if predicted else None)
+            assert body["recall"][i][k] == round(tp / len(relevant), 6)
+    assert body["recall"][0][2] == 1.0  # the geneset is exactly the proteins >= 0.7
+
+@pytest.mark.parametrize("thresholds", [["-0.1"], ["abc"]])
+def test_pr_sweep_rejects_bad_thresholds(client, thresholds):
+    assert client.get("/genesets/pr_sweep", params={"thresholds": thresholds}).status_code == 400
+
+def test_bh_fdr_matches_scipy(backend):
+    p = np.random.default_rng(4).random(50) ** 3
+    np.testing.assert_allclose(backend._bh_fdr(p), false_discovery_control(p, method="bh"))
+    assert backend._bh_fdr(np.array([])).size == 0
+
+def test_enrichment_matches_hypergeometric(client):
+    sets = genesets()
+    query = sorted(sets["NRF2"])[:6] + ["G001", "G002", "NOT_A_GENE"]
+    body = client.post("/genesets/enrichment", json={"genes": query}).json()
+    known = set(query) - {"NOT_A_GENE"}
+    assert body["unknown"] == ["NOT_A_GENE"] and body["n_genes"] == len(known) and body["universe"] == UNIVERSE
+
+    rows = {pw: (len(known & genes), hypergeom.sf(len(known & genes) - 1, UNIVERSE, len(genes), len(known)))
+            for pw, genes in sets.items()}
+    fdr = dict(zip(rows, false_discovery_control([p for _, p in rows.values()], method="bh")))
+    cols = body["columns"]
+    assert cols["pathway"][0] == "NRF2"
+    assert cols["p_value"] == sorted(cols["p_value"])
+    assert set(cols["pathway"]) == {pw for pw, (k, _) in rows.items() if k > 0}
+    for pw, k, p, q in zip(cols["pathway"], cols["overlap"], cols["p_value"], cols["fdr"]):
+        assert k == rows[pw][0] and p == pytest.approx(rows[pw][1]) and q == pytest.approx(fdr[pw])
+
+def test_enrichment_filters(client):
+    genes = sorted(genesets()["NRF2"])
+    top = client.post("/genesets/enrichment", json={"genes": genes, "top": 2}).json()["columns"]
+    assert len(top["pathway"]) == 2
+    strict = client.post("/genesets/enrichment", json={"genes": genes, "max_fdr": 1e-6}).json()["columns"]
+    assert all(q <= 1e-6 for q in strict["fdr"]) and "NRF2" in strict["pathway"]
@@ -0,0 +1,59 @@
+import warnings
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from build_artifacts import (build_gi_matrices, collapse_gi, compute_gi_matrix, gi_signature, load_gi_matrix,
+                             read_gdf_csv, read_nmf_csv)
+
+def brute_force_residue_gi(data_dir, pathway: str, mode: str) -> np.ndarray:
+    """Per residue: max / mean Gi_sum of the gdf points at its rounded flatmap position."""
+    nmf = read_nmf_csv(data_dir / "KEAP1_nmfinfo_final.csv")
+    gdf = read_gdf_csv(data_dir / f"KEAP1_{pathway}_GSEA.csv_gdf.csv")
+    at = defaultdict(list)
+    for x, y, g in zip(gdf["x"].round(6), gdf["y"].round(6), gdf["Gi_sum"]):
+        if not np.isnan(g):
+            at[(x, y)].append(g)
+    agg = max if mode == "max" else (lambda v: sum(v) / len(v))
+    return np.array([agg(at[k]) if at[k] else np.nan for k in zip(nmf["x_r"], nmf["y_r"])])
+
+def test_collapse_gi_modes():
+    residue = np.array([0, 0, 2, -1, 2])
+    gi = np.array([1.0, 3.0, 5.0, 9.0, np.nan])
+    point = np.array([0, 1, 2, 0])  # residue 3 shares residue 0's position
+    np.testing.assert_array_equal(collapse_gi(residue, gi, point, "max"), [3.0, np.nan, 5.0, 3.0])
+    np.testing.assert_array_equal(collapse_gi(residue, gi, point, "mean"), [2.0, np.nan, 5.0, 2.0])
+
+@pytest.mark.parametrize("mode", ["max", "mean"])
+def test_matrix_matches_per_pathway_loop(data_root, mode):
+    gi = compute_gi_matrix("KEAP1")
+    assert gi["pathways"] == ["ADA2", "NRF2"]
+    for j, pw in enumerate(gi["pathways"]):
+        np.testing.assert_allclose(gi[f"residue_{mode}"][:, j], brute_force_residue_gi(data_root / "data", pw, mode))
+
+    clusters = read_nmf_csv(data_root / "data" / "KEAP1_nmfinfo_final.csv")["cluster"].to_numpy()
+    R = gi[f"residue_{mode}"]
+    agg = np.nanmax if mode == "max" else np.nanmean
+    for c_row, c in enumerate(gi["clusters"]):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN clusters stay NaN
+            want = agg(R[clusters == c], axis=0)
+        np.testing.assert_allclose(gi[f"cluster_{mode}"][c_row], want)
+
+def test_build_and_load(data_root, tmp_path):
+    data = data_root / "data"
+    assert build_gi_matrices(["KEAP1", "NOPE"], data_dir=data, out_dir=tmp_path) == ["KEAP1"]
+    assert build_gi_matrices(["KEAP1"], data_dir=data, out_dir=tmp_path) == []
+    gi = load_gi_matrix("KEAP1", gi_signature("KEAP1", data), tmp_path)
+    assert isinstance(gi["residue_max"], np.memmap) and gi["pathways"] == ["ADA2", "NRF2"]
+    assert load_gi_matrix("KEAP1", {}, tmp_path) is None
+
+def test_flatmap_gi_endpoint(client):
+    body = client.get("/flatmap/gi", params={"gene": "KEAP1"}).json()
+    assert body["pathways"] == ["ADA2", "NRF2"] and body["level"] == "cluster"
+    assert len(body["gi"]) == len(body["clusters"]) and all(len(r) == 2 for r in body["gi"])
+    residue = client.get("/flatmap/gi", params={"gene": "KEAP1", "level": "residue", "collapse": "mean"}).json()
+    assert len(residue["residues"]) == len(residue["gi"]) == 624
+    assert client.get("/flatmap/gi", params={"gene": "KEAP1", "collapse": "sum"}).status_code == 400
+    assert client.get("/flatmap/gi", params={"gene": "NOPE"}).status_code == 404
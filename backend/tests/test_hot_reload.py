@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+from conftest import BACKEND, protein_ids
+
+@pytest.fixture
+def manager(backend, data_root, tmp_path):
+    base = tmp_path / "protein_map_outputs"
+    shutil.copytree(data_root / "protein_map_outputs", base)
+    return backend.ArtifactManager(base, tmp_path / "arena")
+
+def drop_proteins(base, n: int):
+    """Rebuild the vectors parquet without its last n proteins, then touch manifest.json (written last)."""
+    vecs = pd.read_parquet(base / "protein_vectors.parquet")
+    vecs.iloc[:-n].to_parquet(base / "protein_vectors.parquet", index=False)
+    man = base / "manifest.json"
+    man.write_text(man.read_text())
+    st = man.stat()
+    os.utime(man, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+def test_starts_on_a_placeholder(manager):
+    assert manager.current.reg.empty and manager.current.error == "not loaded yet"
+
+def test_poll_reloads_on_manifest_change(manager):
+    assert manager.reload()
+    first = manager.current
+    manager.poll()
+    assert manager.current is first  # unchanged: nothing to do
+    drop_proteins(manager.base, 3)
+    manager.poll()
+    assert manager.current is not first and len(manager.current.reg) == len(protein_ids()) - 3
+    assert manager.current.generation == first.generation + 1
+
+def test_failed_reload_keeps_serving(manager):
+    assert manager.reload()
+    good = manager.current
+    (manager.base / "protein_vectors.parquet").write_bytes(b"not parquet")
+    assert not manager.reload(force=True)
+    assert manager.current is good and manager.last_error
+
+def test_first_failed_load_is_reported(backend, tmp_path):
+    m = backend.ArtifactManager(tmp_path / "missing", tmp_path / "arena")
+    assert not m.reload()
+    assert m.current.reg.empty and "manifest.json not found" in m.current.error
+
+def test_workers_adopt_a_newer_generation(backend, manager):
+    other = backend.ArtifactManager(manager.base, manager.arena_dir)
+    assert manager.reload() and other.reload()
+    assert other.current.generation == manager.current.generation
+    manager.reload(force=True)
+    other.poll()  # manifest unchanged: picks up the generation the first worker published
+    assert other.current.generation == manager.current.generation
+
+def test_watcher_thread_reloads(manager):
+    manager.reload()
+    manager.start_watcher(interval=0.05)
+    try:
+        drop_proteins(manager.base, 1)
+        deadline = time.time() + 10
+        while len(manager.current.reg) == len(protein_ids()) and time.time() < deadline:
+            time.sleep(0.05)
+        assert len(manager.current.reg) == len(protein_ids()) - 1
+    finally:
+        manager.stop_watcher()
+    assert manager._watcher is None
+
+def test_admin_reload(backend, client, monkeypatch):
+    assert client.post("/admin/reload").status_code == 403
+    monkeypatch.setattr(backend, "ADMIN_TOKEN", "secret")
+    assert client.post("/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    body = client.post("/admin/reload", params={"wait": True}, headers={"X-Admin-Token": "secret"}).json()
+    assert body["status"] == "ok" and body["artifacts"]["proteins"] == len(protein_ids())
+
+def test_import_has_no_side_effects(data_root):
+    script = ("import threading, main; "
+              "assert main.PLOT_ARTIFACTS.current.reg.empty and main.PATHWAY_SCORES.empty; "
+              "assert main.RENDER_POOL._pool is None; "
+              "assert threading.active_count() == 1, threading.enumerate()")
+    env = dict(os.environ, PYTHONPATH=str(BACKEND))
+    r = subprocess.run([sys.executable, "-c", script], cwd=data_root, env=env, capture_output=True, text=True)
+    assert r.returncode == 0, r.stderr
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import KNN_K, UNANNOTATED, exact_knn, protein_ids, score_matrix
+
+def exact_ids(protein: str, k: int) -> list[str]:
+    ids = protein_ids()
+    idx, _ = exact_knn(score_matrix(), k)
+    return [ids[i] for i in idx[ids.index(protein)]]
+
+def test_exact_engine_matches_brute_force(backend):
+    snap = backend.PLOT_ARTIFACTS.current
+    for protein in ("KEAP1", "G010", "G031"):
+        df = backend._topk_neighbors(snap, protein, 7, engine="exact")
+        assert df["protein_id"].tolist() == exact_ids(protein, 7)
+        assert np.all(np.diff(df["cosine_sim"]) <= 0)
+
+def test_knn_table_serves_topk_within_k_neighbors(backend):
+    snap = backend.PLOT_ARTIFACTS.current
+    knn = snap.neighbor_engine("knn")
+    assert knn.name == "knn"
+    df = knn.query("KEAP1", 3)
+    assert df["protein_id"].tolist() == exact_ids("KEAP1", 3)
+
+def test_knn_table_falls_back_when_edges_were_dropped(backend):
+    # two of G000's best table edges point at proteins that are not loaded: the rest of
+    # its rows are neither k long nor its true top-k, so it is answered by the exact scan
+    knn = backend.PLOT_ARTIFACTS.current.neighbor_engine("knn")
+    assert "G000" not in knn.slices
+    for k in (2, KNN_K):
+        assert knn.query("G000", k)["protein_id"].tolist() == exact_ids("G000", k)
+
+def test_knn_table_falls_back_on_short_rows(backend):
+    snap = backend.PLOT_ARTIFACTS.current
+    edges = pd.DataFrame({"source": ["KEAP1"] * 2, "target": exact_ids("KEAP1", 2), "cosine_sim": [0.9, 0.8]})
+    knn = backend.KnnTableNeighbors(edges, KNN_K, snap.reg)
+    assert knn.query("KEAP1", 4)["protein_id"].tolist() == exact_ids("KEAP1", 4)
+    assert knn.query("KEAP1", 2)["cosine_sim"].tolist() == pytest.approx([0.9, 0.8])
+
+def test_knn_table_falls_back_past_k_neighbors(backend):
+    knn = backend.PLOT_ARTIFACTS.current.neighbor_engine("knn")
+    assert knn.query("KEAP1", KNN_K + 4)["protein_id"].tolist() == exact_ids("KEAP1", KNN_K + 4)
+
+def test_ivf_engine_without_annoy(backend):
+    snap = backend.PLOT_ARTIFACTS.current
+    ann = snap.neighbor_engine("ann")
+    df = ann.query("BRCA1", 5)
+    assert len(df) == 5 and "BRCA1" not in df["protein_id"].tolist()
+
+def test_plot_engine_parameter(client):
+    r = client.get("/plot", params={"gene": "G000", "topk": KNN_K, "engine": "knn", "recall": True})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["engine"] == "knn"
+    assert [n["protein_id"] for n in body["neighbors"]] == exact_ids("G000", KNN_K)
+    assert body["recall"] == 1.0
+
+@pytest.mark.parametrize("path", ["/plot", "/shared_pathways", "/neighbors/recall"])
+@pytest.mark.parametrize("params, status", [({"engine": "nope"}, 400), ({"topk": 0}, 422), ({"topk": -3}, 422),
+                                            ({"topk": 100000}, 422)])
+def test_neighbor_params_are_validated(client, path, params, status):
+    assert client.get(path, params={"gene": "KEAP1", **params}).status_code == status
+
+def test_plot_unknown_and_unannotated_gene(client):
+    assert client.get("/plot", params={"gene": "NOPE"}).status_code == 404
+    assert client.get("/plot", params={"gene": protein_ids()[UNANNOTATED]}).status_code == 404
+
+def test_neighbors_recall(client):
+    body = client.get("/neighbors/recall", params={"engine": "knn", "topk": 3, "sample": 20}).json()
+    assert body["engine"] == "knn" and body["n_queries"] == 20
+    assert body["mean_recall"] == 1.0
+    for sample in (0, -1, 10**6):
+        assert client.get("/neighbors/recall", params={"engine": "knn", "sample": sample}).status_code == 422
@@ -0,0 +1,72 @@
+import json
+from urllib.parse import unquote
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from conftest import exact_knn, protein_ids, score_matrix
+
+def exact(protein: str, k: int) -> list[str]:
+    ids = protein_ids()
+    idx, _ = exact_knn(score_matrix(), k)
+    return [ids[i] for i in idx[ids.index(protein)]]
+
+def ndjson(r) -> list[dict]:
+    return [json.loads(line) for line in r.text.splitlines()]
+
+def test_ndjson_matches_exact_scan(client):
+    proteins = ["KEAP1", "brca1", "G010"]
+    r = client.post("/neighbors/batch", json={"proteins": proteins, "topk": 4})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = ndjson(r)
+    assert [l["query"] for l in lines] == ["KEAP1", "BRCA1", "G010"]
+    for line in lines:
+        assert line["neighbors"] == exact(line["query"], 4)
+        assert line["query"] not in line["neighbors"]
+        assert line["cosine_sim"] == sorted(line["cosine_sim"], reverse=True)
+
+@pytest.mark.parametrize("topk", [1, 5, 1000])
+def test_single_protein_batch_excludes_self(client, topk):
+    lines = ndjson(client.post("/neighbors/batch", json={"proteins": ["KEAP1"], "topk": topk}))
+    assert len(lines) == 1
+    assert "KEAP1" not in lines[0]["neighbors"]
+    assert len(lines[0]["neighbors"]) == min(topk, len(protein_ids()) - 1)
+
+def test_kernel_on_single_protein_registry(backend):
+    reg = backend.ProteinRegistry(["ONLY"], ["PW"], np.ones((1, 1), dtype=np.float32))
+    [(q_rows, idx, sims)] = list(backend._topk_cosine_batch(reg, np.array([0]), k=5))
+    assert q_rows.tolist() == [0] and idx.shape == (1, 0) and sims.shape == (1, 0)
+
+def test_kernel_chunking(backend):
+    reg = backend.PLOT_ARTIFACTS.current.reg
+    rows = np.arange(len(reg))
+    whole = list(backend._topk_cosine_batch(reg, rows, k=3))
+    tiny = list(backend._topk_cosine_batch(reg, rows, k=3, max_bytes=1))  # one query per GEMM
+    assert len(whole) == 1 and len(tiny) == len(reg)
+    np.testing.assert_array_equal(whole[0][1], np.vstack([t[1] for t in tiny]))
+
+def test_arrow_format(client):
+    r = client.post("/neighbors/batch", json={"proteins": ["KEAP1", "G003"], "topk": 3, "format": "arrow"})
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.column_names == ["query", "rank", "protein_id", "cosine_sim"]
+    assert table.column("query").to_pylist() == ["KEAP1"] * 3 + ["G003"] * 3
+    assert table.column("rank").to_pylist() == [1, 2, 3] * 2
+    assert table.column("protein_id").to_pylist()[:3] == exact("KEAP1", 3)
+
+def test_missing_proteins_header_is_capped(backend, client):
+    unknown = ["ΔX"] + [f"NOPE{i}" for i in range(backend.MISSING_HEADER_MAX + 5)]
+    r = client.post("/neighbors/batch", json={"proteins": ["KEAP1"] + unknown, "topk": 2})
+    assert len(ndjson(r)) == 1
+    assert [unquote(n) for n in r.headers["x-missing-proteins"].split(",")] == unknown[:backend.MISSING_HEADER_MAX]
+    assert r.headers["x-missing-proteins-count"] == str(len(unknown))
+
+@pytest.mark.parametrize("body", [{"proteins": ["KEAP1"], "topk": 0}, {"proteins": ["KEAP1"], "topk": 10**6},
+                                  {"proteins": ["KEAP1"], "format": "csv"}, {"proteins": ["KEAP1"], "chunk_mb": 0},
+                                  {"proteins": ["KEAP1"], "chunk_mb": 10**6}])
+def test_invalid_requests(client, body):
+    assert client.post("/neighbors/batch", json=body).status_code in (400, 422)
+
+def test_protein_list_is_capped(backend, client):
+    body = {"proteins": ["KEAP1"] * (backend.NEIGHBOR_BATCH_MAX_PROTEINS + 1)}
+    assert client.post("/neighbors/batch", json=body).status_code == 422
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from conftest import PATHWAYS
+
+def brute_force(scores: np.ndarray, members: set[int]) -> dict:
+    """One pathway's PR curve by the definition: predict every protein scoring >= s, for each distinct s > 0."""
+    relevant = len(members)
+    points = []
+    for s in sorted(set(scores[scores > 0].tolist()), reverse=True):
+        predicted = np.flatnonzero(scores >= s)
+        tp = len(members.intersection(predicted.tolist()))
+        points.append((s, len(predicted), tp))
+    ap, prev_tp = 0.0, 0
+    best = (0.0, None, None)
+    for s, n, tp in points:
+        ap += (tp - prev_tp) * (tp / n)
+        prev_tp = tp
+        f1 = 2 * tp / (n + relevant)
+        if f1 > best[0]:  # strictly better: ties keep the earlier, higher cutoff
+            best = (f1, s, n)
+    return {"points": points, "auprc": ap / relevant if relevant else np.nan,
+            "best_f1": best[0], "best_min_score": best[1]}
+
+@pytest.fixture
+def case(backend):
+    """Scores rounded to one decimal (lots of ties), random genesets, one pathway never scored."""
+    rng = np.random.default_rng(7)
+    n, p = 80, 6
+    X = np.round(rng.random((n, p)), 1).astype(np.float32)
+    X[X < 0.3] = 0
+    X[:, 5] = 0
+    ids = [f"P{i}" for i in range(n)]
+    names = [f"PW{j}" for j in range(p)]
+    sets = [sorted({ids[i] for i in rng.choice(n, size=12, replace=False)}) + ["OUTSIDE"] for _ in range(p)]
+    sets[4] = ["OUTSIDE"]  # nothing recallable
+    reg = backend.ProteinRegistry(ids, names, X, backend="dense")
+    genesets = backend.GenesetIndex(names + ["NO_COLUMN"], sets + [["P1"]], ids)
+    ev = backend.PathwayEvaluation(reg, backend.PathwayRanking.build(reg.raw), genesets, "v")
+    members = [{ids.index(g) for g in s if g in ids} for s in sets]
+    return X, members, ev
+
+def test_every_pathway_matches_the_definition(case):
+    X, members, ev = case
+    assert ev.names == [f"PW{j}" for j in range(6)]  # NO_COLUMN has no matrix column
+    for j, name in enumerate(ev.names):
+        want = brute_force(X[:, j], members[j])
+        curve = ev.curve(ev.pathway_idx[name])
+        got = list(zip(curve["min_score"], curve["predicted"], curve["true_positives"]))
+        assert [(pytest.approx(s), k, tp) for s, k, tp in want["points"]] == got
+        if np.isnan(want["auprc"]):
+            assert np.isnan(ev.auprc[j])
+        else:
+            assert ev.auprc[j] == pytest.approx(want["auprc"])
+        assert ev.best_f1[j] == pytest.approx(want["best_f1"])
+        if want["best_min_score"] is not None:
+            assert ev.best_min_score[j] == pytest.approx(want["best_min_score"])
+
+def test_empty_column_and_empty_geneset(case):
+    _, _, ev = case
+    assert ev.predicted[5] == 0 and ev.curve(5)["min_score"] == []
+    assert ev.best_f1[5] == 0 and np.isnan(ev.best_min_score[5])
+    assert ev.in_matrix[4] == 0 and np.isnan(ev.auprc[4])
+    assert all(r is None for r in ev.curve(4)["recall"])
+
+def test_ties_prefer_the_higher_cutoff(backend):
+    X = np.array([[0.9], [0.8], [0.7], [0.6]], dtype=np.float32)
+    ids = ["A", "B", "C", "D"]
+    reg = backend.ProteinRegistry(ids, ["PW"], X)
+    # geneset {A, D}: F1 is 2/3 both at >= 0.9 (A alone) and at >= 0.6 (everyone)
+    ev = backend.PathwayEvaluation(reg, backend.PathwayRanking.build(reg.raw),
+                                   backend.GenesetIndex(["PW"], [["A", "D"]], ids), "v")
+    assert ev.best_f1[0] == pytest.approx(2 / 3) and ev.best_min_score[0] == pytest.approx(0.9)
+    assert ev.best_precision[0] == 1.0 and ev.best_recall[0] == 0.5
+    assert ev.auprc[0] == pytest.approx((1 + 2 / 4) / 2)
+
+def test_evaluation_endpoint(client, backend):
+    body = client.get("/pathway/evaluation", params={"pathways": "NRF2,NOPE", "curve": True}).json()
+    assert body["missing"] == ["NOPE"] and body["columns"]["pathway"] == ["NRF2"]
+    # the fixture genesets are exactly the proteins scoring >= 0.7, so a perfect cutoff exists
+    assert body["columns"]["best_f1"] == [1.0] and body["columns"]["auprc"] == [1.0]
+    assert body["columns"]["best_min_score"][0] >= 0.7
+    assert body["curves"]["NRF2"]["precision"][0] == 1.0
+    # float32 cutoffs go out rounded, not as 0.30000001192...
+    cutoffs = body["curves"]["NRF2"]["min_score"] + body["columns"]["best_min_score"]
+    assert all(s == round(s, 6) for s in cutoffs)
+    everything = client.get("/pathway/evaluation").json()
+    assert sorted(everything["columns"]["pathway"]) == sorted(PATHWAYS)
+    assert backend.pathway_evaluation() is backend.pathway_evaluation()  # computed once per version
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+def brute_force(j: int, threshold: float) -> tuple[list[str], list[float]]:
+    """The original scan: proteins with score > threshold, best first, ties in matrix order."""
+    ids, col = protein_ids(), score_matrix()[:, j]
+    hits = [(-float(col[i]), i) for i in range(len(ids)) if col[i] > np.float32(threshold)]
+    hits.sort()
+    return [ids[i] for _, i in hits], [-s for s, _ in hits]
+
+@pytest.fixture(params=["dense", "sparse"])
+def ranking(backend, request):
+    reg = backend.ProteinRegistry(protein_ids(), PATHWAYS, score_matrix(), backend=request.param)
+    return reg, backend.PathwayRanking.build(reg.raw)
+
+@pytest.mark.parametrize("threshold", [-1.0, 0.0, 0.5, 0.75, 0.999])
+def test_ranked_matches_column_scan(ranking, threshold):
+    reg, rank = ranking
+    for j in range(len(PATHWAYS)):
+        rows, vals, total = rank.ranked(j, threshold)
+        ids, scores = brute_force(j, threshold)
+        assert reg.ids[rows].tolist() == ids and total == len(ids)
+        np.testing.assert_allclose(vals, scores, rtol=1e-6)
+
+def test_threshold_equal_to_a_score_is_exclusive(ranking):
+    reg, rank = ranking
+    j = 0
+    s = score_matrix()[:, j]
+    edge = float(np.sort(s[s > 0])[len(s[s > 0]) // 2])  # a stored float32 score, as a Python float
+    rows, vals, total = rank.ranked(j, edge)
+    assert total == int((s > np.float32(edge)).sum()) and np.all(vals > np.float32(edge))
+
+def test_ties_keep_matrix_order(backend):
+    X = np.array([[0.5], [0.9], [0.5], [0.0], [0.5]], dtype=np.float32)
+    rank = backend.PathwayRanking.build(backend.make_score_matrix(X, "dense"))
+    rows, _, _ = rank.ranked(0, 0.0)
+    assert rows.tolist() == [1, 0, 2, 4]
+
+def test_pagination(ranking):
+    _, rank = ranking
+    all_rows, _, total = rank.ranked(1, 0.1)
+    pages = [rank.ranked(1, 0.1, offset, 4)[0] for offset in range(0, total + 4, 4)]
+    assert np.concatenate(pages).tolist() == all_rows.tolist()
+    assert all(rank.ranked(1, 0.1, off, lim)[2] == total for off, lim in ((0, 1), (total + 5, 3)))
+    assert len(rank.ranked(1, 0.1, total + 5, 3)[0]) == 0
+
+def test_pathway_proteins_endpoint(client):
+    ids, scores = brute_force(PATHWAYS.index("ADA2"), 0.3)
+    full = client.get("/pathway/proteins", params={"pathway": "ADA2", "threshold": 0.3}).json()
+    assert full["proteins"] == ids and full["total"] == len(ids) and full["limit"] is None
+    page = client.get("/pathway/proteins", params={"pathway": "ADA2", "threshold": 0.3, "limit": 3, "offset": 2}).json()
+    assert page["proteins"] == ids[2:5] and page["total"] == len(ids)
+    assert page["scores"] == pytest.approx(scores[2:5])
+    clamped = client.get("/pathway/proteins", params={"pathway": "ADA2", "threshold": 0.3, "offset": -4}).json()
+    assert clamped["offset"] == 0 and clamped["proteins"] == ids
+    assert "error" in client.get("/pathway/proteins", params={"pathway": "NOPE"}).json()
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+import pytest
+
+from build_artifacts import ARENA_KEEP, arena_current, attach_arena, ensure_plot_arena
+from conftest import protein_ids, score_matrix
+
+@pytest.fixture
+def base(data_root):
+    return data_root / "protein_map_outputs"
+
+def test_no_arena_yet(tmp_path):
+    assert arena_current(tmp_path) is None and attach_arena(tmp_path) is None
+
+def test_first_call_publishes_then_attaches(base, tmp_path):
+    gen, meta, arrays = ensure_plot_arena(base, tmp_path)
+    assert gen == 1 and meta["proteins"] == protein_ids()
+    assert isinstance(arrays["raw"], np.memmap) and not arrays["raw"].flags.writeable
+    np.testing.assert_array_equal(arrays["raw"], score_matrix())
+    norms = np.linalg.norm(arrays["v_norm"], axis=1)
+    assert np.allclose(norms[arrays["annotated"]], 1.0, rtol=1e-5)
+    assert ensure_plot_arena(base, tmp_path)[0] == 1  # same parquets: attach, no rebuild
+
+def test_force_publishes_and_prunes_old_generations(base, tmp_path):
+    for _ in range(ARENA_KEEP + 2):
+        gen = ensure_plot_arena(base, tmp_path, force=True)[0]
+    assert gen == ARENA_KEEP + 2 and arena_current(tmp_path)["generation"] == gen
+    assert sorted(d.name for d in tmp_path.glob("gen-*")) == [f"gen-{g:06d}" for g in range(gen - ARENA_KEEP + 1, gen + 1)]
+
+def test_concurrent_callers_publish_once(base, tmp_path):
+    gens = []
+    threads = [threading.Thread(target=lambda: gens.append(ensure_plot_arena(base, tmp_path)[0])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert gens == [1] * 4 and len(list(tmp_path.glob("gen-*"))) == 1
+
+def test_snapshot_falls_back_to_a_private_copy(backend, base, tmp_path):
+    blocked = tmp_path / "file"
+    blocked.write_text("")  # arena dir under a regular file: cannot be created
+    snap = backend.PlotSnapshot.load(base, blocked / "arena")
+    assert snap.generation == 0 and len(snap.reg) == len(protein_ids())
+
+def test_server_is_on_the_shared_arena(backend, client):
+    assert client.get("/plot_ping").status_code == 200
+    snap = backend.PLOT_ARTIFACTS.current
+    assert snap.generation == arena_current(backend.ARENA_DIR)["generation"]
+    # views of the read-only mapping, not private copies (the sparse backend re-packs the scores)
+    assert not snap.reg.annotated.flags.writeable and not snap.reg.xy.flags.writeable
+    if snap.reg.raw.kind == "dense":
+        assert not snap.reg.raw.X.flags.writeable
@@ -0,0 +1,58 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from conftest import KNN_K, exact_knn, protein_ids, score_matrix
+
+def exact_ids(protein: str, k: int) -> list[str]:
+    ids = protein_ids()
+    idx, _ = exact_knn(score_matrix(), k)
+    return [ids[i] for i in idx[ids.index(protein)]]
+
+def plot(client, **params):
+    return client.get("/plot", params={"gene": "KEAP1", "topk": 8, "engine": "exact", **params})
+
+def test_compact_network_matches_the_layout(backend):
+    snap = backend.PLOT_ARTIFACTS.current
+    nbrs = backend._topk_neighbors(snap, "KEAP1", 8, engine="exact")
+    layout = backend._network_layout(snap.reg, "KEAP1", nbrs, 0.3)
+    net = backend._compact_network(snap.reg, "KEAP1", nbrs, 0.3)
+    nodes, edges = net["nodes"], net["edges"]
+    assert nodes["id"].tolist() == ["KEAP1"] + exact_ids("KEAP1", 8)
+    assert nodes["x"].dtype == np.float32 and nodes["cosine"][0] == 1.0
+    np.testing.assert_allclose(nodes["x"], layout["pos"][:, 0], rtol=1e-6)
+    assert edges["source"][:8].tolist() == [0] * 8 and edges["target"][:8].tolist() == list(range(1, 9))
+    assert edges["source"][8:].tolist() == (layout["nn_i"] + 1).tolist()
+    assert edges["target"][8:].tolist() == (layout["nn_j"] + 1).tolist()
+    np.testing.assert_allclose(edges["cosine"], np.concatenate([nbrs["cosine_sim"], layout["nn_sim"]]), rtol=1e-6)
+
+def test_compact_format(client):
+    full, compact = plot(client).json(), plot(client, format="compact").json()
+    assert "plot" in full and "plot" not in compact
+    net = compact["network"]
+    assert net["nodes"]["id"] == ["KEAP1"] + exact_ids("KEAP1", 8)
+    assert len(net["edges"]["source"]) == len(net["edges"]["target"]) == len(net["edges"]["cosine"])
+    assert compact["neighbors"] == full["neighbors"] and compact["shared_pathways"] == full["shared_pathways"]
+    # the Plotly figure draws the same neighbour-pair edges: 3 coordinates (a, b, gap) per edge
+    assert len(full["plot"]["data"][1]["x"]) == 3 * (len(net["edges"]["source"]) - 8)
+
+def test_arrow_format(client):
+    compact = plot(client, format="compact").json()["network"]
+    r = plot(client, format="arrow")
+    assert r.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.num_rows == 1
+    assert table.schema.metadata == {b"query": b"KEAP1", b"engine": b"exact"}
+    row = table.to_pylist()[0]
+    assert row["node_id"] == compact["nodes"]["id"]
+    assert row["edge_source"] == compact["edges"]["source"]
+    assert row["edge_cosine"] == pytest.approx(compact["edges"]["cosine"])
+    assert table.schema.field("node_x").type == pa.list_(pa.float32())
+    assert len(r.content) < len(plot(client).content)
+
+def test_columnar_and_bad_format(client):
+    body = plot(client, format="compact", columnar=True, topk=KNN_K).json()
+    assert body["neighbors"]["protein_id"] == exact_ids("KEAP1", KNN_K)
+    assert set(body["shared_pathways"]) == {"other_protein", "pathway_id", "score_query", "score_other",
+                                            "joint_score"}
+    assert plot(client, format="svg").status_code == 400
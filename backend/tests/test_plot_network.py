@@ -0,0 +1,47 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import protein_ids, score_matrix
+
+def cosine(a: np.ndarray, b: np.ndarray) -> float:
+    return float(a @ b / ((np.linalg.norm(a) + 1e-12) * (np.linalg.norm(b) + 1e-12)))
+
+def brute_force_edges(ids: list[str], thresh: float) -> set[tuple[str, str]]:
+    V = score_matrix()
+    rows = {p: i for i, p in enumerate(protein_ids())}
+    return {(a, b) for a, b in itertools.combinations(ids, 2)
+            if a in rows and b in rows and cosine(V[rows[a]], V[rows[b]]) > thresh}
+
+@pytest.fixture
+def snap(backend):
+    return backend.PLOT_ARTIFACTS.current
+
+@pytest.mark.parametrize("thresh", [0.3, 0.6, 0.9])
+def test_neighbor_edges_match_pairwise_loop(backend, snap, thresh):
+    nbrs = backend._topk_neighbors(snap, "KEAP1", 10, engine="exact")
+    layout = backend._network_layout(snap.reg, "KEAP1", nbrs, thresh)
+    ids = nbrs["protein_id"].tolist()
+    got = {(ids[i], ids[j]) for i, j in zip(layout["nn_i"], layout["nn_j"])}
+    assert got == brute_force_edges(ids, thresh)
+    assert all(i < j for i, j in zip(layout["nn_i"], layout["nn_j"]))
+    assert np.all(layout["nn_sim"] > thresh)
+
+def test_layout_is_normalised_and_fills_unknown_ids(backend, snap):
+    nbrs = pd.DataFrame({"protein_id": ["G001", "NOT_LOADED", "G002"], "cosine_sim": [0.9, 0.8, 0.7]})
+    layout = backend._network_layout(snap.reg, "KEAP1", nbrs)
+    pos = layout["pos"]
+    assert layout["ids"] == ["KEAP1", "G001", "NOT_LOADED", "G002"]
+    assert not np.isnan(pos).any() and pos.min() >= -1 and pos.max() <= 1
+    assert 1 not in layout["nn_i"] and 1 not in layout["nn_j"]  # unknown id: zero vector, no edges
+
+def test_plotly_figure_traces(backend, snap):
+    nbrs = backend._topk_neighbors(snap, "KEAP1", 6, engine="exact")
+    layout = backend._network_layout(snap.reg, "KEAP1", nbrs, 0.3)
+    fig = backend._plot_network(snap.reg, "KEAP1", nbrs, 0.3)
+    q2n, nn, nodes, query = fig.data
+    assert len(q2n.x) == 3 * 6 and len(nn.x) == 3 * len(layout["nn_i"])
+    assert list(nodes.text) == nbrs["protein_id"].tolist() and list(query.text) == ["KEAP1"]
+    np.testing.assert_allclose(nodes.marker.color, nbrs["cosine_sim"])
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from conftest import PATHWAYS, UNANNOTATED, protein_ids, score_matrix
+
+def small_registry(backend, **kw):
+    return backend.ProteinRegistry(["KEAP1", "keap1", "Brca1"], ["A", "B"],
+                                   np.array([[1, 0], [0, 1], [0, 0]], dtype=np.float32), **kw)
+
+def test_exact_match_wins_over_alias(backend):
+    reg = small_registry(backend)
+    assert reg.row("KEAP1") == 0 and reg.row("keap1") == 1
+    assert reg.row(" Keap1 ") == 0  # alias: first row whose upper-cased id matches
+    assert reg.row("BRCA1") == reg.row("brca1") == 2
+    assert reg.row("NOPE") is None and reg.row(None) is None
+
+def test_rows_marks_unknown(backend):
+    reg = small_registry(backend)
+    assert reg.rows(["brca1", "x", "KEAP1"]).tolist() == [2, -1, 0]
+    assert reg.rows([]).dtype == np.int64
+
+def test_annotated_and_coordinates(backend):
+    reg = small_registry(backend)
+    assert reg.annotated.tolist() == [True, True, False]
+    assert reg.xy.shape == (3, 2) and np.isnan(reg.xy).all()
+    assert reg.pathway_col == {"A": 0, "B": 1}
+
+def test_from_frames_aligns_coords(backend):
+    vecs = pd.DataFrame(score_matrix(), index=protein_ids(), columns=PATHWAYS)
+    coords = pd.DataFrame({"protein_id": ["BRCA1", "G001", "BRCA1"], "x": [1.0, 2.0, 9.0], "y": [3.0, 4.0, 9.0]})
+    reg = backend.ProteinRegistry.from_frames(vecs, coords)
+    assert reg.xy[reg.row("BRCA1")].tolist() == [1.0, 3.0]  # first coordinate row per protein
+    assert reg.xy[reg.row("G001")].tolist() == [2.0, 4.0]
+    assert np.isnan(reg.xy[reg.row("KEAP1")]).all()
+    assert not reg.annotated[UNANNOTATED] and reg.annotated.sum() == len(reg) - 1
+
+def test_empty_registry(backend):
+    reg = backend.ProteinRegistry.empty_registry()
+    assert reg.empty and len(reg) == 0 and reg.row("KEAP1") is None
+
+def test_loaded_registry_matches_fixture(backend):
+    reg = backend.PLOT_ARTIFACTS.current.reg
+    assert list(reg.ids) == protein_ids() and list(reg.pathways) == PATHWAYS
+    np.testing.assert_allclose(reg.raw.rows(np.arange(len(reg))), score_matrix())
+    norms = np.linalg.norm(reg.v_norm.rows(np.arange(len(reg))), axis=1)
+    np.testing.assert_allclose(np.delete(norms, UNANNOTATED), 1.0, rtol=1e-5)
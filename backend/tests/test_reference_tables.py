@@ -0,0 +1,41 @@
+import time
+
+import pandas as pd
+
+def test_lookup_is_case_insensitive_and_stripped(backend):
+    keap1 = backend.CALIBRATION.rows("KEAP1")
+    assert len(keap1) > 0
+    pd.testing.assert_frame_equal(backend.CALIBRATION.rows(" keap1 ").reset_index(drop=True),
+                                  keap1.reset_index(drop=True))
+    assert backend.CALIBRATION.rows("NOPE").empty
+
+def test_table_reloads_when_file_changes(backend, tmp_path, monkeypatch):
+    path = tmp_path / "labels.csv"
+    path.write_text("gene,label\nKEAP1,first\n")
+    table = backend.ReferenceTable(str(path), key="gene")
+    assert table.rows("KEAP1")["label"].tolist() == ["first"]
+    path.write_text("gene,label\nKEAP1,second\nBRCA1,x\n")
+    monkeypatch.setattr(backend, "REFERENCE_RELOAD_CHECK_S", 0.0)
+    time.sleep(0.01)
+    assert table.rows("keap1")["label"].tolist() == ["second"]
+
+def test_tables_load_on_first_use(backend, tmp_path):
+    path = tmp_path / "late.csv"
+    table = backend.ReferenceTable(str(path), key="gene")  # no file yet: nothing read
+    path.write_text("gene,label\nKEAP1,late\n")
+    assert table.rows("KEAP1")["label"].tolist() == ["late"]
+
+def test_group_label_and_gene_info(client):
+    label = client.get("/group_label", params={"gene": "keap1"}).json()["group_label"]
+    assert label.startswith("Oxidative Stress Response")
+    assert client.get("/group_label", params={"gene": "NOPE"}).json() == {"group_label": None}
+    info = client.get("/gene_info", params={"gene": "KEAP1"}).json()["info"]
+    assert info == {"Entry": ["Q14145"], "GO": ["a", "b"]}
+
+def test_calibration_image_cache_key_ignores_case(client):
+    upper = client.get("/calibration/image", params={"gene": "KEAP1"})
+    lower = client.get("/calibration/image", params={"gene": "keap1"})
+    assert upper.status_code == lower.status_code == 200
+    assert upper.headers["content-type"] == "image/png"
+    assert upper.headers["etag"] == lower.headers["etag"]
+    assert client.get("/calibration/image", params={"gene": "NOPE"}).status_code == 404
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+PNG = b"\x89PNG" + b"x" * 96
+
+@pytest.fixture
+def cache(backend, tmp_path):
+    return backend.RenderCache(tmp_path, max_items=2, max_disk_bytes=10 * len(PNG))
+
+def age(path, seconds):
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - int(seconds * 1e9)))
+
+def test_key_depends_on_params_and_inputs(backend, tmp_path):
+    src = tmp_path / "input.csv"
+    src.write_text("a\n")
+    key = backend.RenderCache.key("cal", {"gene": "KEAP1"}, [src])
+    assert key == backend.RenderCache.key("cal", {"gene": "KEAP1"}, [src])
+    assert key != backend.RenderCache.key("cal", {"gene": "BRCA1"}, [src])
+    src.write_text("a,b\n")
+    assert key != backend.RenderCache.key("cal", {"gene": "KEAP1"}, [src])
+
+def test_memory_lru_falls_back_to_disk(cache):
+    for k in "abc":
+        cache.put(k, PNG + k.encode())
+    assert list(cache.mem) == ["b", "c"]
+    assert cache.get("a") == PNG + b"a"  # from disk, now remembered again
+    assert list(cache.mem) == ["c", "a"]
+    assert cache.get("missing") is None
+
+def test_disk_tier_evicts_least_recently_used(cache):
+    for i in range(10):
+        cache.put(f"k{i}", PNG)
+        age(cache.png_dir / f"k{i}.png", 100 - i)
+    cache.mem.clear()
+    assert cache.get("k0") == PNG  # a disk hit marks k0 as recently used
+    cache.put("k10", PNG + b"!")
+    left = sorted(p.stem for p in cache.png_dir.glob("*.png"))
+    assert "k0" in left and "k10" in left and "k1" not in left
+    assert sum(p.stat().st_size for p in cache.png_dir.glob("*.png")) <= 0.9 * cache.max_disk_bytes
+    assert cache._disk_bytes == sum(p.stat().st_size for p in cache.png_dir.glob("*.png"))
+
+def test_prune_drops_other_versions(backend, cache, tmp_path):
+    cache.put("current", PNG)
+    old = tmp_path / "v0"
+    old.mkdir()
+    (old / "stale.png").write_bytes(PNG)
+    (tmp_path / "legacy.png").write_bytes(PNG)
+    (tmp_path / "popular.json").write_text("{}")
+    cache.prune()
+    assert not old.exists() and not (tmp_path / "legacy.png").exists()
+    assert (tmp_path / "popular.json").exists()
+    assert (cache.png_dir / "current.png").exists()
+    assert cache.png_dir.name == f"v{backend.RENDER_VERSION}"
+
+def test_prune_trims_to_cap(cache):
+    cache.png_dir.mkdir(parents=True)
+    for i in range(20):
+        (cache.png_dir / f"k{i}.png").write_bytes(PNG)
+    cache.prune()
+    assert len(list(cache.png_dir.glob("*.png"))) == 9
+
+def test_popular_counts_persist(backend, tmp_path):
+    cache = backend.RenderCache(tmp_path)
+    for gene in ["KEAP1", "KEAP1", "BRCA1"]:
+        cache.count(gene)
+    cache.save_popular()
+    again = backend.RenderCache(tmp_path)
+    again.load_popular()
+    assert again.most_popular(1) == ["KEAP1"]
+
+def test_etag_and_not_modified(client):
+    r = client.get("/calibration/image", params={"gene": "KEAP1"})
+    etag = r.headers["etag"]
+    assert r.status_code == 200 and r.content.startswith(b"\x89PNG")
+    again = client.get("/calibration/image", params={"gene": "KEAP1"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    other = client.get("/calibration/image", params={"gene": "KEAP1"}, headers={"If-None-Match": '"nope"'})
+    assert other.status_code == 200 and other.content == r.content
+
+def test_if_none_match_star(backend, client):
+    star = {"If-None-Match": "*"}
+    before = dict(backend.RENDER_CACHE.popular)
+    assert client.get("/calibration/image", params={"gene": "NOPE"}, headers=star).status_code == 404
+    assert backend.RENDER_CACHE.popular.get("NOPE", 0) == before.get("NOPE", 0)
+    client.get("/calibration/image", params={"gene": "KEAP1"})
+    assert client.get("/calibration/image", params={"gene": "KEAP1"}, headers=star).status_code == 304
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from render_service import RenderOverloaded, RenderPool, RenderTimeout
+
+def test_inline_pool_renders_in_process():
+    assert RenderPool(workers=0).render(sorted, [3, 1, 2]) == [1, 2, 3]
+
+def test_timeout_is_not_overload():
+    pool = RenderPool(workers=1, queue_depth=0, timeout=0.5)
+    try:
+        with pytest.raises(RenderTimeout):
+            pool.render(time.sleep, 3)
+    finally:
+        pool.shutdown()
+
+def test_full_queue_is_rejected():
+    pool = RenderPool(workers=1, queue_depth=0, timeout=30)
+    try:
+        busy = threading.Thread(target=pool.render, args=(time.sleep, 1))
+        busy.start()
+        while pool.stats()["in_flight"] == 0:
+            time.sleep(0.01)
+        with pytest.raises(RenderOverloaded) as e:
+            pool.render(sorted, [1])
+        assert e.value.retry_after > 0 and pool.stats()["rejected"] == 1
+        busy.join()
+        assert pool.render(sorted, [2, 1]) == [1, 2]
+    finally:
+        pool.shutdown()
+
+def test_start_spawns_every_worker():
+    pool = RenderPool(workers=2, queue_depth=0)
+    try:
+        pool.start()
+        assert len(pool._executor()._processes) == 2
+        assert pool.render(sorted, [2, 1]) == [1, 2]
+    finally:
+        pool.shutdown()
+
+@pytest.mark.parametrize("exc, status", [(RenderTimeout(1), 504), (RenderOverloaded(3), 503)])
+def test_render_errors_map_to_status(backend, exc, status):
+    def render():
+        raise exc
+    r = backend.cached_png(None, "test-error", {"status": status}, [], render)
+    assert r.status_code == status
+    if status == 503:
+        assert r.headers["retry-after"] == "3"
@@ -0,0 +1,109 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+import response_layer
+from response_layer import CompressionMiddleware, FastJSONResponse, PrecompressedBody, dumps, negotiate
+
+BIG = b"x" * 4096
+
+def make_app() -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/big")
+    def big():
+        return Response(BIG, media_type="text/plain")
+
+    @app.get("/small")
+    def small():
+        return Response(b"tiny", media_type="text/plain")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BIG, BIG[:10]]), media_type="text/csv")
+
+    @app.get("/typed/{kind}")
+    def typed(kind: str):
+        media = {"arrow": "application/vnd.apache.arrow.stream", "arrowfile": "application/vnd.apache.arrow.file",
+                 "parquet": "application/vnd.apache.parquet", "png": "image/png"}[kind]
+        return StreamingResponse(iter([BIG]), media_type=media)
+
+    @app.get("/encoded")
+    def encoded():
+        return Response(gzip.compress(BIG), media_type="text/plain", headers={"Content-Encoding": "gzip"})
+
+    @app.get("/partial")
+    def partial():
+        return Response(BIG, status_code=206, media_type="text/plain")
+
+    return TestClient(app)
+
+@pytest.fixture(scope="module")
+def raw_client():
+    return make_app()
+
+def raw(client, path, accept="gzip"):
+    """(response, undecoded body): httpx would transparently decode gzip / br."""
+    with client.stream("GET", path, headers={"Accept-Encoding": accept}) as r:
+        return r, b"".join(r.iter_raw())
+
+def test_negotiate_prefers_highest_q():
+    assert negotiate("gzip;q=0.5, identity", ("gzip",)) == "gzip"
+    assert negotiate("gzip;q=0, *;q=0", ("gzip",)) is None
+    assert negotiate("*", ("br", "gzip")) == "br"
+    assert negotiate("br;q=0.4, gzip", ("br", "gzip")) == "gzip"
+
+def test_large_bodies_are_gzipped(raw_client):
+    r, body = raw(raw_client, "/big")
+    assert r.headers["content-encoding"] == "gzip" and "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) == len(body) and gzip.decompress(body) == BIG
+
+def test_identity_and_small_bodies(raw_client):
+    r, body = raw(raw_client, "/big", accept="identity")
+    assert "content-encoding" not in r.headers and body == BIG and "Accept-Encoding" in r.headers["vary"]
+    r, body = raw(raw_client, "/small")
+    assert "content-encoding" not in r.headers and body == b"tiny"
+
+def test_streamed_bodies_are_gzipped(raw_client):
+    r, body = raw(raw_client, "/stream")
+    assert r.headers["content-encoding"] == "gzip" and "content-length" not in r.headers
+    assert gzip.decompress(body) == BIG + BIG[:10]
+
+@pytest.mark.parametrize("kind", ["arrow", "arrowfile", "parquet", "png"])
+def test_binary_types_pass_through(raw_client, kind):
+    r, body = raw(raw_client, f"/typed/{kind}")
+    assert "content-encoding" not in r.headers and body == BIG
+
+def test_encoded_and_partial_responses_pass_through(raw_client):
+    r, body = raw(raw_client, "/encoded")
+    assert gzip.decompress(body) == BIG
+    r, body = raw(raw_client, "/partial")
+    assert r.status_code == 206 and "content-encoding" not in r.headers and body == BIG
+
+@pytest.mark.skipif(response_layer.brotli is None, reason="brotli not installed")
+def test_brotli_preferred(raw_client):
+    r, body = raw(raw_client, "/stream", accept="gzip, br")
+    assert r.headers["content-encoding"] == "br"
+    assert response_layer.brotli.decompress(body) == BIG + BIG[:10]
+
+def test_dumps_numpy_and_nan():
+    body = json.loads(dumps({"a": np.arange(3, dtype=np.int32), "b": np.float32(0.5), "c": float("nan"),
+                             "d": np.array([[1.0, np.inf]])[:, ::-1], 1: {"x"}}))
+    assert body == {"a": [0, 1, 2], "b": 0.5, "c": None, "d": [[None, 1.0]], "1": ["x"]}
+    assert FastJSONResponse({"v": np.int64(7)}).body == b'{"v":7}'
+
+def test_precompressed_list_bodies(client):
+    r = client.get("/pathways/list")
+    etag = r.headers["etag"]
+    assert etag.startswith('W/"') and len(r.json()["pathways"]) == 12
+    assert client.get("/pathways/list", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/pathways/list", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+    body = PrecompressedBody({"k": list(range(1000))}, "v1")
+    assert gzip.decompress(body.variants["gzip"]) == body.variants[None]
+    assert set(PrecompressedBody({"k": 1}, "v1").variants) == {None}  # too small to compress
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+@pytest.fixture
+def pair(backend):
+    X = score_matrix()
+    return X, backend.DenseScoreMatrix(X), backend.SparseScoreMatrix(X)
+
+def test_make_score_matrix_backends(backend):
+    X = score_matrix()
+    assert backend.make_score_matrix(X, "dense").kind == "dense"
+    assert backend.make_score_matrix(X, "sparse").kind == "sparse"
+    mostly_zero = np.zeros_like(X)
+    mostly_zero[0, 0] = 1
+    assert backend.make_score_matrix(mostly_zero, "auto").kind == "sparse"
+    assert backend.make_score_matrix(np.ones_like(X), "auto").kind == "dense"
+    assert backend.SparseScoreMatrix(mostly_zero).nbytes < backend.DenseScoreMatrix(mostly_zero).nbytes
+    with pytest.raises(ValueError):
+        backend.make_score_matrix(X, "bogus")
+
+@pytest.mark.parametrize("thresh", [-1.0, 0.0, 0.6])
+def test_row_and_column_slices_agree(pair, thresh):
+    X, dense, sp = pair
+    for i in (0, 5, 40):
+        for a, b in zip(dense.row_nonzero(i, thresh), sp.row_nonzero(i, thresh)):
+            np.testing.assert_array_equal(a, b)
+    for j in (0, 7):
+        for a, b in zip(dense.column(j, thresh), sp.column(j, thresh)):
+            np.testing.assert_array_equal(a, b)
+
+def test_products_and_masks_agree(pair):
+    X, dense, sp = pair
+    rows = np.array([3, 0, 59])
+    assert dense.shape == sp.shape and dense.size == sp.size
+    np.testing.assert_array_equal(dense.row(7), sp.row(7))
+    np.testing.assert_array_equal(dense.rows(rows), sp.rows(rows))
+    Q = np.random.default_rng(2).random((len(PATHWAYS), 3)).astype(np.float32)
+    np.testing.assert_allclose(dense.matmul(Q), sp.matmul(Q), rtol=1e-5)
+    A = sparse.random(4, len(X), density=0.3, random_state=0, dtype=np.float32)
+    np.testing.assert_allclose(dense.lmul(A), sp.lmul(A), rtol=1e-5)
+    np.testing.assert_array_equal(dense.any_positive(), sp.any_positive())
+    for a, b in zip(dense.positive_entries(), sp.positive_entries()):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_allclose(dense.normalized().rows(rows), sp.normalized().rows(rows), rtol=1e-5)
+
+def test_sparse_registry_gives_same_neighbors(backend):
+    X, ids = score_matrix(), protein_ids()
+    dense = backend.ProteinRegistry(ids, PATHWAYS, X, backend="dense")
+    sp = backend.ProteinRegistry(ids, PATHWAYS, X, backend="sparse")
+    for protein in ("KEAP1", "G020"):
+        a, b = backend._topk_cosine(dense, protein, 8), backend._topk_cosine(sp, protein, 8)
+        assert a["protein_id"].tolist() == b["protein_id"].tolist()
+        np.testing.assert_allclose(a["cosine_sim"], b["cosine_sim"], rtol=1e-5)
+    others = ["G001", "G002", "BRCA1"]
+    for key, values in backend._shared_pathways_columns(dense, "KEAP1", others).items():
+        np.testing.assert_array_equal(values, backend._shared_pathways_columns(sp, "KEAP1", others)[key])
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from build_artifacts import build_score_store, load_score_store, rank_columns, save_score_store, source_signature
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+def test_rank_columns():
+    rows = np.array([0, 1, 2, 0, 2, 1])
+    cols = np.array([0, 0, 0, 1, 1, 1])
+    vals = np.array([0.5, 0.9, 0.5, 0.0, 0.3, -1.0])
+    indptr, r, neg = rank_columns(rows, cols, vals, 3)
+    assert indptr.tolist() == [0, 3, 4, 4]
+    assert r.tolist() == [1, 0, 2, 2]
+    assert neg.dtype == np.float32 and neg.tolist() == pytest.approx([-0.9, -0.5, -0.5, -0.3])
+
+def test_save_load_round_trip(tmp_path):
+    X = score_matrix()
+    save_score_store(protein_ids(), PATHWAYS, X, {"m.csv": [1, 2]}, tmp_path)
+    store = load_score_store({"m.csv": [1, 2]}, tmp_path)
+    assert isinstance(store["scores"], np.memmap)
+    np.testing.assert_array_equal(store["scores"], X)
+    assert store["proteins"] == protein_ids() and store["pathways"] == PATHWAYS
+    assert store["rank_indptr"][-1] == np.count_nonzero(X > 0)
+    assert load_score_store({"m.csv": [1, 3]}, tmp_path) is None
+    assert load_score_store(None, tmp_path) is not None  # CSV not shipped: take the store as is
+    assert load_score_store(None, tmp_path / "missing") is None
+
+def test_build_rebuilds_when_the_csv_changes(tmp_path):
+    csv = tmp_path / "matrix.csv"
+    out = tmp_path / "store"
+    pd.DataFrame(score_matrix(), index=protein_ids(), columns=PATHWAYS).to_csv(csv)
+    assert build_score_store(csv, out_dir=out)
+    assert not build_score_store(csv, out_dir=out)
+    assert build_score_store(csv, force=True, out_dir=out)
+    pd.DataFrame(score_matrix()[:10], index=protein_ids()[:10], columns=PATHWAYS).to_csv(csv)
+    assert load_score_store(source_signature(csv), out) is None
+    assert build_score_store(csv, out_dir=out)
+    assert load_score_store(source_signature(csv), out)["scores"].shape == (10, len(PATHWAYS))
+
+def test_startup_serves_the_matrix_memory_mapped(backend, data_root):
+    reg, ranking, version = backend._load_pathway_scores()
+    assert (data_root / "score_matrix" / "meta.json").exists()
+    assert backend.SCORE_BACKEND in ("auto", reg.raw.kind)
+    if reg.raw.kind == "dense":
+        base = reg.raw.X
+        while isinstance(base, np.ndarray) and not isinstance(base, np.memmap):
+            base = base.base
+        assert isinstance(base, np.memmap)  # a view of the .npy mapping, not a copy
+    np.testing.assert_allclose(reg.raw.rows(np.arange(len(reg))), score_matrix(), rtol=1e-6)
+    assert list(reg.ids) == protein_ids() and version == backend.PATHWAY_VERSION
+    rows, _, _ = ranking.ranked(0, 0.0)
+    np.testing.assert_array_equal(rows, backend.PATHWAY_RANKING.ranked(0, 0.0)[0])
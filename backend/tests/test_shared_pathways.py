@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from conftest import PATHWAYS, protein_ids, score_matrix
+
+def brute_force(query: str, others: list[str], thresh: float) -> list[tuple]:
+    """The original per-row loop: one record per (neighbour, pathway) scoring > thresh in both."""
+    ids, V = protein_ids(), score_matrix()
+    q = V[ids.index(query)]
+    records = []
+    for other in others:
+        if other not in ids:
+            continue
+        o = V[ids.index(other)]
+        for j, pw in enumerate(PATHWAYS):
+            if q[j] > thresh and o[j] > thresh:
+                records.append((other, pw, float(q[j]), float(o[j]), float(q[j]) * float(o[j])))
+    records.sort(key=lambda r: (r[0], -r[4]))
+    return records
+
+@pytest.mark.parametrize("thresh", [0.0, 0.5, 0.8])
+def test_columns_match_per_row_loop(backend, thresh):
+    reg = backend.PLOT_ARTIFACTS.current.reg
+    others = ["G010", "BRCA1", "NOT_LOADED", "G002", "G000"]
+    cols = backend._shared_pathways_columns(reg, "KEAP1", others, thresh)
+    assert list(cols) == backend.SHARED_PW_COLUMNS
+    got = list(zip(*(np.asarray(cols[c]).tolist() for c in backend.SHARED_PW_COLUMNS)))
+    want = brute_force("KEAP1", others, thresh)
+    assert [g[:2] for g in got] == [w[:2] for w in want]
+    np.testing.assert_allclose([g[2:] for g in got], [w[2:] for w in want], rtol=1e-6)
+
+def test_empty_inputs_keep_the_schema(backend):
+    reg = backend.PLOT_ARTIFACTS.current.reg
+    for query, others in (("NOPE", ["G001"]), ("KEAP1", [])):
+        df = backend._shared_pathways(reg, query, others)
+        assert df.empty and list(df.columns) == backend.SHARED_PW_COLUMNS
+
+def test_shared_pathways_endpoint(client):
+    body = client.get("/shared_pathways", params={"gene": "keap1", "topk": 4, "engine": "exact"}).json()
+    assert body["gene"] == "KEAP1"
+    cols = body["columns"]
+    assert set(cols["other_protein"]) <= set(protein_ids())
+    want = brute_force("KEAP1", sorted(set(cols["other_protein"])), 0.0)
+    assert cols["pathway_id"] == [w[1] for w in want]
+
+def test_shared_pathways_arrow(client):
+    json_cols = client.get("/shared_pathways", params={"gene": "KEAP1", "topk": 4}).json()["columns"]
+    r = client.get("/shared_pathways", params={"gene": "KEAP1", "topk": 4, "format": "arrow"})
+    table = pa.ipc.open_stream(io.BytesIO(r.content)).read_all()
+    assert table.to_pydict()["pathway_id"] == json_cols["pathway_id"]
+    assert client.get("/shared_pathways", params={"gene": "NOPE"}).status_code == 404
+    assert client.get("/shared_pathways", params={"gene": "KEAP1", "format": "csv"}).status_code == 400
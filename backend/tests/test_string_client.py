@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import numpy as np
+import pytest
+
+import string_client
+from conftest import PATHWAYS, protein_ids, score_matrix
+from string_client import StringClient
+
+def fake_edges(proteins: list[str]) -> list[dict]:
+    """Deterministic 'STRING' answer: an edge between neighbours in sorted order."""
+    proteins = sorted(proteins)
+    return [{"preferredName_A": a, "preferredName_B": b, "score": 0.9} for a, b in zip(proteins, proteins[1:])]
+
+class MockApi:
+    """MockTransport handler that answers /json/network and records every request."""
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        assert urlsplit(str(request.url)).path.endswith("/json/network")
+        proteins = parse_qs(urlsplit(str(request.url)).query)["identifiers"][0].split("%0d")
+        self.calls.append(proteins)
+        return httpx.Response(200, json=fake_edges(proteins))
+
+@pytest.fixture
+def api(monkeypatch):
+    handler = MockApi()
+    def session(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._client, self._sem
+    monkeypatch.setattr(StringClient, "_session", session)
+    return handler
+
+def network(client: StringClient, proteins) -> list[dict]:
+    async def run():
+        try:
+            return await client.network(proteins)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+def test_key_ignores_order():
+    assert StringClient.key(9606, ["B", "A"]) == StringClient.key(9606, ["A", "B"])
+    assert StringClient.key(9606, ["A"]) != StringClient.key(10090, ["A"])
+
+def test_chunks_are_fetched_once_then_cached(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(string_client, "STRING_CHUNK", 4)
+    proteins = [f"P{i}" for i in range(10)]
+    client = StringClient(base_url="http://string.test", fixture_dir=None, cache_dir=tmp_path)
+    edges = network(client, reversed(proteins))
+    assert api.calls == [proteins[0:4], proteins[4:8], proteins[8:10]]
+    assert edges == fake_edges(proteins[0:4]) + fake_edges(proteins[4:8]) + fake_edges(proteins[8:10])
+    assert len(list(tmp_path.glob("*.json"))) == 3
+
+    assert network(StringClient(base_url="http://string.test", fixture_dir=None, cache_dir=tmp_path),
+                   proteins) == edges
+    assert len(api.calls) == 3
+
+def test_expired_cache_is_refetched(api, tmp_path):
+    client = StringClient(base_url="http://string.test", fixture_dir=None, cache_dir=tmp_path, ttl_s=60)
+    network(client, ["A", "B"])
+    old = os.path.getmtime(next(tmp_path.glob("*.json"))) - 120
+    os.utime(next(tmp_path.glob("*.json")), (old, old))
+    network(client, ["A", "B"])
+    assert len(api.calls) == 2
+
+def test_disk_cache_runs_off_the_event_loop(api, tmp_path, monkeypatch):
+    loop_threads, io_threads = set(), []
+    for name in ("_cache_get", "_cache_put"):
+        def record(self, *args, _orig=getattr(StringClient, name)):
+            io_threads.append(threading.get_ident())
+            return _orig(self, *args)
+        monkeypatch.setattr(StringClient, name, record)
+
+    async def run():
+        loop_threads.add(threading.get_ident())
+        client = StringClient(base_url="http://string.test", fixture_dir=None, cache_dir=tmp_path)
+        try:
+            return await client.network(["A", "B"])
+        finally:
+            await client.aclose()
+    assert asyncio.run(run()) == fake_edges(["A", "B"])
+    assert len(io_threads) == 2 and not loop_threads & set(io_threads)
+
+def test_fixture_dir_never_uses_the_network(api, tmp_path):
+    (tmp_path / f"{StringClient.key(9606, ['A', 'B'])}.json").write_text(json.dumps(fake_edges(["A", "B"])))
+    client = StringClient(base_url="http://string.test", fixture_dir=tmp_path, cache_dir=tmp_path / "cache")
+    assert network(client, ["B", "A"]) == fake_edges(["A", "B"])
+    with pytest.raises(FileNotFoundError):
+        network(client, ["A", "C"])
+    assert api.calls == []
+
+def test_endpoint_through_the_api(backend, client, api, tmp_path, monkeypatch):
+    monkeypatch.setattr(backend, "STRING_SOURCE", "api")
+    monkeypatch.setattr(backend, "STRING_CLIENT",
+                        StringClient(base_url="http://string.test", fixture_dir=None, cache_dir=tmp_path))
+    body = client.get("/stringdb/pathway_interactions", params={"pathway": "NRF2", "threshold": 0.5}).json()
+
+    ids, V = np.array(protein_ids()), score_matrix()
+    j = PATHWAYS.index("NRF2")
+    pred = set(ids[V[:, j] > 0.5])
+    geneset = set(ids[V[:, j] >= 0.7]) | {f"OUT{j}"}
+    want = []
+    for d in itertools.chain.from_iterable(fake_edges(c) for c in api.calls):
+        a, b = d["preferredName_A"], d["preferredName_B"]
+        if a in pred and b in geneset:
+            want.append({"prediction_protein": a, "geneset_protein": b, "score": 0.9})
+        elif b in pred and a in geneset:
+            want.append({"prediction_protein": b, "geneset_protein": a, "score": 0.9})
+    assert sorted(set.union(*map(set, api.calls))) == sorted(pred | geneset)
+    assert body == {"interactions": want} and want
+
+def test_endpoint_errors(client):
+    assert "error" in client.get("/stringdb/pathway_interactions", params={"pathway": "NOPE"}).json()
+    body = client.get("/stringdb/pathway_interactions", params={"pathway": "NRF2", "species": 1}).json()
+    assert body == {"error": "No local STRING index for species 1"}
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import string_client
+from build_artifacts import build_string_index
+from conftest import PATHWAYS, protein_ids, score_matrix
+from string_client import StringIndex, get_string_index
+
+SPECIES = 9606
+
+def write_snapshot(root, names: list[str], links: list[tuple[int, int, int]]):
+    """STRING-format protein.info / protein.links files for proteins 9606.P<i>."""
+    info, links_fn = root / "protein.info.txt", root / "protein.links.txt"
+    info.write_text("#string_protein_id\tpreferred_name\tsize\n"
+                    + "".join(f"{SPECIES}.P{i}\t{n}\t1\n" for i, n in enumerate(names)))
+    links_fn.write_text("protein1 protein2 combined_score\n"
+                        + "".join(f"{SPECIES}.P{a} {SPECIES}.P{b} {s}\n" for a, b, s in links))
+    return links_fn, info
+
+def random_links(n: int, seed: int = 0) -> list[tuple[int, int, int]]:
+    """Random scored pairs, each listed in both directions as in STRING's files."""
+    rng = np.random.default_rng(seed)
+    pairs = {tuple(sorted(p)) for p in rng.integers(0, n, size=(4 * n, 2)) if p[0] != p[1]}
+    links = []
+    for a, b in sorted(pairs):
+        s = int(rng.integers(150, 1000))
+        links += [(a, b, s), (b, a, s)]
+    return links
+
+def brute_force(names, links, prediction, geneset, min_score) -> set[frozenset]:
+    """Every known pair scoring >= min_score with one end in each set."""
+    return {frozenset((names[a], names[b])) for a, b, s in links
+            if a < len(names) and b < len(names) and s >= round(min_score * 1000)
+            and ((names[a] in prediction and names[b] in geneset) or (names[b] in prediction and names[a] in geneset))}
+
+@pytest.fixture
+def index(tmp_path):
+    names = protein_ids()
+    links = random_links(len(names))
+    links_fn, info = write_snapshot(tmp_path, names, links)
+    return names, links, StringIndex(build_string_index(links_fn, info, out_dir=tmp_path / "idx"))
+
+def test_index_is_symmetric_csr(index):
+    names, links, idx = index
+    assert len(idx) == len(names) and idx.meta["species"] == SPECIES
+    assert np.all(np.diff(idx.indptr) >= 0) and idx.indptr[-1] == len(idx.indices) == len(links)
+    for i in (0, 17, 59):
+        nbrs = idx.indices[idx.indptr[i]:idx.indptr[i + 1]]
+        assert np.all(np.diff(nbrs) > 0)  # sorted, no duplicates
+        for j in nbrs:
+            assert i in idx.indices[idx.indptr[j]:idx.indptr[j + 1]]
+
+@pytest.mark.parametrize("min_score", [0.15, 0.4, 0.9])
+def test_interactions_match_brute_force(index, min_score):
+    names, links, idx = index
+    prediction, geneset = set(names[:30]), set(names[20:50]) | {"NOT_IN_STRING"}
+    got = idx.interactions(prediction, geneset, min_score)
+    pairs = [(d["prediction_protein"], d["geneset_protein"]) for d in got]
+    assert len(pairs) == len(set(pairs))
+    assert len({frozenset(p) for p in pairs}) == len(pairs)  # each edge once
+    assert all(a in prediction and b in geneset for a, b in pairs)
+    assert {frozenset(p) for p in pairs} == brute_force(names, links, prediction, geneset, min_score)
+    assert all(d["score"] >= min_score - 1e-3 for d in got)
+
+def test_interactions_with_no_edges(index):
+    names, _, idx = index
+    assert idx.interactions({"NOT_IN_STRING"}, set(names)) == []
+
+def test_min_score_at_build_drops_links(tmp_path):
+    names = ["A", "B", "C"]
+    links = [(0, 1, 900), (1, 0, 900), (1, 2, 200), (2, 1, 200), (0, 7, 999)]  # P7 is not in protein.info
+    links_fn, info = write_snapshot(tmp_path, names, links)
+    idx = StringIndex(build_string_index(links_fn, info, min_score=400, out_dir=tmp_path / "idx"))
+    assert idx.meta["edges"] == 2
+    assert idx.interactions({"A", "B", "C"}, {"A", "B", "C"}, 0.0) == [
+        {"prediction_protein": "A", "geneset_protein": "B", "score": 0.9}]
+
+def test_endpoint_serves_local_index(client, tmp_path):
+    names = protein_ids()
+    links = random_links(len(names), seed=3)
+    build_string_index(*write_snapshot(tmp_path, names, links))  # the data root's string_index/
+    assert len(get_string_index(SPECIES)) == len(names)
+
+    body = client.get("/stringdb/pathway_interactions", params={"pathway": "ADA2", "threshold": 0.6}).json()
+    ids, V = np.array(names), score_matrix()
+    j = PATHWAYS.index("ADA2")
+    pred, geneset = set(ids[V[:, j] > 0.6]), set(ids[V[:, j] >= 0.7]) | {f"OUT{j}"}
+    got = {frozenset((d["prediction_protein"], d["geneset_protein"])) for d in body["interactions"]}
+    assert got == brute_force(names, links, pred, geneset, string_client.STRING_MIN_SCORE) and got